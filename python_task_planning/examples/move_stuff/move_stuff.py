@@ -10,6 +10,8 @@ import numpy as np
 from scipy import linalg
 
 import hierarchical_interactive_planning as hip
+from python_task_planning.multi_query import MultiQueryPlanner
+from python_task_planning.obstacle_map import ObstacleMap
 
 ######################################################################################################################
 # World
@@ -24,6 +26,8 @@ class MoveStuffWorld:
         self.obs_map = obs_map
         self.objects = objects
         self.eps = eps
+        # (roadmap parameters, MultiQueryPlanner) for plan_path
+        self._path_planner = None
 
     def execute(self, op_instance):
         op_name = op_instance.operator_name
@@ -53,29 +57,22 @@ class MoveStuffWorld:
     def plan_path(self, x_start, x_end, n_graph_points=1000, graph_conn_dist=1.0):
         '''Plan a collision free path from x_start to x_end.
 
+        The random roadmap is built on the first call for the map and reused by later ones.
+        Its edges are collision checked lazily, as searches try to use them.
+
         Returns:
             path (list of np.array): Path (or None if no path found).
         '''
-        # build a random graph
-        x_min, x_max, y_min, y_max = self.obs_map.extent()
-        points = np.zeros((n_graph_points, 2))
-        points[:,0] = np.random.uniform(x_min, x_max, n_graph_points)
-        points[:,1] = np.random.uniform(y_min, y_max, n_graph_points)
-        
-        def action_generator(state):
-            for neighbor in range(len(points)):
-                d = linalg.norm(points[state] - points[neighbor])
-                if d < conn_dist:
-                    yield neighbor, neighbor, d  # action, next_state, cost
-
-        p = a_star.a_star(
-            start,
-            lambda s: s == goal,
-            action_generator,
-            lambda s: linalg.norm(points[goal] - points[s])
-            )
-        
-
+        key = (n_graph_points, graph_conn_dist)
+        if self._path_planner is None or self._path_planner[0] != key:
+            x_min, y_min, x_max, y_max = self.obs_map.extent()
+            points = np.zeros((n_graph_points, 2))
+            points[:,0] = np.random.uniform(x_min, x_max, n_graph_points)
+            points[:,1] = np.random.uniform(y_min, y_max, n_graph_points)
+            points = points[~self.obs_map.is_occupied(points)]
+            self._path_planner = (key, MultiQueryPlanner(points, graph_conn_dist,
+                edge_checker=self.obs_map.segments_free))
+        return self._path_planner[1].plan(x_start, x_end)
 
 class Robot:
     def __init__(self, position):
@@ -137,75 +134,25 @@ def draw_objects(objects):
         elif isinstance(obj, Robot):
             plt.plot([obj.position[0]], [obj.position[1]], 'go', markersize=40)
 
-class ObstacleMap:
-    def __init__(self, obs_array, res):
-        '''2D obstacle map class.
-
-        Args:
-            obs_array (np.array of np.bool): Occupancy array.
-            res (float): Size (height and width) of each cell in the occupancy array.
-        '''
-        self.obs_array = obs_array
-        self.res = res
-
-    def pos_to_ind(self, p):
-        '''Return array index for cell that contains x,y position.
-        '''
-        ii, jj = np.array(p) / self.res
-        return int(ii), int(jj)
-    
-    def ind_to_pos(self, ind):
-        '''Return x,y position of center point of cell specified by index.
-        '''
-        return  np.array(ind) * self.res + 0.5 * self.res
-
-    def is_occupied(self, p):
-        ii, jj = self.pos_to_ind(p)
-        return self.obs_array[ii,jj]
-
-    def any_occupied(self, x0, x1, y0, y1):
-        '''Return true if any cells within the bounding box are occupied.
-        '''
-        i0, j0 = self.pos_to_ind((x0, y0))
-        i1, j1 = self.pos_to_ind((x1, y1))
-        i0 = max(0, i0)
-        i1 = max(0, i1)
-        j0 = max(0, j0)
-        j1 = max(0, j1)
-        return self.obs_array[i0:i1,j0:j1].any()
-
-    def points(self):
-        points = []
-        for ii in range(self.obs_array.shape[0]):
-            for jj in range(self.obs_array.shape[1]):
-                p = self.ind_to_pos((ii, jj))
-                points.append(p)
-        return np.array(points)
-
-    def occupied_points(self):
-        points = []
-        for ii in range(self.obs_array.shape[0]):
-            for jj in range(self.obs_array.shape[1]):
-                p = self.ind_to_pos((ii, jj))                
-                if self.is_occupied(p):
-                    points.append(p)
-        return np.array(points)
-
-    def extent(self):
-        x_min, y_min = self.ind_to_pos((0, 0))
-        s = self.obs_array.shape
-        x_max, y_max = self.ind_to_pos((s[0]-1, s[1]-1))
-        return x_min, y_min, x_max, y_max
-
 if __name__ == '__main__':
+    import logging
+    import os
     import sys
     from matplotlib import pyplot as plt
 
-    # load world map
-    res = 1.0
-    obs_arr = plt.imread(sys.argv[1])[::-1,:].T
-    obs_arr = obs_arr < obs_arr.max() / 2.0
-    obs_map = ObstacleMap(obs_arr, res)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    # load world map, either from an image or from a directory written by ObstacleMap.save()
+    if os.path.isdir(sys.argv[1]):
+        obs_map = ObstacleMap.load(sys.argv[1])
+    else:
+        res = 1.0
+        obs_arr = plt.imread(sys.argv[1])[::-1,:].T
+        obs_arr = obs_arr < obs_arr.max() / 2.0
+        obs_map = ObstacleMap(obs_arr, res)
+        if len(sys.argv) > 2:
+            # convert the image for faster loading next time
+            obs_map.save(sys.argv[2], precompute=True)
     
     objects = {
         'robot': Robot(np.array((50., 50.))),
@@ -228,18 +175,14 @@ if __name__ == '__main__':
 
     if 0:
         w = 5
-        occ = []
-        free = []
-        for x, y in obs_map.points():
-            if obs_map.any_occupied(x-w, x+w, y-w, y+w):
-                occ.append((x, y))
-            else:
-                free.append((x, y))
-        occ = np.array(occ)
-        free = np.array(free)
-        plt.plot(occ[:,0], occ[:,1], 'r.')            
+        points = obs_map.points()
+        x, y = points[:,0], points[:,1]
+        occ_mask = obs_map.any_occupied(x-w, x+w, y-w, y+w)
+        occ = points[occ_mask]
+        free = points[~occ_mask]
+        plt.plot(occ[:,0], occ[:,1], 'r.')
         plt.plot(free[:,0], free[:,1], 'g.')
-    
+
     draw_objects(objects)
     x_min, x_max, y_min, y_max = obs_map.extent()
     plt.xlim(x_min, x_max)
@@ -1,4 +1,5 @@
 import roslib; roslib.load_manifest('python_task_planning')
+import logging
 import sys
 
 import python_task_planning as ptp
@@ -9,17 +10,14 @@ import python_task_planning as ptp
 
 class SushiWorld:
     def __init__(self, start_state):
-        self.current_state = start_state
+        self.current_state = ptp.FluentStore(start_state.fluents)
 
     def execute(self, op):
         if not self.current_state.entails(op.preconditions):
             raise RuntimeError('Preconditions dont hold!')
 
-        fluents = list(self.current_state.fluents)
         for f in [op.target] + list(op.side_effects.fluents):
-            if not self.current_state.entails(f):
-                fluents.append(f)
-        self.current_state = ptp.ConjunctionOfFluents(fluents)
+            self.current_state.add(f)
         
         return self.current_state
 
@@ -135,6 +133,7 @@ DoDetection = ptp.Operator(
 operators = [SetTable, SetCup, SetBowl, Put, Pick, DoDetection]
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     start_state = ptp.ConjunctionOfFluents([])
     world = SushiWorld(start_state)
     goal = ptp.ConjunctionOfFluents([TableIsSet((ptp.Symbol('table'),))])
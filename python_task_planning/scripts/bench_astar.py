@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+'''
+Compares expansions per second of a_star.a_star against the original
+implementation, whose open set was scanned with min() on every step.
+
+Uses the random graph from test_astar.py. Neighbors are precomputed so that the
+timings measure the search itself rather than the action generator.
+
+Usage: bench_astar.py [n_points] [conn_dist]
+'''
+import sys
+import time
+import numpy as np
+from scipy import linalg
+
+from python_task_planning import a_star
+
+def a_star_min_scan(start, goal_test, action_generator, heuristic):
+    '''The previous implementation of a_star.a_star, kept here as a reference.
+    '''
+    closed_set = set()
+    open_set = set([start])
+    came_from = {}
+    action_used = {}
+
+    g_score = {start: 0.0}
+    h_score = {start: heuristic(start)}
+    f_score = {start: g_score[start] + h_score[start]}
+
+    while len(open_set) > 0:
+        current = min(open_set, key=f_score.get)
+        if goal_test(current):
+            path = reconstruct_path(came_from, action_used, current)
+            actions = reconstruct_actions(path, action_used)
+            return zip(actions, path)
+
+        open_set.remove(current)
+        closed_set.add(current)
+        for action, neighbor, cost in action_generator(current):
+            if neighbor in closed_set:
+                continue
+            tentative_g_score = g_score[current] + cost
+
+            if neighbor not in open_set:
+                open_set.add(neighbor)
+                h_score[neighbor] = heuristic(neighbor)
+                tentative_is_better = True
+            elif tentative_g_score < g_score[neighbor]:
+                tentative_is_better = True
+            else:
+                tentative_is_better = False
+
+            if tentative_is_better:
+                came_from[neighbor] = current
+                action_used[neighbor] = action
+                g_score[neighbor] = tentative_g_score
+                f_score[neighbor] = g_score[neighbor] + h_score[neighbor]
+    return None
+
+def reconstruct_path(came_from, action_used, current_state):
+    if current_state in came_from:
+        p = reconstruct_path(came_from, action_used, came_from[current_state])
+        return p + [current_state]
+    else:
+        return [current_state]
+
+def reconstruct_actions(path, action_used):
+    actions = []
+    for ii in range(len(path)):
+        if ii + 1 < len(path):
+            next_state = path[ii+1]
+            actions.append(action_used[next_state])
+        else:
+            actions.append(None)
+    return actions
+
+def random_graph(n, conn_dist):
+    points = np.random.random((n, 2))
+    neighbors = []
+    for ii in range(n):
+        d = np.sqrt(((points - points[ii])**2).sum(axis=1))
+        jj = np.nonzero(d < conn_dist)[0]
+        neighbors.append([(int(j), int(j), float(d[j])) for j in jj])
+    return points, neighbors
+
+def run(search, points, neighbors, start, goal):
+    expansions = [0]
+    def action_generator(state):
+        expansions[0] += 1
+        return neighbors[state]
+
+    t_start = time.time()
+    p = search(
+        start,
+        lambda s: s == goal,
+        action_generator,
+        lambda s: linalg.norm(points[goal] - points[s])
+        )
+    t = time.time() - t_start
+    return p, expansions[0], t
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    conn_dist = float(sys.argv[2]) if len(sys.argv) > 2 else 0.015
+
+    np.random.seed(0)
+    points, neighbors = random_graph(n, conn_dist)
+    # opposite corners, so the search has to cross the whole graph
+    start = int(np.argmin(points.sum(axis=1)))
+    goal = int(np.argmax(points.sum(axis=1)))
+
+    for name, search in [('min scan', a_star_min_scan), ('heap', a_star.a_star)]:
+        p, expansions, t = run(search, points, neighbors, start, goal)
+        if p is None:
+            cost = None
+        else:
+            cost = sum(linalg.norm(points[a] - points[b]) for (_, a), (_, b) in zip(p[:-1], p[1:]))
+        print '%-10s expansions: %7d  time: %8.3fs  expansions/s: %10.1f  path cost: %s' % (
+            name, expansions, t, expansions / t, cost)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+'''
+Compares node expansions and time of unidirectional and bidirectional search
+on the random graph from test_astar.py, with and without the Euclidean
+heuristic, averaged over random start/goal pairs.
+
+Usage: bench_bidirectional.py [n_points] [conn_dist] [n_queries]
+'''
+import sys
+import time
+import numpy as np
+from scipy import linalg
+
+from python_task_planning.a_star import a_star, bidirectional_a_star
+from bench_astar import random_graph
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    conn_dist = float(sys.argv[2]) if len(sys.argv) > 2 else 0.015
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    np.random.seed(0)
+    points, neighbors = random_graph(n, conn_dist)
+    queries = [tuple(np.random.randint(n, size=2)) for ii in range(n_queries)]
+
+    expansions = [0]
+    def action_generator(state):
+        expansions[0] += 1
+        return neighbors[state]
+
+    def searches(start, goal):
+        to_goal = lambda s: linalg.norm(points[goal] - points[s])
+        from_start = lambda s: linalg.norm(points[start] - points[s])
+        return [
+            ('dijkstra', lambda: a_star(start, lambda s: s == goal, action_generator, lambda s: 0.0)),
+            ('bidirectional dijkstra', lambda: bidirectional_a_star(start, goal, action_generator,
+                symmetric=True)),
+            ('a*', lambda: a_star(start, lambda s: s == goal, action_generator, to_goal)),
+            ('bidirectional a*', lambda: bidirectional_a_star(start, goal, action_generator,
+                to_goal, from_start, symmetric=True)),
+            ]
+
+    totals = {}
+    names = []
+    for start, goal in queries:
+        for name, search in searches(start, goal):
+            if name not in totals:
+                names.append(name)
+                totals[name] = [0, 0.0]
+            expansions[0] = 0
+            t_start = time.time()
+            search()
+            totals[name][0] += expansions[0]
+            totals[name][1] += time.time() - t_start
+
+    for name in names:
+        n_expanded, t = totals[name]
+        print '%-24s expansions/query: %9.1f  time/query: %8.4fs' % (
+            name, float(n_expanded) / n_queries, t / n_queries)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+'''
+Compares A* over a Roadmap queried through its grid index with A* over the
+precomputed CSRGraph of the same roadmap, on uniformly random points.
+
+Usage: bench_csr.py [n_points] [conn_dist] [n_queries]
+'''
+import sys
+import time
+import resource
+import numpy as np
+
+from python_task_planning.a_star import a_star
+from python_task_planning.roadmap import Roadmap
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    conn_dist = float(sys.argv[2]) if len(sys.argv) > 2 else 1.5 / np.sqrt(n)
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    np.random.seed(0)
+    roadmap = Roadmap(np.random.random((n, 2)), conn_dist)
+    t_start = time.time()
+    graph = roadmap.to_csr()
+    print '%s built in %.2fs' % (graph, time.time() - t_start)
+    queries = [tuple(np.random.randint(n, size=2).tolist()) for ii in range(n_queries)]
+
+    for name, search in [
+            ('roadmap', lambda start, goal: a_star(start, lambda s: s == goal,
+                roadmap.action_generator, roadmap.heuristic(goal))),
+            ('csr', lambda start, goal: a_star(start, lambda s: s == goal,
+                graph, roadmap.heuristic_array(goal))),
+            ]:
+        t_start = time.time()
+        lengths = [len(search(start, goal) or []) for start, goal in queries]
+        print '%-8s time/query: %8.4fs  plan lengths: %s' % (name, (time.time() - t_start) / n_queries, lengths)
+    print 'peak RSS: %.1f MB' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+'''
+Compares hda_star with a_star on a grid with random obstacles and varied step costs,
+with a successor function that spins the CPU for delay seconds per call to stand in
+for an expensive action generator. Checks that every plan has the optimal cost.
+
+Usage: bench_hda_star.py [grid_size] [delay] [max_workers]
+'''
+import sys
+import time
+import numpy as np
+
+from python_task_planning.a_star import a_star
+from python_task_planning.hda_star import hda_star, verify_plan
+from python_task_planning.profiler import PlanStats
+
+grid_size = 100
+delay = 0.0
+blocked = None
+
+def successors(state):
+    t_end = time.time() + delay
+    while time.time() < t_end:
+        pass
+    x, y = state
+    for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        xn, yn = x + dx, y + dy
+        if 0 <= xn < grid_size and 0 <= yn < grid_size and not blocked[xn, yn]:
+            yield (dx, dy), (xn, yn), 1.0 + 0.1 * ((xn * 7 + yn * 3) % 5)
+
+def heuristic(state):
+    return abs(grid_size - 1 - state[0]) + abs(grid_size - 1 - state[1])
+
+def goal_test(state):
+    return state == (grid_size - 1, grid_size - 1)
+
+if __name__ == '__main__':
+    grid_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    rng = np.random.RandomState(0)
+    blocked = rng.random_sample((grid_size, grid_size)) < 0.15
+    # keep the start and goal corners open
+    blocked[:2,:2] = blocked[-2:,-2:] = False
+
+    stats = PlanStats()
+    t_start = time.time()
+    plan = a_star((0, 0), goal_test, successors, heuristic, stats=stats)
+    t_serial = time.time() - t_start
+    cost = verify_plan(plan, (0, 0), goal_test, successors)
+    print '%-12s %8.3fs  %7d expansions  cost %.1f' % ('a_star', t_serial, stats.expanded, cost)
+
+    n_workers = 1
+    while n_workers <= max_workers:
+        stats = PlanStats()
+        t_start = time.time()
+        p = hda_star((0, 0), goal_test, successors, heuristic, n_workers=n_workers, stats=stats)
+        t = time.time() - t_start
+        c = verify_plan(p, (0, 0), goal_test, successors)
+        assert(abs(c - cost) < 1e-9)
+        print '%-12s %8.3fs  %7d expansions  cost %.1f  speedup %.2f' % ('hda_star %d' % n_workers, t,
+            stats.expanded, c, t_serial / t)
+        n_workers *= 2
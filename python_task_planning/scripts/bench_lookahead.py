@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+Compares the end to end time of hpn, planning and executing, with and without a
+Lookahead which plans later place settings ahead while earlier ones are executed, on the
+table setting benchmark domain. Each execution sleeps for delay seconds to stand in for
+the robot moving. Checks that every run achieves the goal with the same number of
+executions.
+
+Besides the wall time, the time spent waiting on planning (wall time minus execution
+time) and the total search time (including speculative searches) are reported. The
+speculative searches plan from an earlier world state than serial hpn would, so their
+search effort can differ too; compare the expansions to see how much of a gain comes
+from that rather than from planning during execution.
+
+Usage: bench_lookahead.py [n_settings] [delay] [max_workers]
+'''
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+from python_task_planning import hpn_module
+from python_task_planning.common import HPlanTree
+from python_task_planning.lookahead import Lookahead
+from python_task_planning.profiler import subtree_stats
+from python_task_planning.benchmarks.domains import BenchmarkWorld, table_setting
+
+class SlowWorld(BenchmarkWorld):
+    def __init__(self, facts, delay):
+        BenchmarkWorld.__init__(self, facts)
+        self.delay = delay
+
+    def execute(self, op):
+        time.sleep(self.delay)
+        return BenchmarkWorld.execute(self, op)
+
+def run(problem, delay, lookahead=None):
+    world = SlowWorld(problem.facts, delay)
+    tree = HPlanTree()
+    t_start = time.time()
+    hpn_module.hpn(problem.operators, problem.start_state(), problem.goal, world, tree=tree,
+        lookahead=lookahead)
+    t = time.time() - t_start
+    assert(world.entails(problem.goal))
+    return t, subtree_stats(tree)
+
+if __name__ == '__main__':
+    n_settings = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    problem = table_setting(n_settings=n_settings, n_objects=3, depth=3, branching=6)
+
+    t_serial, stats = run(problem, delay)
+    print '%-12s %8.3fs  planning %7.3fs  search %7.3fs  %6d expanded  %5d executions' % ('serial', t_serial,
+        t_serial - stats.execution_time, stats.search_time, stats.expanded, stats.executions)
+
+    n_workers = 1
+    while n_workers <= max_workers:
+        pool = ThreadPool(n_workers)
+        lookahead = Lookahead(pool)
+        t, s = run(problem, delay, lookahead)
+        pool.terminate()
+        assert(s.executions == stats.executions)
+        print '%-12s %8.3fs  planning %7.3fs  search %7.3fs  %6d expanded  %5d executions  speedup %.2f' % (
+            'lookahead %d' % n_workers, t, t - s.execution_time, s.search_time, s.expanded, s.executions,
+            t_serial / t)
+        print '             %s' % lookahead
+        n_workers *= 2
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+'''
+Compares answering path queries by building a fresh roadmap for each one (as
+MoveStuffWorld.plan_path used to) with a MultiQueryPlanner which builds its
+roadmap once, both serially and in a process pool.
+
+Usage: bench_multi_query.py [n_points] [conn_dist] [n_queries] [n_processes]
+'''
+import sys
+import time
+import numpy as np
+
+from python_task_planning.a_star import a_star
+from python_task_planning.roadmap import Roadmap
+from python_task_planning.multi_query import MultiQueryPlanner
+
+def plan_fresh(points, conn_dist, x_start, x_end):
+    roadmap = Roadmap(np.concatenate([[x_start, x_end], points]), conn_dist)
+    p = a_star(0, lambda s: s == 1, roadmap.action_generator, roadmap.heuristic(1))
+    if p is None:
+        return None
+    return [roadmap.points[ii] for (action, ii) in p]
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    conn_dist = float(sys.argv[2]) if len(sys.argv) > 2 else 0.06
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    n_processes = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+
+    np.random.seed(0)
+    points = np.random.random((n, 2))
+    queries = [(np.random.random(2), np.random.random(2)) for ii in range(n_queries)]
+
+    t_start = time.time()
+    for x_start, x_end in queries:
+        plan_fresh(points, conn_dist, x_start, x_end)
+    t = time.time() - t_start
+    print '%-24s %8.1f queries/s' % ('fresh roadmap per query', n_queries / t)
+
+    t_start = time.time()
+    planner = MultiQueryPlanner(points, conn_dist)
+    print '%-24s %8.4fs' % ('build', time.time() - t_start)
+    t_start = time.time()
+    planner.plan_batch(queries)
+    t = time.time() - t_start
+    print '%-24s %8.1f queries/s' % ('multi-query', n_queries / t)
+
+    t_start = time.time()
+    planner.plan_batch(queries)
+    t = time.time() - t_start
+    print '%-24s %8.1f queries/s' % ('multi-query, cached', n_queries / t)
+
+    planner = MultiQueryPlanner(points, conn_dist)
+    pool = planner.make_pool(n_processes)
+    t_start = time.time()
+    planner.plan_batch(queries, pool)
+    t = time.time() - t_start
+    pool.close()
+    print '%-24s %8.1f queries/s' % ('multi-query, %d processes' % n_processes, n_queries / t)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+'''
+Speedup of A* with successors generated in batches through a pool of workers, for an
+action generator which is expensive compared to the search itself.
+
+The search is over a grid with random obstacles. Each call to the action generator
+stands in for a call to a geometric planner: it either sleeps for delay seconds
+(an external call which releases the GIL, the case thread pools help with) or
+spins the CPU for that long (which only process pools can overlap, given enough
+cores). Every parallel search is checked to return the same plan as a_star.
+
+Usage: bench_parallel_a_star.py [grid_size] [delay] [thread|process] [max_workers]
+'''
+import sys
+import time
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy as np
+
+from python_task_planning.a_star import a_star
+
+grid_size = 30
+delay = 0.002
+spin = False
+blocked = None
+
+def make_blocked(n, seed=0):
+    rng = np.random.RandomState(seed)
+    b = rng.random_sample((n, n)) < 0.2
+    b[0,0] = b[n-1,n-1] = False
+    return b
+
+def successors(state):
+    '''Grid moves, after a delay which simulates an expensive successor computation.
+    '''
+    if spin:
+        t_end = time.time() + delay
+        while time.time() < t_end:
+            pass
+    else:
+        time.sleep(delay)
+    x, y = state
+    for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        xn, yn = x + dx, y + dy
+        if 0 <= xn < grid_size and 0 <= yn < grid_size and not blocked[xn, yn]:
+            yield (dx, dy), (xn, yn), 1.0
+
+def heuristic(state):
+    return abs(grid_size - 1 - state[0]) + abs(grid_size - 1 - state[1])
+
+def goal_test(state):
+    return state == (grid_size - 1, grid_size - 1)
+
+class CountingExecutor:
+    def __init__(self, pool):
+        '''Counts the states whose successors a pool generates.
+        '''
+        self.pool = pool
+        self.calls = 0
+
+    def map(self, function, iterable):
+        items = list(iterable)
+        self.calls += len(items)
+        return self.pool.map(function, items)
+
+if __name__ == '__main__':
+    grid_size = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.002
+    kind = sys.argv[3] if len(sys.argv) > 3 else 'thread'
+    max_workers = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+    spin = kind == 'process'
+    blocked = make_blocked(grid_size)
+
+    t_start = time.time()
+    expanded = []
+    plan = a_star((0, 0), goal_test, successors, heuristic, on_expand=lambda s, g: expanded.append(s))
+    t_serial = time.time() - t_start
+    print '%-10s %8.3fs  %6d expansions  plan length %d' % ('serial', t_serial, len(expanded), len(plan))
+
+    n_workers = 1
+    while n_workers <= max_workers:
+        if kind == 'thread':
+            pool = ThreadPool(n_workers)
+        else:
+            pool = multiprocessing.Pool(n_workers)
+        executor = CountingExecutor(pool)
+        t_start = time.time()
+        p = a_star((0, 0), goal_test, successors, heuristic, executor=executor, batch_size=n_workers)
+        t = time.time() - t_start
+        pool.terminate()
+        assert(p == plan)
+        print '%-10s %8.3fs  speedup %5.2f  %6d expansions (%d ahead and not used)' % (
+            '%d %s' % (n_workers, {'thread': 'threads', 'process': 'processes'}[kind]), t, t_serial / t, executor.calls, executor.calls - len(expanded))
+        n_workers *= 2
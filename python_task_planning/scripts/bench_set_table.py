@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+'''
+Counts A* node expansions, planning time and peak memory for the set_table
+example, using hpn and/or plan_flat.
+
+The goal is to set n_tables tables. plan_flat only finishes in reasonable time
+for a single table. A mode can name the heuristic to use after a colon, for
+example hpn:h_ff or plan_flat:h_add.
+
+Usage: bench_set_table.py [n_runs] [n_tables] [hpn|plan_flat[:heuristic] ...]
+'''
+import os
+import sys
+import time
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples', 'set_table'))
+import set_table
+import python_task_planning as ptp
+from python_task_planning import hpn_module
+
+expansions = [0]
+_applicable_ops = hpn_module.applicable_ops
+def counting_applicable_ops(*args):
+    expansions[0] += 1
+    return _applicable_ops(*args)
+hpn_module.applicable_ops = counting_applicable_ops
+
+def make_goal(n_tables):
+    return ptp.ConjunctionOfFluents([set_table.TableIsSet((ptp.Symbol('table%d' % ii),)) for ii in range(n_tables)])
+
+cache_hits = [0]
+cache_misses = [0]
+
+def run_hpn(n_tables, heuristic):
+    start_state = ptp.ConjunctionOfFluents([])
+    world = set_table.SushiWorld(start_state)
+    cache = ptp.EntailmentCache(world)
+    ptp.hpn(set_table.operators, start_state, make_goal(n_tables), world, tree=ptp.HPlanTree(), cache=cache,
+        heuristic=heuristic)
+    cache_hits[0] += cache.hits
+    cache_misses[0] += cache.misses
+
+def run_plan_flat(n_tables, heuristic):
+    start_state = ptp.ConjunctionOfFluents([])
+    world = set_table.SushiWorld(start_state)
+    cache = ptp.EntailmentCache(start_state)
+    hpn_module.plan_flat(set_table.operators, world, start_state, make_goal(n_tables), cache=cache,
+        heuristic=heuristic)
+    cache_hits[0] += cache.hits
+    cache_misses[0] += cache.misses
+
+if __name__ == '__main__':
+    n_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    n_tables = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    modes = sys.argv[3:] if len(sys.argv) > 3 else ['hpn', 'plan_flat']
+
+    for name in modes:
+        planner, _, heuristic = name.partition(':')
+        run = {'hpn': run_hpn, 'plan_flat': run_plan_flat}[planner]
+        expansions[0] = 0
+        cache_hits[0] = 0
+        cache_misses[0] = 0
+        t_start = time.time()
+        for ii in range(n_runs):
+            run(n_tables, heuristic or 'num_violated')
+        t = time.time() - t_start
+        print '%-22s expansions/run: %8.1f  time/run: %8.4fs  entailment cache hits: %d misses: %d' % (
+            name, float(expansions[0]) / n_runs, t / n_runs, cache_hits[0] / n_runs, cache_misses[0] / n_runs)
+
+    # ru_maxrss is in kilobytes on linux
+    print 'peak rss: %.1f MB' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
@@ -1,28 +1,23 @@
 #!/usr/bin/env python
 from python_task_planning import a_star
+from python_task_planning.roadmap import Roadmap
 
 import numpy as np
-from scipy import linalg
 from matplotlib import pyplot as plt
 
 n = 1000
 conn_dist = 0.1
 
 points = np.random.random((n, 2))
+roadmap = Roadmap(points, conn_dist)
 
-def action_generator(state):
-    for neighbor in range(len(points)):
-        d = linalg.norm(points[state] - points[neighbor])
-        if d < conn_dist:
-            yield neighbor, neighbor, d  # action, next_state, cost
-        
 start = 0
 goal = n-1
 p = a_star.a_star(
     start,
     lambda s: s == goal,
-    action_generator,
-    lambda s: linalg.norm(points[goal] - points[s])
+    roadmap.action_generator,
+    roadmap.heuristic(goal)
     )
 print p
 
@@ -2,7 +2,7 @@ from distutils.core import setup
 from catkin_pkg.python_setup import generate_distutils_setup
 
 d = generate_distutils_setup(
-    packages=['python_task_planning'],
+    packages=['python_task_planning', 'python_task_planning.benchmarks'],
     package_dir={'': 'src'}
     )
 
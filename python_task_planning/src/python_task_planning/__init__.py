@@ -1,5 +1,19 @@
-from python_task_planning.common import Symbol, Variable, Fluent, ConjunctionOfFluents, AbstractionInfo, \
+import sys
+import logging
+from python_task_planning.common import Symbol, Variable, Fluent, ConjunctionOfFluents, FluentStore, AbstractionInfo, \
      Operator, OperatorInstance, HPlanTree, Predicate
 from python_task_planning.hpn import hpn
+# the hpn function shadows the module of the same name, so the module is exported as
+# hpn_module for access to plan_flat, applicable_ops and the rest of it
+hpn_module = sys.modules['python_task_planning.hpn']
+from python_task_planning.entailment_cache import EntailmentCache
 from python_task_planning.dot_graph import dot_from_plan_tree
-from python_task_planning.exceptions import PlanningFailedError
+from python_task_planning.exceptions import PlanningFailedError, SearchBudgetExceededError
+from python_task_planning.a_star import SearchBudget
+from python_task_planning.operator_library import OperatorLibrary
+from python_task_planning.hooks import PlannerHooks
+from python_task_planning.profiler import PlanStats
+from python_task_planning.lookahead import Lookahead
+
+# library code only logs; applications choose where the messages go
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -1,6 +1,101 @@
-def a_star(start, goal_test, action_generator, heuristic):
+import heapq
+import itertools
+import logging
+import time
+from array import array
+import numpy as np
+
+from python_task_planning.csr_graph import CSRGraph, CSROverlay
+from python_task_planning.exceptions import SearchBudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+class SearchBudget:
+    def __init__(self, max_expansions=None, deadline=None, max_nodes=None):
+        '''Limits on a single search. Any limit which is None is not enforced.
+
+        Args:
+            max_expansions (int): Maximum number of states expanded.
+            deadline (float): Wall clock time (as returned by time.time()) by which the search
+                must finish. Since it is absolute, one budget can bound a whole sequence of searches.
+            max_nodes (int): Maximum number of states the search keeps track of. Each
+                one costs a few dict entries and a heap entry, so this bounds memory use.
+        '''
+        self.max_expansions = max_expansions
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+
+    def __repr__(self):
+        return 'SearchBudget(max_expansions=%s, deadline=%s, max_nodes=%s)' % (
+            self.max_expansions, self.deadline, self.max_nodes)
+
+    def check(self, n_expansions, n_nodes):
+        '''Returns a description of the exceeded limit, or None if the search may continue.
+        '''
+        if self.max_expansions is not None and n_expansions >= self.max_expansions:
+            return 'expanded %d states' % n_expansions
+        if self.max_nodes is not None and n_nodes >= self.max_nodes:
+            return 'stored %d states' % n_nodes
+        if self.deadline is not None and time.time() >= self.deadline:
+            return 'deadline passed'
+        return None
+
+class NodeTable:
+    def __init__(self):
+        '''Search nodes, numbered in the order in which they were generated.
+
+        The per-node data is kept in parallel arrays: the state, its g and h scores, and a
+        single parent record (the index of the parent node and the action which leads
+        from the parent to this node). The index dict maps each state to its node.
+        '''
+        self.states = []
+        self.actions = []
+        self.parents = array('l')
+        self.g = array('d')
+        self.h = array('d')
+        self.index = {}
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, state, h):
+        '''Adds a node for a new state, with no parent yet, and returns its index.
+        '''
+        ii = len(self.states)
+        self.index[state] = ii
+        self.states.append(state)
+        self.actions.append(None)
+        self.parents.append(-1)
+        self.g.append(float('inf'))
+        self.h.append(h)
+        return ii
+
+    def set_parent(self, ii, parent, action, g):
+        self.parents[ii] = parent
+        self.actions[ii] = action
+        self.g[ii] = g
+
+    def plan_to(self, ii):
+        '''Returns the list of (action, state) pairs from the start node to the given one,
+        where each action leads from its state to the next one, and the last action is None.
+        '''
+        plan = []
+        action = None
+        while ii >= 0:
+            plan.append((action, self.states[ii]))
+            action = self.actions[ii]
+            ii = self.parents[ii]
+        plan.reverse()
+        return plan
+
+def a_star(start, goal_test, action_generator, heuristic, weight=1.0, budget=None, on_expand=None,
+        on_generate=None, stats=None, executor=None, batch_size=8):
     '''
-    Taken almost verbatim from http://en.wikipedia.org/wiki/A*_search_algorithm.
+    Adapted from http://en.wikipedia.org/wiki/A*_search_algorithm.
+
+    The open set is a binary heap of (f_score, tie_breaker, state) entries. Instead of
+    a decrease-key operation, a state whose g_score improves is pushed again, and
+    stale entries are skipped when they are popped.
 
     Args:
         start: Start state.
@@ -8,59 +103,563 @@ def a_star(start, goal_test, action_generator, heuristic):
         action_generator: Generator which takes a state and yields all possible pairs (action, next_state state)
             of actions a that can be taken, and the next state which they will yield.
         heuristic: Function which takes a state and returns its heuristic value.
+        weight (float): Weighted A* if greater than 1: f = g + weight * h. The cost of the
+            returned plan is then at most weight times the optimal cost.
+        budget (SearchBudget): Limits on the search. SearchBudgetExceededError is raised
+            when one of them is reached.
+        on_expand, on_generate: Hooks called for each expanded state and generated
+            successor, or None; see PlannerHooks.
+        stats (PlanStats): If given, the numbers of states expanded, generated and stored
+            and the peak size of the open set are added to it when the search ends.
+        executor: Object with a map(function, iterable) method, such as a multiprocessing
+            Pool or ThreadPool or a concurrent.futures executor. If given, the successors of
+            up to batch_size of the best open states are generated concurrently; see
+            _a_star_parallel.
+        batch_size (int): Number of states whose successors are generated at a time.
+
+    If action_generator is a CSRGraph or CSROverlay, states are its node indices and the
+    search runs over its arrays directly (see _a_star_csr); the heuristic may then also be
+    an array of per-node values.
     '''
-    closed_set = set()
-    open_set = set([start])
-    came_from = {}
-    action_used = {}
+    if executor is not None:
+        return _a_star_parallel(start, goal_test, action_generator, heuristic, weight, budget, on_expand,
+            on_generate, stats, executor, batch_size)
+    if isinstance(action_generator, (CSRGraph, CSROverlay)):
+        return _a_star_csr(start, goal_test, action_generator, heuristic, weight, budget, on_expand, on_generate,
+            stats)
 
-    g_score = {start: 0.0}
-    h_score = {start: heuristic(start)}
-    f_score = {start: g_score[start] + h_score[start]}
+    nodes = NodeTable()
+    closed = bytearray()
 
-    while len(open_set) > 0:
-        current = min(open_set, key=f_score.get)
+    # ties in f_score are broken in insertion order, so states never get compared
+    counter = itertools.count()
+
+    ii = nodes.add(start, heuristic(start))
+    closed.append(0)
+    nodes.g[ii] = 0.0
+    open_heap = [(weight * nodes.h[ii], next(counter), ii)]
+    n_expansions = 0
+    n_generated = 0
+    max_open = 1
+
+    while len(open_heap) > 0:
+        if len(open_heap) > max_open:
+            max_open = len(open_heap)
+        f, _, ii = heapq.heappop(open_heap)
+        if closed[ii] or f > nodes.g[ii] + weight * nodes.h[ii]:
+            # stale entry left behind by a later, cheaper push
+            continue
+        current = nodes.states[ii]
         if goal_test(current):
-            path = reconstruct_path(came_from, action_used, current)
-            actions = reconstruct_actions(path, action_used)
-            return zip(actions, path)
+            logger.debug('A* found a plan after expanding %d states', n_expansions)
+            _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+            return nodes.plan_to(ii)
+
+        if budget is not None:
+            exceeded = budget.check(n_expansions, len(nodes))
+            if exceeded is not None:
+                _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+                raise SearchBudgetExceededError('A* search budget exceeded: %s' % exceeded)
 
-        open_set.remove(current)
-        closed_set.add(current)
+        n_expansions += 1
+        closed[ii] = 1
+        g_current = nodes.g[ii]
+        if on_expand is not None:
+            on_expand(current, g_current)
         for action, neighbor, cost in action_generator(current):
-            if neighbor in closed_set:
+            n_generated += 1
+            if on_generate is not None:
+                on_generate(current, action, neighbor, cost)
+            jj = nodes.index.get(neighbor)
+            if jj is None:
+                jj = nodes.add(neighbor, heuristic(neighbor))
+                closed.append(0)
+            elif closed[jj]:
+                continue
+            tentative_g_score = g_current + cost
+            if tentative_g_score >= nodes.g[jj]:
+                continue
+
+            nodes.set_parent(jj, ii, action, tentative_g_score)
+            heapq.heappush(open_heap, (tentative_g_score + weight * nodes.h[jj], next(counter), jj))
+    logger.debug('A* found no plan after expanding %d states', n_expansions)
+    _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+    return None
+
+class _Successors:
+    def __init__(self, action_generator):
+        '''Lists the successors of a state. Unlike a lambda it can be pickled, for process pools.
+        '''
+        self.action_generator = action_generator
+
+    def __call__(self, state):
+        return list(self.action_generator(state))
+
+def _lookahead(open_heap, nodes, closed, weight, n, skip):
+    '''Indices of the best n states on the open heap which are still open and not in skip,
+    in the order in which they would be popped. The heap is left as it was.
+    '''
+    popped = []
+    ahead = []
+    while len(open_heap) > 0 and len(ahead) < n:
+        entry = heapq.heappop(open_heap)
+        popped.append(entry)
+        f, _, ii = entry
+        if not closed[ii] and f <= nodes.g[ii] + weight * nodes.h[ii] and ii not in skip and ii not in ahead:
+            ahead.append(ii)
+    for entry in popped:
+        heapq.heappush(open_heap, entry)
+    return ahead
+
+def _a_star_parallel(start, goal_test, action_generator, heuristic, weight, budget, on_expand, on_generate,
+        stats, executor, batch_size):
+    '''A* which generates successors in batches through an executor, for action generators
+    which are expensive compared to the rest of the search.
+
+    When a state is to be expanded and its successors are not known yet, they are
+    generated together with those of the next batch_size - 1 states on the open heap,
+    with one executor.map call. The search itself, including duplicate detection, the
+    closed set and tie-breaking, runs in this process exactly as in a_star, using the
+    generated successors in the same order, so it returns the same plan as a_star.
+    Successors of states which a_star would not have expanded are wasted work.
+
+    The action generator must be safe to call concurrently, and for process pools it
+    must be picklable (a module level function, or an object of a module level class),
+    as must the states and actions. States come back from other processes as copies, so
+    they need value based equality and hashing.
+    '''
+    successors_of = _Successors(action_generator)
+    nodes = NodeTable()
+    closed = bytearray()
+    counter = itertools.count()
+
+    ii = nodes.add(start, heuristic(start))
+    closed.append(0)
+    nodes.g[ii] = 0.0
+    open_heap = [(weight * nodes.h[ii], next(counter), ii)]
+    n_expansions = 0
+    n_generated = 0
+    max_open = 1
+    # successors generated ahead of time, by node index
+    pending = {}
+    n_batches = 0
+
+    while len(open_heap) > 0:
+        if len(open_heap) > max_open:
+            max_open = len(open_heap)
+        f, _, ii = heapq.heappop(open_heap)
+        if closed[ii] or f > nodes.g[ii] + weight * nodes.h[ii]:
+            continue
+        current = nodes.states[ii]
+        if goal_test(current):
+            logger.debug('Parallel A* found a plan after expanding %d states in %d batches, %d expanded ahead '
+                'and not used', n_expansions, n_batches, len(pending))
+            _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+            return nodes.plan_to(ii)
+
+        if budget is not None:
+            exceeded = budget.check(n_expansions, len(nodes))
+            if exceeded is not None:
+                _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+                raise SearchBudgetExceededError('A* search budget exceeded: %s' % exceeded)
+
+        n_expansions += 1
+        closed[ii] = 1
+        g_current = nodes.g[ii]
+        if on_expand is not None:
+            on_expand(current, g_current)
+        successors = pending.pop(ii, None)
+        if successors is None:
+            batch = [ii] + _lookahead(open_heap, nodes, closed, weight, batch_size - 1, pending)
+            results = list(executor.map(successors_of, [nodes.states[jj] for jj in batch]))
+            pending.update(zip(batch[1:], results[1:]))
+            successors = results[0]
+            n_batches += 1
+        for action, neighbor, cost in successors:
+            n_generated += 1
+            if on_generate is not None:
+                on_generate(current, action, neighbor, cost)
+            jj = nodes.index.get(neighbor)
+            if jj is None:
+                jj = nodes.add(neighbor, heuristic(neighbor))
+                closed.append(0)
+            elif closed[jj]:
                 continue
-            tentative_g_score = g_score[current] + cost
-
-            if neighbor not in open_set:
-                open_set.add(neighbor)
-                h_score[neighbor] = heuristic(neighbor)
-                tentative_is_better = True
-            elif tentative_g_score < g_score[neighbor]:
-                tentative_is_better = True
-            else:
-                tentative_is_better = False
-
-            if tentative_is_better:
-                came_from[neighbor] = current
-                action_used[neighbor] = action
-                g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = g_score[neighbor] + h_score[neighbor]
+            tentative_g_score = g_current + cost
+            if tentative_g_score >= nodes.g[jj]:
+                continue
+
+            nodes.set_parent(jj, ii, action, tentative_g_score)
+            heapq.heappush(open_heap, (tentative_g_score + weight * nodes.h[jj], next(counter), jj))
+    logger.debug('Parallel A* found no plan after expanding %d states in %d batches', n_expansions, n_batches)
+    _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
     return None
-            
-def reconstruct_path(came_from, action_used, current_state):
-    if current_state in came_from:
-        p = reconstruct_path(came_from, action_used, came_from[current_state])
-        return p + [current_state]
+
+def _record_stats(stats, n_expanded, n_generated, n_stored, max_open):
+    if stats is not None:
+        stats.expanded += n_expanded
+        stats.generated += n_generated
+        stats.stored += n_stored
+        stats.max_open = max(stats.max_open, max_open)
+
+def _a_star_csr(start, goal_test, graph, heuristic, weight, budget, on_expand=None, on_generate=None,
+        stats=None):
+    '''A* over a CSRGraph, with the per-node data kept in arrays indexed by node rather
+    than in a NodeTable, so that no per-node Python objects are created. The successors
+    of each expanded node are relaxed with a few array operations on its slice of the
+    edge arrays; only the improved ones are pushed onto the heap. For a CSROverlay, the
+    extra edges of the few nodes which have them are appended to their slices.
+    '''
+    n = len(graph)
+    if isinstance(graph, CSROverlay):
+        extra = graph.extra
+        base = graph.graph
+    else:
+        extra = None
+        base = graph
+    n_base = len(base)
+    indptr, indices, weights = base.indptr, base.indices, base.weights
+    g = np.empty(n)
+    g.fill(np.inf)
+    parents = np.empty(n, dtype=indices.dtype)
+    parents.fill(-1)
+    closed = np.zeros(n, dtype=bool)
+    if callable(heuristic):
+        # computed when a node is first reached; nan marks nodes not reached yet
+        h = np.empty(n)
+        h.fill(np.nan)
+        h[start] = heuristic(start)
     else:
-        return [current_state]
-
-def reconstruct_actions(path, action_used):
-    actions = []
-    for ii in range(len(path)):
-        if ii + 1 < len(path):
-            next_state = path[ii+1]
-            actions.append(action_used[next_state])
+        h = np.asarray(heuristic, dtype=float)
+
+    counter = itertools.count()
+    g[start] = 0.0
+    open_heap = [(weight * h[start], next(counter), start)]
+    n_expansions = 0
+    n_generated = 0
+    n_nodes = 1
+    max_open = 1
+
+    while len(open_heap) > 0:
+        if len(open_heap) > max_open:
+            max_open = len(open_heap)
+        f, _, ii = heapq.heappop(open_heap)
+        if closed[ii] or f > g[ii] + weight * h[ii]:
+            continue
+        if goal_test(ii):
+            _record_stats(stats, n_expansions, n_generated, n_nodes, max_open)
+            plan = [(None, ii)]
+            while parents[ii] >= 0:
+                plan.append((ii, int(parents[ii])))
+                ii = int(parents[ii])
+            plan.reverse()
+            return plan
+
+        if budget is not None:
+            exceeded = budget.check(n_expansions, n_nodes)
+            if exceeded is not None:
+                _record_stats(stats, n_expansions, n_generated, n_nodes, max_open)
+                raise SearchBudgetExceededError('A* search budget exceeded: %s' % exceeded)
+
+        n_expansions += 1
+        closed[ii] = True
+        if extra is None or (ii < n_base and ii not in extra):
+            start_edge, end_edge = indptr[ii], indptr[ii+1]
+            neighbors, edge_weights = indices[start_edge:end_edge], weights[start_edge:end_edge]
+        else:
+            neighbors, edge_weights = graph.neighbors(ii)
+        n_generated += len(neighbors)
+        if on_expand is not None:
+            on_expand(ii, g[ii])
+        if on_generate is not None:
+            for jj, cost in zip(neighbors.tolist(), edge_weights.tolist()):
+                on_generate(ii, jj, jj, cost)
+        tentative = g[ii] + edge_weights
+        improved = tentative < g[neighbors]
+        if not improved.any():
+            continue
+        neighbors = neighbors[improved]
+        tentative = tentative[improved]
+        if len(neighbors) > 1:
+            # keep the cheapest of parallel edges to the same neighbor
+            order = np.lexsort((tentative, neighbors))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = neighbors[order][1:] != neighbors[order][:-1]
+            neighbors, tentative = neighbors[order][first], tentative[order][first]
+        # as in a_star, closed nodes are not reopened
+        open_mask = ~closed[neighbors]
+        neighbors, tentative = neighbors[open_mask], tentative[open_mask]
+        n_nodes += int(np.isinf(g[neighbors]).sum())
+        g[neighbors] = tentative
+        parents[neighbors] = ii
+        if callable(heuristic):
+            for jj in neighbors[np.isnan(h[neighbors])].tolist():
+                h[jj] = heuristic(jj)
+        for jj, f in zip(neighbors.tolist(), (tentative + weight * h[neighbors]).tolist()):
+            heapq.heappush(open_heap, (f, next(counter), jj))
+    _record_stats(stats, n_expansions, n_generated, n_nodes, max_open)
+    return None
+
+def bidirectional_a_star(start, goal, action_generator, heuristic=None, reverse_heuristic=None,
+        reverse_action_generator=None, symmetric=False, budget=None):
+    '''Bidirectional A* between two known states, for explicit graphs.
+
+    Searches forward from start and backward from goal, always expanding the side whose
+    smallest key is lower. With heuristics, both searches use the average potential
+    p(s) = (heuristic(s) - reverse_heuristic(s)) / 2 of Ikeda et al. (forward keys are
+    g + p, backward keys are g - p), which keeps the reduced edge costs non-negative as
+    long as both heuristics are consistent. The search stops once the two smallest keys
+    add up to at least the cost of the best path seen through a state reached from both
+    sides, which is then optimal. Without heuristics this is bidirectional Dijkstra.
+
+    Args:
+        start: Start state.
+        goal: Goal state.
+        action_generator: As for a_star.
+        heuristic: Function which estimates the cost from a state to goal, or None.
+        reverse_heuristic: Function which estimates the cost from start to a state, or None.
+        reverse_action_generator: Generator which takes a state and yields all triples
+            (action, previous_state, cost) such that action leads from previous_state to
+            the given state at the given cost.
+        symmetric (bool): If True, every action can be undone at the same cost, so
+            action_generator is also used to search backward. The actions on the
+            backward half of the plan are then looked up with action_generator.
+        budget (SearchBudget): Limits on the search.
+
+    Returns:
+        A plan in the format returned by a_star, or None if goal cannot be reached.
+    '''
+    if reverse_action_generator is None:
+        if not symmetric:
+            raise ValueError('Need a reverse_action_generator, or symmetric=True')
+        reverse_action_generator = action_generator
+
+    if start == goal:
+        return [(None, start)]
+
+    def potential(state):
+        p = 0.0
+        if heuristic is not None:
+            p += heuristic(state)
+        if reverse_heuristic is not None:
+            p -= reverse_heuristic(state)
+        return 0.5 * p
+
+    counter = itertools.count()
+    # forward nodes have h = p, backward nodes have h = -p, so both use the key g + h
+    searches = []
+    for root, sign, generator in [(start, 1.0, action_generator), (goal, -1.0, reverse_action_generator)]:
+        nodes = NodeTable()
+        ii = nodes.add(root, sign * potential(root))
+        nodes.g[ii] = 0.0
+        searches.append((nodes, bytearray([0]), [(nodes.h[ii], next(counter), ii)], sign, generator))
+
+    best_cost = float('inf')
+    meeting_state = None
+    n_expansions = 0
+    while True:
+        tops = []
+        for nodes, closed, open_heap, sign, generator in searches:
+            # drop stale entries so that the top of each heap is a real key
+            while len(open_heap) > 0 and (closed[open_heap[0][2]] or
+                    open_heap[0][0] > nodes.g[open_heap[0][2]] + nodes.h[open_heap[0][2]]):
+                heapq.heappop(open_heap)
+            tops.append(open_heap[0][0] if len(open_heap) > 0 else float('inf'))
+        if tops[0] + tops[1] >= best_cost or min(tops) == float('inf'):
+            break
+
+        if budget is not None:
+            exceeded = budget.check(n_expansions, len(searches[0][0]) + len(searches[1][0]))
+            if exceeded is not None:
+                raise SearchBudgetExceededError('Bidirectional A* search budget exceeded: %s' % exceeded)
+
+        side = 0 if tops[0] <= tops[1] else 1
+        nodes, closed, open_heap, sign, generator = searches[side]
+        other_nodes = searches[1 - side][0]
+        f, _, ii = heapq.heappop(open_heap)
+        n_expansions += 1
+        closed[ii] = 1
+        g_current = nodes.g[ii]
+        for action, neighbor, cost in generator(nodes.states[ii]):
+            jj = nodes.index.get(neighbor)
+            if jj is None:
+                jj = nodes.add(neighbor, sign * potential(neighbor))
+                closed.append(0)
+            elif closed[jj]:
+                continue
+            tentative_g_score = g_current + cost
+            if tentative_g_score >= nodes.g[jj]:
+                continue
+
+            nodes.set_parent(jj, ii, action, tentative_g_score)
+            heapq.heappush(open_heap, (tentative_g_score + nodes.h[jj], next(counter), jj))
+
+            kk = other_nodes.index.get(neighbor)
+            if kk is not None and tentative_g_score + other_nodes.g[kk] < best_cost:
+                best_cost = tentative_g_score + other_nodes.g[kk]
+                meeting_state = neighbor
+
+    if meeting_state is None:
+        return None
+
+    forward_nodes, backward_nodes = searches[0][0], searches[1][0]
+    plan = forward_nodes.plan_to(forward_nodes.index[meeting_state])
+    plan.pop()
+
+    # walk the backward search tree from the meeting state to the goal
+    ii = backward_nodes.index[meeting_state]
+    while backward_nodes.parents[ii] >= 0:
+        state = backward_nodes.states[ii]
+        next_ii = backward_nodes.parents[ii]
+        if symmetric and reverse_action_generator is action_generator:
+            action = _action_between(action_generator, state, backward_nodes.states[next_ii])
         else:
-            actions.append(None)
-    return actions
+            action = backward_nodes.actions[ii]
+        plan.append((action, state))
+        ii = next_ii
+    plan.append((None, backward_nodes.states[ii]))
+    return plan
+
+def _action_between(action_generator, state, next_state):
+    '''Cheapest action which leads from state to next_state.
+    '''
+    best = None
+    for action, neighbor, cost in action_generator(state):
+        if neighbor == next_state and (best is None or cost < best[1]):
+            best = (action, cost)
+    return best[0]
+
+def _suboptimality_bound(nodes, frontier, best_cost):
+    '''Bound on how many times more expensive a plan of cost best_cost is than an optimal
+    plan. The optimal cost is at least the smallest unweighted f_score of any node not yet
+    expanded.
+    '''
+    if len(frontier) == 0:
+        return 1.0
+    lower = min(nodes.g[ii] + nodes.h[ii] for ii in frontier)
+    if lower <= 0:
+        return float('inf')
+    return max(best_cost / lower, 1.0)
+
+def ara_star(start, goal_test, action_generator, heuristic, weights=(5.0, 3.0, 2.0, 1.5, 1.0), budget=None,
+        on_expand=None, on_generate=None, stats=None):
+    '''Anytime Repairing A* (Likhachev, Gordon and Thrun, 2003).
+
+    Runs weighted A* with each of the given (decreasing) weights in turn, reusing the
+    search effort of the previous iterations, and yields every plan which is better than
+    the previous one. The last weight should be 1 to end with an optimal plan.
+
+    Since the goal is given as a test rather than a state, a goal state is never
+    expanded; an iteration ends once no open state has a smaller weighted f_score
+    than the cost of the best plan found so far.
+
+    Args:
+        start, goal_test, action_generator, heuristic: As for a_star.
+        weights (list of float): Heuristic weights to use, largest first.
+        budget (SearchBudget): Limits on the whole search. When one of them is reached,
+            SearchBudgetExceededError is raised, with the best plan found so far and its
+            suboptimality bound attached.
+        on_expand, on_generate, stats: As for a_star, over all of the iterations. The stats
+            are recorded when the generator is exhausted or the budget runs out.
+
+    Yields:
+        (plan, bound): A plan in the format returned by a_star, and a bound on how many times
+            more expensive it is than an optimal plan.
+    '''
+    nodes = NodeTable()
+    counter = itertools.count()
+
+    ii = nodes.add(start, heuristic(start))
+    nodes.g[ii] = 0.0
+    n_expansions = 0
+    n_generated = 0
+    max_open = 1
+
+    best_goal = None
+    best_plan = None
+    best_cost = float('inf')
+    bound = float('inf')
+
+    open_nodes = set([ii])
+    incons = set()
+    for weight in weights:
+        # nodes whose g_score improved after they were expanded get another chance
+        open_nodes.update(incons)
+        incons = set()
+        closed = set()
+        open_heap = [(nodes.g[ii] + weight * nodes.h[ii], next(counter), ii) for ii in open_nodes]
+        heapq.heapify(open_heap)
+
+        while len(open_heap) > 0 and open_heap[0][0] < best_cost:
+            if len(open_heap) > max_open:
+                max_open = len(open_heap)
+            f, _, ii = heapq.heappop(open_heap)
+            if ii not in open_nodes or f > nodes.g[ii] + weight * nodes.h[ii]:
+                continue
+            open_nodes.remove(ii)
+            current = nodes.states[ii]
+
+            if goal_test(current):
+                if nodes.g[ii] < best_cost:
+                    best_goal = ii
+                    best_cost = nodes.g[ii]
+                    best_plan = None
+                # goal states are not expanded; a cheaper path to one reopens it in the next iteration
+                closed.add(ii)
+                continue
+
+            if budget is not None:
+                exceeded = budget.check(n_expansions, len(nodes))
+                if exceeded is not None:
+                    if best_goal is not None:
+                        if best_plan is None:
+                            best_plan = nodes.plan_to(best_goal)
+                        # ii was popped but not expanded, so it is still part of the frontier
+                        bound = min(bound, _suboptimality_bound(nodes, open_nodes | incons | set([ii]), best_cost))
+                    _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+                    raise SearchBudgetExceededError('ARA* search budget exceeded: %s' % exceeded,
+                        best_plan, bound)
+
+            n_expansions += 1
+            closed.add(ii)
+            g_current = nodes.g[ii]
+            if on_expand is not None:
+                on_expand(current, g_current)
+            for action, neighbor, cost in action_generator(current):
+                n_generated += 1
+                if on_generate is not None:
+                    on_generate(current, action, neighbor, cost)
+                jj = nodes.index.get(neighbor)
+                if jj is None:
+                    jj = nodes.add(neighbor, heuristic(neighbor))
+                tentative_g_score = g_current + cost
+                if tentative_g_score >= nodes.g[jj]:
+                    continue
+
+                nodes.set_parent(jj, ii, action, tentative_g_score)
+                if jj in closed:
+                    incons.add(jj)
+                else:
+                    open_nodes.add(jj)
+                    heapq.heappush(open_heap, (tentative_g_score + weight * nodes.h[jj], next(counter), jj))
+
+        if best_goal is None:
+            if len(open_nodes) == 0 and len(incons) == 0:
+                # search space exhausted without reaching a goal
+                _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
+                return
+            continue
+
+        new_bound = max(min(weight, _suboptimality_bound(nodes, open_nodes | incons, best_cost)), 1.0)
+
+        if best_plan is None:
+            best_plan = nodes.plan_to(best_goal)
+            bound = new_bound
+            yield best_plan, bound
+        elif new_bound < bound:
+            bound = new_bound
+            yield best_plan, bound
+
+        if bound <= 1.0:
+            break
+    _record_stats(stats, n_expansions, n_generated, len(nodes), max_open)
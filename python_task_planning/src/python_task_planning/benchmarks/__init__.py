@@ -0,0 +1,7 @@
+'''
+Scalable synthetic domains and a runner for benchmarking the planners; see runner.py
+for the command line interface.
+'''
+from python_task_planning.benchmarks.domains import BenchmarkWorld, Problem, table_setting, GENERATORS
+from python_task_planning.benchmarks.runner import SUITES, case, run_case, run_suite, save_results, \
+     load_results, compare
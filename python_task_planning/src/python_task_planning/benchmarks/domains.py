@@ -0,0 +1,107 @@
+'''
+Generators of synthetic HPN domains whose size can be scaled, for benchmarking.
+'''
+from python_task_planning.common import Symbol, Variable, Predicate, ConjunctionOfFluents, FluentStore, Operator
+
+class BenchmarkWorld:
+    def __init__(self, facts):
+        '''World for the generated domains: a store of the fluents which hold. Executing an
+        operator instance checks its preconditions and adds its target and side effects.
+        '''
+        self.current_state = FluentStore(facts)
+
+    def execute(self, op):
+        if not self.current_state.entails(op.preconditions):
+            raise RuntimeError('Preconditions of %s dont hold' % str(op))
+        for f in [op.target] + list(op.side_effects.fluents):
+            self.current_state.add(f)
+        return self.current_state
+
+    def entails(self, cof):
+        return self.current_state.entails(cof)
+
+class Problem:
+    def __init__(self, name, params, operators, facts, goal):
+        '''A generated planning problem.
+
+        Args:
+            name (str): Name of the generator.
+            params (dict): Arguments the generator was called with.
+            operators (list of Operator): Operators of the domain.
+            facts (list of Fluent): Fluents which hold initially.
+            goal (ConjunctionOfFluents): Goal to plan for.
+        '''
+        self.name = name
+        self.params = params
+        self.operators = operators
+        self.facts = facts
+        self.goal = goal
+
+    def __repr__(self):
+        return '%s(%s)' % (self.name, ', '.join(['%s=%s' % item for item in sorted(self.params.items())]))
+
+    def start_state(self):
+        return ConjunctionOfFluents(list(self.facts))
+
+    def make_world(self):
+        '''A new world in the initial state, since executing a plan changes the world.
+        '''
+        return BenchmarkWorld(self.facts)
+
+def table_setting(n_settings=1, n_objects=2, depth=1, branching=1):
+    '''Table setting domain, a scalable version of examples/set_table.
+
+    Each of the n_settings place settings is done once each of its n_objects objects is
+    set. Setting an object means putting it at a location which is free; a suggester
+    proposes branching candidate locations, of which only the last is free, so the
+    planner has to reject the others. Putting an object needs it to be in the gripper
+    and depth - 1 more preparation steps, each at its own abstraction level, so the
+    hierarchy of Put refinements is depth levels deep.
+
+    The predicate names differ from those of examples/set_table, since predicates are
+    interned by name.
+
+    Args:
+        n_settings (int): Number of place settings in the goal.
+        n_objects (int): Number of objects per setting.
+        depth (int): Number of abstraction levels of the preconditions of Put.
+        branching (int): Number of locations suggested for each object.
+    '''
+    SettingDone = Predicate('SettingDone', ['setting'])
+    ItemSet = Predicate('ItemSet', ['object', 'setting'])
+    ItemAtLoc = Predicate('ItemAtLoc', ['object', 'setting', 'loc'])
+    SettingLocFree = Predicate('SettingLocFree', ['loc'])
+    ItemInGripper = Predicate('ItemInGripper', ['object', 'setting'])
+    prepared = [Predicate('ItemPrepared%d' % kk, ['object', 'setting']) for kk in range(1, depth)]
+
+    settings = [Symbol('setting%d' % ii) for ii in range(n_settings)]
+    objects = [Symbol('object%d' % jj) for jj in range(n_objects)]
+    locations = [Symbol('loc%d' % kk) for kk in range(branching)]
+
+    def location_suggester(world, current_state, goal):
+        for loc in locations:
+            yield loc
+
+    setting, obj, loc = Variable('setting'), Variable('object'), Variable('loc')
+    no_effects = ConjunctionOfFluents([])
+    operators = [
+        Operator('SetSetting', SettingDone((setting,)), {},
+            [(1, ItemSet((o, setting))) for o in objects], no_effects, True),
+        Operator('SetObject', ItemSet((obj, setting)), {loc: location_suggester},
+            [(0, SettingLocFree((loc,))), (1, ItemAtLoc((obj, setting, loc)))], no_effects, True),
+        Operator('Put', ItemAtLoc((obj, setting, loc)), {},
+            [(1, ItemInGripper((obj, setting)))] + [(kk + 2, p((obj, setting))) for (kk, p) in enumerate(prepared)],
+            no_effects, True),
+        Operator('Pick', ItemInGripper((obj, setting)), {}, [], no_effects, True),
+        ]
+    for kk, p in enumerate(prepared):
+        operators.append(Operator('Prepare%d' % (kk + 1), p((obj, setting)), {}, [], no_effects, True))
+
+    params = dict(n_settings=n_settings, n_objects=n_objects, depth=depth, branching=branching)
+    goal = ConjunctionOfFluents([SettingDone((s,)) for s in settings])
+    return Problem('table_setting', params, operators, [SettingLocFree((locations[-1],))], goal)
+
+# generators by name, so that benchmark cases can be described by plain data
+GENERATORS = {
+    'table_setting': table_setting,
+    }
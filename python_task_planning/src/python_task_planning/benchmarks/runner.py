@@ -0,0 +1,220 @@
+'''
+Runs hpn and plan_flat on generated domains and records wall time, expansions, plan
+length and peak memory as JSON, so that results can be compared between commits.
+
+Usage: python -m python_task_planning.benchmarks.runner [--suite small|default]
+           [--runs N] [--timeout SECONDS] [--out results.json] [--baseline old.json]
+'''
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+
+from python_task_planning import hpn_module
+from python_task_planning.common import HPlanTree
+from python_task_planning.a_star import SearchBudget
+from python_task_planning.exceptions import PlanningFailedError, SearchBudgetExceededError
+from python_task_planning.profiler import PlanStats, subtree_stats
+from python_task_planning.benchmarks.domains import GENERATORS
+
+def case(domain, planner='hpn', heuristic='num_violated', **params):
+    '''Description of one benchmark case, as plain data.
+    '''
+    return {'domain': domain, 'params': params, 'planner': planner, 'heuristic': heuristic}
+
+SUITES = {
+    'small': [
+        case('table_setting', 'hpn', n_settings=1, n_objects=2, depth=1, branching=1),
+        case('table_setting', 'plan_flat', n_settings=1, n_objects=2, depth=1, branching=1),
+        case('table_setting', 'hpn', n_settings=2, n_objects=2, depth=2, branching=2),
+        case('table_setting', 'plan_flat', n_settings=2, n_objects=2, depth=2, branching=2),
+        ],
+    }
+SUITES['default'] = SUITES['small'] + [
+    case('table_setting', 'hpn', n_settings=2, n_objects=3, depth=2, branching=3),
+    case('table_setting', 'hpn', 'h_ff', n_settings=2, n_objects=3, depth=2, branching=3),
+    case('table_setting', 'hpn', n_settings=4, n_objects=3, depth=3, branching=3),
+    case('table_setting', 'hpn', n_settings=6, n_objects=3, depth=3, branching=3),
+    case('table_setting', 'hpn', n_settings=4, n_objects=3, depth=5, branching=3),
+    case('table_setting', 'plan_flat', n_settings=3, n_objects=2, depth=1, branching=2),
+    ]
+
+def case_name(c):
+    params = ', '.join(['%s=%s' % item for item in sorted(c['params'].items())])
+    return '%s(%s) %s:%s' % (c['domain'], params, c['planner'], c['heuristic'])
+
+def peak_rss_mb():
+    '''Peak resident set size of this process; ru_maxrss is in kilobytes on linux and
+    in bytes on mac os.
+    '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+def run_case(c, n_runs=3, timeout=None):
+    '''Runs a benchmark case n_runs times in this process.
+
+    Args:
+        c (dict): Case, as made by case().
+        n_runs (int): Number of runs; the minimum and mean wall time are recorded.
+        timeout (float): Seconds each run may take, enforced with a SearchBudget deadline.
+
+    Returns:
+        The case, with its results added: status ('ok', 'budget exceeded' or 'failed'),
+        time_min and time_mean in seconds, expanded and generated (states, over all of the
+        searches of a run), plan_length (operator instances executed by hpn, or in the plan
+        of plan_flat) and peak_rss_mb.
+    '''
+    generate = GENERATORS[c['domain']]
+    result = dict(c)
+    times = []
+    for ii in range(n_runs):
+        problem = generate(**c['params'])
+        budget = SearchBudget(deadline=time.time() + timeout) if timeout is not None else None
+        stats = PlanStats()
+        status = 'ok'
+        t_start = time.time()
+        try:
+            if c['planner'] == 'hpn':
+                tree = HPlanTree()
+                try:
+                    hpn_module.hpn(problem.operators, problem.start_state(), problem.goal, problem.make_world(),
+                        tree=tree, heuristic=c['heuristic'], budget=budget)
+                finally:
+                    stats = subtree_stats(tree)
+                plan_length = stats.executions
+            else:
+                plan = hpn_module.plan_flat(problem.operators, problem.make_world(), problem.start_state(),
+                    problem.goal, heuristic=c['heuristic'], budget=budget, stats=stats)
+                if plan is None:
+                    raise PlanningFailedError('plan_flat could not find a plan')
+                plan_length = len([op for (op, subgoal) in plan if op is not None])
+        except SearchBudgetExceededError:
+            status = 'budget exceeded'
+        except PlanningFailedError:
+            status = 'failed'
+        times.append(time.time() - t_start)
+        if status != 'ok':
+            plan_length = None
+            break
+
+    result.update(status=status, runs=len(times), time_min=min(times), time_mean=sum(times) / len(times),
+        expanded=stats.expanded, generated=stats.generated, plan_length=plan_length, peak_rss_mb=peak_rss_mb())
+    return result
+
+def _run_in_child(c, n_runs, timeout, queue):
+    queue.put(run_case(c, n_runs, timeout))
+
+def run_isolated(c, n_runs=3, timeout=None):
+    '''Like run_case, but in a child process, so that peak_rss_mb covers this case only
+    (plus the memory of the interpreter).
+    '''
+    import multiprocessing
+    import Queue
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_in_child, args=(c, n_runs, timeout, queue))
+    process.start()
+    try:
+        while True:
+            try:
+                result = queue.get(timeout=1.0)
+                break
+            except Queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError('Benchmark process for %s exited with code %s' % (
+                        case_name(c), process.exitcode))
+    finally:
+        if process.is_alive():
+            process.join(1.0)
+        if process.is_alive():
+            process.terminate()
+    return result
+
+def run_suite(cases, n_runs=3, timeout=None, isolate=True, verbose=False):
+    '''Runs a list of cases (such as SUITES['default']) and returns their results.
+    '''
+    results = []
+    for c in cases:
+        result = (run_isolated if isolate else run_case)(c, n_runs, timeout)
+        if verbose:
+            print format_result(result)
+            sys.stdout.flush()
+        results.append(result)
+    return results
+
+def format_result(r):
+    return '%-76s %-15s %9.4fs %9d expanded %5s steps %7.1f MB' % (case_name(r), r['status'], r['time_min'],
+        r['expanded'], r['plan_length'], r['peak_rss_mb'])
+
+def git_commit():
+    '''Commit of the source tree the package was imported from, or None if it is not in
+    a git repository.
+    '''
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=devnull,
+                cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(results, filename):
+    '''Writes results to a JSON file, with the commit and machine they came from.
+    '''
+    with open(filename, 'w') as f:
+        json.dump({
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'results': results,
+            }, f, indent=1, sort_keys=True)
+
+def load_results(filename):
+    with open(filename) as f:
+        return json.load(f)['results']
+
+def compare(baseline, results, threshold=0.1):
+    '''Compares results with those of a baseline run, matching up the same cases.
+
+    Args:
+        baseline, results (list of dict): Results, as returned by run_suite or load_results.
+        threshold (float): Relative increase in minimum wall time reported as a regression.
+
+    Returns:
+        List of lines, one per case in both, giving the time ratio and the change in
+        expansions and plan length. Cases which got slower by more than the threshold,
+        expand more states or stopped succeeding are marked REGRESSION.
+    '''
+    old = dict([(case_name(r), r) for r in baseline])
+    lines = []
+    for r in results:
+        name = case_name(r)
+        if name not in old:
+            continue
+        b = old[name]
+        ratio = r['time_min'] / b['time_min'] if b['time_min'] > 0 else float('inf')
+        regression = ratio > 1.0 + threshold or r['expanded'] > b['expanded'] or \
+            (b['status'] == 'ok' and r['status'] != 'ok')
+        lines.append('%-70s time x%.2f  expanded %d -> %d  steps %s -> %s%s' % (name, ratio, b['expanded'],
+            r['expanded'], b['plan_length'], r['plan_length'], '  REGRESSION' if regression else ''))
+    return lines
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks hpn and plan_flat on generated domains.')
+    parser.add_argument('--suite', default='default', choices=sorted(SUITES.keys()))
+    parser.add_argument('--runs', type=int, default=3, help='runs per case')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds allowed per run')
+    parser.add_argument('--out', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON file of earlier results to compare with')
+    parser.add_argument('--no-isolate', action='store_true', help='run all cases in this process')
+    args = parser.parse_args()
+
+    results = run_suite(SUITES[args.suite], args.runs, args.timeout, not args.no_isolate, verbose=True)
+    if args.out is not None:
+        save_results(results, args.out)
+    if args.baseline is not None:
+        print
+        print '\n'.join(compare(load_results(args.baseline), results))
@@ -1,3 +1,11 @@
+import itertools
+import threading
+import weakref
+
+# taken only when an interned object is created, so that two threads constructing equal
+# fluents at once still get the same object
+_intern_lock = threading.Lock()
+
 class Symbol:
     def __init__(self, val=None):
         self.val = val
@@ -24,20 +32,49 @@ class Variable:
     def __repr__(self):
         return str(self.name)
 
-class Fluent:
-    def __init__(self, pred, args):
-        self.pred = pred
-        self.args = tuple(args)
+class Fluent(object):
+    __slots__ = ('pred', 'args', '_hash', '__weakref__')
+
+    # maps (class, pred, args) to the one live fluent with that predicate and args
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, pred, args):
+        '''Fluents are interned, so constructing a fluent which is equal to a live
+        one returns the existing object.
+        '''
+        args = tuple(args)
+        key = (cls, pred, args)
+        f = cls._interned.get(key)
+        if f is None:
+            with _intern_lock:
+                f = cls._interned.get(key)
+                if f is None:
+                    f = object.__new__(cls)
+                    f.pred = pred
+                    f.args = args
+                    f._hash = hash((cls, pred, args))
+                    cls._interned[key] = f
+        return f
 
     def __hash__(self):
-        '''Hash depends only on the fluent class and args.
+        '''Hash depends only on the fluent class, predicate and args.
         '''
-        return hash((self.pred, self.args))
+        return self._hash
 
     def __eq__(self, other):
-        '''Equality depends only on fluent class and args.
+        '''Equality depends only on fluent class, predicate and args. Since fluents
+        are interned, two fluents are equal only if they are the same object; fluents
+        of different classes are never equal.
         '''
-        return (self.pred, self.args) == (other.pred, other.args)
+        return self is other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        '''Unpickling interns the fluent again.
+        '''
+        return (type(self), (self.pred, self.args))
 
     def __repr__(self):
         return '%s(%s)' % (self.pred.name, ', '.join([str(a) for a in self.args]))
@@ -54,10 +91,8 @@ class Fluent:
             # (strings starting with upper case are assumed to be variables)
             if (not isinstance(arg_other, Variable)):
                 if isinstance(arg_self, Variable):
-                    print 'binding:', arg_self, arg_other
                     bindings[arg_self] = arg_other
                 else:
-                    print 'not binding:', arg_self, arg_other
                     if not arg_self == arg_other:
                         return None
             else:
@@ -77,31 +112,197 @@ class Fluent:
     def contradicts(self, other):
         return False
 
-class Predicate:
-    def __init__(self, name, argnames):
-        self.name = name
-        self.argnames = argnames
+class Predicate(object):
+    __slots__ = ('name', 'argnames', '_hash', '__weakref__')
+
+    # maps (class, name) to the one live predicate with that name
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, name, argnames):
+        '''Predicates are interned by name, so constructing a predicate with the
+        name of a live one returns the existing object.
+        '''
+        argnames = tuple(argnames)
+        key = (cls, name)
+        pred = cls._interned.get(key)
+        if pred is None:
+            with _intern_lock:
+                pred = cls._interned.get(key)
+                if pred is None:
+                    pred = object.__new__(cls)
+                    pred.name = name
+                    pred.argnames = argnames
+                    pred._hash = hash(name)
+                    cls._interned[key] = pred
+        if pred.argnames != argnames:
+            raise ValueError('Predicate %s already exists with args %s' % (name, str(pred.argnames)))
+        return pred
 
     def __call__(self, args):
         return Fluent(self, args)
 
+    def __reduce__(self):
+        return (type(self), (self.name, self.argnames))
+
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+        if type(self) is type(other) or not isinstance(other, Predicate):
+            return False
         return self.name == other.name
 
-class ConjunctionOfFluents:
-    def __init__(self, fluents):
+    def __ne__(self, other):
+        return not self == other
+
+class FluentStore(object):
+    def __init__(self, fluents=()):
+        '''Mutable set of fluents, indexed so that entails and contradicts
+        don't have to scan every fluent.
+
+        Fluents are indexed by predicate and by predicate plus args. Since
+        fluents are interned, the fluent itself is the key for the second index.
+        A fluent only ever entails or contradicts fluents with the same predicate.
+        For plain Fluents, entailment is equality and nothing is contradicted, so
+        those are answered with a single set lookup. Only fluents whose class
+        overrides entails or contradicts are asked individually, and only the
+        ones with the predicate in question.
+        '''
+        self._fluents = set()
+        self._by_pred = {}
+        self._semantic_by_pred = {}
+        for f in fluents:
+            self.add(f)
+
+    def __repr__(self):
+        return 'FluentStore(%s)' % ', '.join([str(f) for f in self._fluents])
+
+    def __len__(self):
+        return len(self._fluents)
+
+    def __iter__(self):
+        return iter(self._fluents)
+
+    def __contains__(self, f):
+        return f in self._fluents
+
+    @property
+    def fluents(self):
+        return tuple(self._fluents)
+
+    def add(self, f):
+        if f in self._fluents:
+            return
+        self._fluents.add(f)
+        self._by_pred.setdefault(f.pred, set()).add(f)
+        if _has_own_semantics(type(f)):
+            self._semantic_by_pred.setdefault(f.pred, set()).add(f)
+
+    def remove(self, f):
+        self._fluents.remove(f)
+        for index in (self._by_pred, self._semantic_by_pred):
+            fluents = index.get(f.pred)
+            if fluents is not None:
+                fluents.discard(f)
+                if len(fluents) == 0:
+                    del index[f.pred]
+
+    def with_pred(self, pred):
+        '''Returns all fluents with the given predicate.
+        '''
+        return self._by_pred.get(pred, frozenset())
+
+    def entailed_by(self, f):
+        '''Returns the fluents in the store which the given fluent entails.
+        '''
+        if not _has_own_semantics(type(f)):
+            if f in self._fluents:
+                return [f]
+            return []
+        return [fs for fs in self.with_pred(f.pred) if f.entails(fs)]
+
+    def _entails_fluent(self, f):
+        if f in self._fluents:
+            return True
+        semantic = self._semantic_by_pred.get(f.pred)
+        return semantic is not None and any(fs.entails(f) for fs in semantic)
+
+    def _contradicts_fluent(self, f):
+        semantic = self._semantic_by_pred.get(f.pred)
+        return semantic is not None and any(fs.contradicts(f) for fs in semantic)
+
+    def entails(self, other):
+        if isinstance(other, Fluent):
+            return self._entails_fluent(other)
+        elif isinstance(other, (ConjunctionOfFluents, FluentStore)):
+            return all(self._entails_fluent(f) for f in other.fluents)
+        else:
+            raise TypeError('Cannot operate on %s' % str(other))
+
+    def contradicts(self, other):
+        if isinstance(other, Fluent):
+            return self._contradicts_fluent(other)
+        elif isinstance(other, (ConjunctionOfFluents, FluentStore)):
+            return any(self._contradicts_fluent(f) for f in other.fluents)
+        else:
+            raise TypeError('Cannot operate on %s' % str(other))
+
+def _has_own_semantics(fluent_class):
+    '''True if the fluent class overrides the entailment semantics of Fluent.
+    '''
+    return (fluent_class.entails != Fluent.entails or
+        fluent_class.contradicts != Fluent.contradicts)
+
+class ConjunctionOfFluents(object):
+    # maps (class, frozenset of fluents) to the one live instance with those fluents; fluents
+    # of different classes are never equal, so a fluent and its negation give different keys
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, fluents):
         '''State represented as a conjunction of fluents.
+
+        Conjunctions are interned: constructing a conjunction with the same set of
+        fluents as a live one (in any order, with or without duplicates) returns
+        the existing object, so equal search states collapse to a single node.
         '''
-        self.fluents = tuple(fluents)
+        unique_fluents = []
+        seen = set()
+        for f in fluents:
+            if f not in seen:
+                seen.add(f)
+                unique_fluents.append(f)
+        fluent_set = frozenset(seen)
+
+        key = (cls, fluent_set)
+        cof = cls._interned.get(key)
+        if cof is None:
+            with _intern_lock:
+                cof = cls._interned.get(key)
+                if cof is None:
+                    cof = object.__new__(cls)
+                    cof.fluents = tuple(unique_fluents)
+                    cof.fluent_set = fluent_set
+                    cof._hash = hash(fluent_set)
+                    cof._store = None
+                    cls._interned[key] = cof
+        return cof
 
     def __hash__(self):
-        '''Using sum because hash should be the same regardless of the
-        order of the fluents.
+        '''Hash of the set of fluents, so it does not depend on their order.
         '''
-        return hash(sum([hash(f) for f in self.fluents]))
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ConjunctionOfFluents):
+            return False
+        return self.fluent_set == other.fluent_set
+
+    def __ne__(self, other):
+        return not self == other
 
     def __repr__(self):
         if len(self.fluents) > 0:
@@ -109,11 +310,12 @@ class ConjunctionOfFluents:
         else:
             return '---'
 
-    def _entails_fluent(self, f):
-        return any([fs.entails(f) for fs in self.fluents])
-    
-    def _contradicts_fluent(self, f):
-        return any([fs.contradicts(f) for fs in self.fluents])
+    def _get_store(self):
+        '''Index of the fluents, built the first time it is needed.
+        '''
+        if self._store is None:
+            self._store = FluentStore(self.fluents)
+        return self._store
 
     def bind(self, bindings):
         '''Return a copy of itself with the given bindings applied.
@@ -121,24 +323,19 @@ class ConjunctionOfFluents:
         return ConjunctionOfFluents([f.bind(bindings) for f in self.fluents])
 
     def entails(self, other):
-        if isinstance(other, Fluent):
-            return self._entails_fluent(other)
-        elif isinstance(other, ConjunctionOfFluents):
-            return all([self._entails_fluent(f) for f in other.fluents])
-        else:
-            TypeError('Cannot operate on %s' % str(other))
+        return self._get_store().entails(other)
 
     def contradicts(self, other):
-        if isinstance(other, Fluent):
-            return self._contradicts_fluent(other)
-        elif isinstance(other, ConjunctionOfFluents):
-            return any([self._contradicts_fluent(f) for f in other.fluents])
-        else:
-            TypeError('Cannot operate on %s' % str(other))
+        return self._get_store().contradicts(other)
+
+    def entailed_by(self, f):
+        '''Returns the fluents in this conjunction which the given fluent entails.
+        '''
+        return self._get_store().entailed_by(f)
 
 class AbstractionInfo:
-    def __init__(self, fluent_counts={}):
-        self.fluent_counts = fluent_counts
+    def __init__(self, fluent_counts=None):
+        self.fluent_counts = fluent_counts if fluent_counts is not None else {}
 
     def __repr__(self):
         return 'AbstractionInfo(%s)' % repr(self.fluent_counts)
@@ -158,40 +355,117 @@ class AbstractionInfo:
         return AbstractionInfo(self.fluent_counts.copy())
 
 class Operator:
-    def __init__(self, name, target, suggesters, preconditions, side_effects, primitive):
+    def __init__(self, name, target, suggesters, preconditions, side_effects, primitive, max_combinations=None):
         self.name = name
         self.target = target
         self.suggesters = suggesters
         self.preconditions = preconditions
         self.side_effects = side_effects
         self.primitive = primitive
+        # maximum number of combinations of suggested values tried per goal fluent
+        self.max_combinations = max_combinations
+        self._compiled = None
 
     def __repr__(self):
         return '%s()' % self.name
 
-    def gen_instances(self, world, current_state, goal, abs_info):
+    def compiled(self):
+        '''Returns (match, bind_target, precondition binders, side effect binders), where
+        match is compile_match of the target, and the binders are compile_bind functions
+        for the target, each (abs_n, precondition) pair and each side effect. Compiled on
+        first use.
+        '''
+        if self._compiled is None:
+            self._compiled = (compile_match(self.target), compile_bind(self.target),
+                [(abs_n, f, compile_bind(f)) for (abs_n, f) in self.preconditions],
+                [compile_bind(f) for f in self.side_effects.fluents])
+        return self._compiled
+
+    def gen_instances(self, world, current_state, goal, abs_info, cache=None, static_preds=None):
+        '''Yields the instances of this operator which achieve a fluent of the goal.
+
+        Args:
+            world, current_state, goal: As for the suggesters.
+            abs_info (AbstractionInfo): Abstraction levels of the fluents.
+            cache (EntailmentCache): Cache for suggester results and entailment queries
+                against the world, or None.
+            static_preds (set of Predicate): Predicates which no operator achieves (see
+                static_predicates), or None to skip that check.
+        '''
+        match = self.compiled()[0]
         for goal_fluent in goal.fluents:
-            bindings = self.target.match(goal_fluent)
-            if bindings == None:
+            bindings = match(goal_fluent)
+            if bindings is None:
                 continue
-
-            # bind target and calculate current abstraction level
-            target = self.target.bind(bindings)
-            abs_level = abs_info.get_abs_level(target)
-
-            for other_bindings in suggest_values(self.suggesters, world, current_state, goal):
-                bindings.update(other_bindings)
-
-                pc_fluents = []
-                for abs_n, f in self.preconditions:
-                    if abs_n <= abs_level:
-                        pc_fluents.append(f.bind(bindings))
-                preconditions = ConjunctionOfFluents(pc_fluents)
-                side_effects = self.side_effects.bind(bindings)
-                concrete = (len(preconditions.fluents) == len(self.preconditions))
-
-                yield OperatorInstance(self.name, abs_level,
-                    target, preconditions, side_effects, self.primitive, concrete)
+            for op_inst in self.instances_for(bindings, world, current_state, goal, abs_info, cache, static_preds):
+                yield op_inst
+
+    def instances_for(self, bindings, world, current_state, goal, abs_info, cache=None, static_preds=None):
+        '''Yields the instances of this operator whose target is bound by the given
+        bindings, which come from matching the target against a goal fluent.
+
+        The remaining variables are bound to suggested values one at a time, those with
+        the fewest suggested values first. As soon as a precondition (of those kept at the
+        current abstraction level) is fully bound, it is checked, and the partial
+        assignment is abandoned if the precondition contradicts a goal fluent which this
+        operator does not achieve, or if it has a static predicate and the world does not
+        entail it. Variables which the target match binds are not suggested.
+        '''
+        match, bind_target, pc_binders, se_binders = self.compiled()
+
+        # bind target and calculate current abstraction level
+        target = bind_target(bindings)
+        abs_level = abs_info.get_abs_level(target)
+        preconditions = [(f, bind) for (abs_n, f, bind) in pc_binders if abs_n <= abs_level]
+        concrete = (len(preconditions) == len(pc_binders))
+
+        # goal fluents which must still hold before this operator is applied
+        achieved = set(goal.entailed_by(target))
+        side_effect_preds = set([f.pred for f in self.side_effects.fluents])
+        persistent = ConjunctionOfFluents([f for f in goal.fluents
+            if f not in achieved and f.pred not in side_effect_preds])
+
+        def consistent(pc):
+            if persistent.contradicts(pc):
+                return False
+            if static_preds is not None and pc.pred in static_preds:
+                return (cache if cache is not None else world).entails(pc)
+            return True
+
+        suggesters = dict([(v, s) for (v, s) in self.suggesters.items() if v not in bindings])
+        variables, domains = suggestion_domains(suggesters, world, current_state, goal, cache)
+
+        # Only preconditions with a static predicate, or with the predicate of a goal
+        # fluent they could contradict, can be pruned. Order the variables greedily:
+        # fewest values first, and among those, the one which makes the most of those
+        # preconditions ground. checks[k] holds the binders of the preconditions which
+        # become ground once the first k variables are bound.
+        persistent_preds = set([f.pred for f in persistent.fluents])
+        bound = set(bindings)
+        pending = [(bind, _variables_of(pc)) for (pc, bind) in preconditions
+            if pc.pred in persistent_preds or (static_preds is not None and pc.pred in static_preds)]
+        checks = [[bind for (bind, pc_vars) in pending if pc_vars <= bound]]
+        pending = [(bind, pc_vars) for (bind, pc_vars) in pending if not pc_vars <= bound]
+        remaining = range(len(variables))
+        order = []
+        while len(remaining) > 0:
+            def rank(ii):
+                n_ground = len([bind for (bind, pc_vars) in pending if pc_vars <= bound | set([variables[ii]])])
+                return (len(domains[ii]), -n_ground)
+            ii = min(remaining, key=rank)
+            remaining.remove(ii)
+            order.append(ii)
+            bound.add(variables[ii])
+            checks.append([bind for (bind, pc_vars) in pending if pc_vars <= bound])
+            pending = [(bind, pc_vars) for (bind, pc_vars) in pending if not pc_vars <= bound]
+        variables = [variables[ii] for ii in order]
+        domains = [domains[ii] for ii in order]
+
+        assignments = _consistent_assignments(variables, domains, checks, dict(bindings), consistent)
+        for complete in itertools.islice(assignments, self.max_combinations):
+            yield OperatorInstance(self.name, abs_level, target,
+                ConjunctionOfFluents([bind(complete) for (pc, bind) in preconditions]),
+                ConjunctionOfFluents([bind(complete) for bind in se_binders]), self.primitive, concrete)
 
 class OperatorInstance:
     def __init__(self, operator_name, abs_level, target, preconditions, side_effects, primitive, concrete):
@@ -210,6 +484,8 @@ class HPlanTree:
     def __init__(self, goal=None, plan=None):
         self.goal = goal
         self.plan = plan
+        # PlanStats recorded by hpn when it plans for this node; see profiler.py
+        self.stats = None
 
     def __str__(self):
         if self.plan == None:
@@ -218,25 +494,114 @@ class HPlanTree:
             return '%s( %s )' % (self.goal, ' '.join([str(st) for (op, st) in self.plan]))
     
 
-def suggest_values(vars, world, current_state, goal):
-    '''Suggest values for all variables in the given dictionary.
-    
+def static_predicates(operators):
+    '''Returns the set of predicates of the preconditions of the given operators which
+    no operator achieves as its target or a side effect.
+    '''
+    achieved = set()
+    used = set()
+    for op in operators:
+        achieved.add(op.target.pred)
+        achieved.update([f.pred for f in op.side_effects.fluents])
+        used.update([f.pred for (abs_n, f) in op.preconditions])
+    return used - achieved
+
+def compile_match(template):
+    '''Returns a function which does the same as template.match, with the positions of
+    the template's variables and constants worked out in advance.
+    '''
+    pred = template.pred
+    constants = [(ii, arg) for (ii, arg) in enumerate(template.args) if not isinstance(arg, Variable)]
+    variables = [(ii, arg) for (ii, arg) in enumerate(template.args) if isinstance(arg, Variable)]
+    n_args = len(template.args)
+    def match(f):
+        if not f.pred == pred:
+            return None
+        args = f.args
+        for arg in args[:n_args]:
+            if isinstance(arg, Variable):
+                raise ValueError('All variables must get bound!')
+        for ii, arg in constants:
+            if ii < len(args) and not arg == args[ii]:
+                return None
+        return dict([(var, args[ii]) for (ii, var) in variables if ii < len(args)])
+    return match
+
+def compile_bind(template):
+    '''Returns a function which does the same as template.bind.
+    '''
+    pred = template.pred
+    args = list(template.args)
+    variables = [(ii, arg) for (ii, arg) in enumerate(template.args) if isinstance(arg, Variable)]
+    if len(variables) == 0:
+        bound = Fluent(pred, args)
+        return lambda bindings: bound
+    def bind(bindings):
+        bound_args = list(args)
+        for ii, var in variables:
+            bound_args[ii] = bindings.get(var, var)
+        return Fluent(pred, bound_args)
+    return bind
+
+def _variables_of(f):
+    return set([arg for arg in f.args if isinstance(arg, Variable)])
+
+def _consistent_assignments(variables, domains, checks, bindings, consistent, k=0):
+    '''Depth first enumeration of the values of the variables, pruning every partial
+    assignment under which one of the preconditions in checks[k] is inconsistent.
+
+    Yields a new dict of bindings for each complete assignment.
+    '''
+    for bind in checks[k]:
+        if not consistent(bind(bindings)):
+            return
+    if k == len(variables):
+        yield dict(bindings)
+        return
+    var = variables[k]
+    for val in domains[k]:
+        bindings[var] = val
+        for complete in _consistent_assignments(variables, domains, checks, bindings, consistent, k + 1):
+            yield complete
+    bindings.pop(var, None)
+
+def suggestion_domains(vars, world, current_state, goal, cache=None):
+    '''Calls the suggester of each variable once.
+
     Args:
         vars (dict): Dictionary in which the keys are variables, and the values are
             suggesters for that variable.
         current_state (State): Current world state.
         goal (ConjunctionOfFluents): Goal conjunction.
+        cache (EntailmentCache): If given, suggester results are looked up in and stored
+            in it, so that they are reused until the world state changes.
+
+    Returns:
+        (variables, domains): List of the variables, and for each one the tuple of values
+            suggested for it.
     '''
-    if len(vars) == 0:
-        yield {}
-        return
+    variables = list(vars.keys())
+    if cache is None:
+        domains = [tuple(vars[v](world, current_state, goal)) for v in variables]
+    else:
+        domains = [cache.suggestions(vars[v], world, current_state, goal) for v in variables]
+    return variables, domains
+
+def suggest_values(vars, world, current_state, goal, cache=None, max_combinations=None):
+    '''Suggest values for all variables in the given dictionary.
 
-    remaining_vars = vars.copy()
-    varname, suggester = remaining_vars.popitem()
-    for val in suggester(world, current_state, goal):
-        if len(remaining_vars) == 0:
-            yield {varname: val}
-        else:
-            for values in suggest_values(remaining_vars, world, current_state, goal):
-                values[varname] = val
-                yield values
+    Every suggester is called once (see suggestion_domains), and the combinations of
+    their values are then enumerated lazily. Each combination is yielded as a new dict,
+    which the caller may keep or modify.
+
+    Args:
+        vars (dict): Dictionary in which the keys are variables, and the values are
+            suggesters for that variable.
+        current_state (State): Current world state.
+        goal (ConjunctionOfFluents): Goal conjunction.
+        cache (EntailmentCache): Cache for suggester results, or None.
+        max_combinations (int): Maximum number of combinations yielded, or None.
+    '''
+    variables, domains = suggestion_domains(vars, world, current_state, goal, cache)
+    for values in itertools.islice(itertools.product(*domains), max_combinations):
+        yield dict(zip(variables, values))
@@ -0,0 +1,183 @@
+import os
+import numpy as np
+
+class CSRGraph:
+    def __init__(self, indptr, indices, weights):
+        '''Explicit directed graph over the integer nodes 0..n-1, stored as compressed
+        sparse row arrays: the edges out of node i go to indices[indptr[i]:indptr[i+1]]
+        with costs weights[indptr[i]:indptr[i+1]].
+
+        a_star detects graphs of this type when they are passed as the action generator,
+        and then searches over the arrays directly. The action which moves to a node is
+        the node itself, as for Roadmap.
+
+        Args:
+            indptr (np.array): Array of n+1 offsets into indices and weights.
+            indices (np.array): Target node of each edge.
+            weights (np.array): Cost of each edge.
+        '''
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __repr__(self):
+        return 'CSRGraph(%d nodes, %d edges)' % (len(self), len(self.indices))
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    @staticmethod
+    def from_edges(n, sources, targets, weights, symmetric=False):
+        '''Builds a graph from arrays of edges.
+
+        Args:
+            n (int): Number of nodes.
+            sources, targets, weights (np.array): One entry per edge.
+            symmetric (bool): Also add the reverse of every edge.
+        '''
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        weights = np.asarray(weights, dtype=float)
+        if symmetric:
+            sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+            weights = np.concatenate([weights, weights])
+        order = np.argsort(sources, kind='mergesort')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+        return CSRGraph(indptr, targets[order].astype(_index_dtype(n)), weights[order])
+
+    def save(self, directory):
+        '''Writes indptr.npy, indices.npy and weights.npy to a directory, for load().
+        '''
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name in ['indptr', 'indices', 'weights']:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @staticmethod
+    def load(directory, mmap_mode='r'):
+        '''Loads a graph written by save(), memory mapping the arrays (unless mmap_mode is
+        None) so that processes which load the same graph share its pages. The weights are
+        mapped copy-on-write, so that edges can still be blocked (as by MultiQueryPlanner)
+        in one process without writing to the file.
+        '''
+        load = lambda name, mode: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mode)
+        return CSRGraph(load('indptr', mmap_mode), load('indices', mmap_mode),
+            load('weights', 'c' if mmap_mode is not None else None))
+
+    def neighbors(self, ii):
+        '''Returns (indices, weights) arrays of the edges out of node ii.
+        '''
+        start, end = self.indptr[ii], self.indptr[ii+1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def edge_ids(self, sources, targets):
+        '''Positions in indices and weights of the edges from each source to the
+        corresponding target, which must exist.
+        '''
+        ids = []
+        for u, v in zip(sources, targets):
+            row = self.indices[self.indptr[u]:self.indptr[u+1]]
+            ids.append(self.indptr[u] + np.nonzero(row == v)[0][0])
+        return np.array(ids, dtype=np.int64)
+
+    def action_generator(self, state):
+        '''Yields (action, next_state, cost) for each edge out of the given node, for use
+        with searches other than a_star.
+        '''
+        indices, weights = self.neighbors(state)
+        for jj, w in zip(indices.tolist(), weights.tolist()):
+            yield jj, jj, w
+
+    def with_edges(self, n_new, sources, targets, weights):
+        '''Returns a copy of the graph with n_new extra nodes (numbered from len(self)) and
+        the given extra edges, which may start and end at old or new nodes.
+
+        The extra edges are inserted into the existing arrays in one pass, without sorting
+        the edges of the graph again, so this is cheap next to building the graph.
+        '''
+        n = len(self) + n_new
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind='mergesort')
+        sources = sources[order]
+        targets = np.asarray(targets)[order]
+        weights = np.asarray(weights, dtype=float)[order]
+        indptr = np.concatenate([self.indptr, np.repeat(self.indptr[-1], n_new)])
+        # each extra edge goes at the end of the row of its source
+        positions = indptr[sources + 1]
+        indptr[1:] += np.cumsum(np.bincount(sources, minlength=n))
+        return CSRGraph(indptr, np.insert(self.indices, positions, targets).astype(_index_dtype(n)),
+            np.insert(self.weights, positions, weights))
+
+    def with_overlay(self, n_new, sources, targets, weights):
+        '''Like with_edges, but returns a CSROverlay which shares the arrays of the graph
+        instead of copying them, so it costs only as much as the extra edges.
+        '''
+        return CSROverlay(self, n_new, sources, targets, weights)
+
+    def reverse(self):
+        '''Returns the graph with every edge reversed.
+        '''
+        sources = np.repeat(np.arange(len(self), dtype=self.indices.dtype), np.diff(self.indptr))
+        return CSRGraph.from_edges(len(self), self.indices, sources, self.weights)
+
+class CSROverlay:
+    def __init__(self, graph, n_new, sources, targets, weights):
+        '''A CSRGraph with n_new extra nodes (numbered from len(graph)) and a few extra
+        edges, which may start and end at old or new nodes, such as the start and goal of
+        a query connected to a roadmap.
+
+        The arrays of the graph are shared, not copied, and the extra edges are kept per
+        source node, so a_star looks them up only for the nodes which have some. Changes
+        to the graph's weights (as when MultiQueryPlanner blocks an edge) show through.
+
+        Args:
+            graph (CSRGraph): Graph to extend.
+            n_new (int): Number of extra nodes.
+            sources, targets, weights (np.array): One entry per extra edge.
+        '''
+        self.graph = graph
+        self.n_new = n_new
+        # maps each node with extra edges out of it to (targets, weights) arrays
+        self.extra = {}
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=graph.indices.dtype)
+        weights = np.asarray(weights, dtype=float)
+        for u in np.unique(sources).tolist():
+            mask = sources == u
+            self.extra[u] = (targets[mask], weights[mask])
+        self._no_edges = (np.empty(0, dtype=graph.indices.dtype), np.empty(0))
+
+    def __len__(self):
+        return len(self.graph) + self.n_new
+
+    def __repr__(self):
+        return 'CSROverlay(%s, %d extra nodes, %d extra edges)' % (self.graph, self.n_new,
+            sum([len(t) for (t, w) in self.extra.values()]))
+
+    def neighbors(self, ii):
+        '''Returns (indices, weights) arrays of the edges out of node ii.
+        '''
+        if ii < len(self.graph):
+            indices, weights = self.graph.neighbors(ii)
+        else:
+            indices, weights = self._no_edges
+        extra = self.extra.get(ii)
+        if extra is not None:
+            indices, weights = np.concatenate([indices, extra[0]]), np.concatenate([weights, extra[1]])
+        return indices, weights
+
+    def action_generator(self, state):
+        '''Yields (action, next_state, cost) for each edge out of the given node, for use
+        with searches other than a_star.
+        '''
+        indices, weights = self.neighbors(state)
+        for jj, w in zip(indices.tolist(), weights.tolist()):
+            yield jj, jj, w
+
+def _index_dtype(n):
+    return np.int32 if n < 2**31 else np.int64
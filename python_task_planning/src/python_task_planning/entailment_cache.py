@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from python_task_planning.common import Fluent
+
+class EntailmentCache(object):
+    def __init__(self, world, maxsize=100000, suggestions_maxsize=10000):
+        '''Memoizes entailment queries against the world for one planning episode.
+
+        Entailment of single fluents and the number of violated fluents of whole
+        conjunctions are cached together in one LRU table. Conjunctions are
+        interned, so a subgoal which is reached again hits the cache. The cache is
+        cleared whenever the world state changes through execute().
+
+        Args:
+            world: Anything with an entails() method which accepts a Fluent; usually the
+                domain's world, or a state such as a ConjunctionOfFluents.
+            maxsize (int): Maximum number of entries kept before the least recently
+                used ones are evicted.
+            suggestions_maxsize (int): Like maxsize, for the separate table of suggester
+                results kept by suggestions().
+        '''
+        self.world = world
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # incremented every time the world state changes
+        self.version = 0
+        self._entries = OrderedDict()
+        self.suggestions_maxsize = suggestions_maxsize
+        self.suggester_calls = 0
+        self._suggestions = OrderedDict()
+
+    def __repr__(self):
+        return 'EntailmentCache(size=%d, hits=%d, misses=%d)' % (len(self._entries), self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, compute):
+        try:
+            val = self._entries.pop(key)
+            self.hits += 1
+        except KeyError:
+            val = compute(key)
+            self.misses += 1
+            if len(self._entries) >= self.maxsize:
+                self._entries.popitem(last=False)
+        self._entries[key] = val
+        return val
+
+    def suggestions(self, suggester, world, current_state, goal):
+        '''Tuple of the values yielded by suggester(world, current_state, goal). While the
+        world state stays the same, each suggester is called at most once for any
+        current_state and goal, as long as the result stays in the cache.
+
+        The world is passed separately because it is not always the one this cache answers
+        entailment queries against (plan_flat uses the start state).
+        '''
+        key = (suggester, current_state, goal)
+        try:
+            val = self._suggestions.pop(key)
+        except KeyError:
+            val = tuple(suggester(world, current_state, goal))
+            self.suggester_calls += 1
+            if len(self._suggestions) >= self.suggestions_maxsize:
+                self._suggestions.popitem(last=False)
+        self._suggestions[key] = val
+        return val
+
+    def _entails_fluent(self, f):
+        return self._lookup(f, self.world.entails)
+
+    def num_violated(self, cof):
+        '''Number of fluents in the conjunction which the world does not entail.
+        '''
+        return self._lookup(cof, lambda cof: sum([(not self._entails_fluent(f)) for f in cof.fluents]))
+
+    def num_violated_after(self, parent, removed, added, child):
+        '''Number of violated fluents of a conjunction which was derived from another
+        one by removing and adding fluents.
+
+        The count is computed from the count for the parent, so only the fluents that
+        changed are looked at.
+
+        Args:
+            parent (ConjunctionOfFluents): Conjunction the child was derived from.
+            removed (list of Fluent): Fluents of the parent which are not in the child.
+            added (list of Fluent): Fluents of the child which are not in the parent.
+            child (ConjunctionOfFluents): The derived conjunction.
+        '''
+        def compute(child):
+            n = self.num_violated(parent)
+            n -= sum([(not self._entails_fluent(f)) for f in removed])
+            n += sum([(not self._entails_fluent(f)) for f in added])
+            return n
+        return self._lookup(child, compute)
+
+    def entails(self, other):
+        if isinstance(other, Fluent):
+            return self._entails_fluent(other)
+        else:
+            return self.num_violated(other) == 0
+
+    def execute(self, op):
+        '''Executes the operator instance in the world and invalidates the cache.
+        '''
+        current_state = self.world.execute(op)
+        self.clear()
+        return current_state
+
+    def clear(self):
+        self._entries.clear()
+        self._suggestions.clear()
+        self.version += 1
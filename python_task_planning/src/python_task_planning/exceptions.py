@@ -4,3 +4,17 @@ class PlanningFailedError(Exception):
 
     def __str__(self):
         return self.msg
+
+class SearchBudgetExceededError(PlanningFailedError):
+    def __init__(self, msg, best_plan=None, bound=float('inf')):
+        '''Raised when a search runs out of its budget.
+
+        Args:
+            best_plan: Best plan found before the budget ran out, in the format returned
+                by a_star, or None if no plan was found.
+            bound (float): Bound on how many times more expensive best_plan is than an
+                optimal plan.
+        '''
+        PlanningFailedError.__init__(self, msg)
+        self.best_plan = best_plan
+        self.bound = bound
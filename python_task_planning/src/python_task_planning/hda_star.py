@@ -0,0 +1,308 @@
+'''
+Hash Distributed A* (Kishimoto, Fukunaga and Botea, 2009) over worker processes.
+'''
+import heapq
+import itertools
+import logging
+import multiprocessing
+import Queue
+import time
+import traceback
+from multiprocessing.sharedctypes import RawArray, RawValue
+
+from python_task_planning.exceptions import PlanningFailedError, SearchBudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+inf = float('inf')
+
+def hda_star(start, goal_test, action_generator, heuristic, n_workers=None, batch_size=64, budget=None,
+        stats=None, owner=hash, poll_interval=0.002):
+    '''Optimal A* search whose states are divided between worker processes by hash.
+
+    Each state is owned by worker owner(state) % n_workers, which keeps its g score and
+    parent in its own table and its open entry in its own heap. A worker expands its best
+    open states and sends each successor, with its g score, to the successor's owner;
+    successors are batched per destination and sent through multiprocessing queues. The
+    owner detects duplicates, computes the heuristic and reopens states whose g score
+    improves, so the heuristic only needs to be admissible.
+
+    A worker which pops a goal state lowers the cost of the best plan found so far, which
+    all workers share and prune against. The search is over once every worker is idle
+    (nothing open with f below that cost) and no batch is waiting to be processed; both
+    are updated and read under one lock, so no message can be missed. The plan is then
+    traced back through the owners of its states, and checked against action_generator
+    to cost exactly what the search found before it is returned.
+
+    Args:
+        start, goal_test, action_generator, heuristic: As for a_star. The workers are
+            forked, so these can be closures, but states and actions must be picklable,
+            with equality and hashing by value which survive the trip between processes.
+        n_workers (int): Number of worker processes; defaults to the number of CPUs.
+        batch_size (int): Maximum number of states sent to another worker in one message,
+            and number of expansions a worker makes between checks of its inbox.
+        budget (SearchBudget): Limits on the expansions and stored states of all of the
+            workers together, and on the time; checked every poll_interval seconds.
+        stats (PlanStats): If given, the expansions, successors generated and states
+            stored by all of the workers are added to it, and the largest open list of any
+            worker.
+        owner: Function from a state to an integer, used to assign states to workers.
+        poll_interval (float): Seconds between checks for termination.
+
+    Returns:
+        Plan in the format returned by a_star, or None if there is none.
+    '''
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    n = n_workers
+
+    inboxes = [multiprocessing.Queue() for ii in range(n)]
+    results = multiprocessing.Queue()
+    lock = multiprocessing.Lock()
+    # batches sent and not fully processed yet, and which workers have no work left
+    in_flight = RawValue('l', 0)
+    idle = RawArray('b', n)
+    # cost of the best plan found so far; read without the lock, and lowered with it
+    incumbent = RawValue('d', inf)
+    # expansions and stored states of each worker, for the budget
+    counts = RawArray('l', 2 * n)
+
+    workers = []
+    for index in range(n):
+        workers.append(multiprocessing.Process(target=_hda_worker, args=(index, n, inboxes, results, lock,
+            in_flight, idle, incumbent, counts, goal_test, action_generator, heuristic, owner, batch_size)))
+        workers[-1].daemon = True
+        workers[-1].start()
+
+    try:
+        with lock:
+            in_flight.value += 1
+        inboxes[owner(start) % n].put(('batch', [(start, 0.0, None, None)]))
+
+        while True:
+            time.sleep(poll_interval)
+            with lock:
+                done = in_flight.value == 0 and all(idle)
+            if done:
+                break
+            _check_errors(results, workers)
+            if budget is not None:
+                exceeded = budget.check(sum(counts[0::2]), sum(counts[1::2]))
+                if exceeded is not None:
+                    raise SearchBudgetExceededError('HDA* search budget exceeded: %s' % exceeded)
+
+        reports = _request(inboxes, results, workers, [(ii, ('report', None)) for ii in range(n)])
+        if stats is not None:
+            for (best, n_expanded, n_generated, n_stored, max_open) in reports:
+                stats.expanded += n_expanded
+                stats.generated += n_generated
+                stats.stored += n_stored
+                stats.max_open = max(stats.max_open, max_open)
+        goals = [r[0] for r in reports if r[0] is not None]
+        if len(goals) == 0:
+            logger.debug('HDA* found no plan after expanding %d states', sum([r[1] for r in reports]))
+            return None
+        cost, goal = min(goals)
+
+        plan = [(None, goal)]
+        state = goal
+        while True:
+            parent, action = _request(inboxes, results, workers, [(owner(state) % n, ('trace', state))])[0]
+            if parent is None:
+                break
+            plan.append((action, parent))
+            state = parent
+        plan.reverse()
+    finally:
+        for inbox in inboxes:
+            inbox.put(('stop', None))
+        for w in workers:
+            w.join(1.0)
+            if w.is_alive():
+                w.terminate()
+        for q in inboxes + [results]:
+            # don't wait at exit to flush messages which no worker will read
+            q.close()
+            q.cancel_join_thread()
+
+    plan_cost = verify_plan(plan, start, goal_test, action_generator)
+    if abs(plan_cost - cost) > 1e-9 * max(1.0, abs(cost)):
+        raise PlanningFailedError('HDA* plan costs %f but the search found cost %f' % (plan_cost, cost))
+    logger.debug('HDA* found a plan of cost %f after expanding %d states', cost, sum([r[1] for r in reports]))
+    return plan
+
+def verify_plan(plan, start, goal_test, action_generator):
+    '''Checks that a plan in the format returned by a_star starts at start, ends in a goal
+    state and that each of its actions leads to the next state, and returns its cost.
+    Raises PlanningFailedError if it does not.
+    '''
+    if plan[0][1] != start:
+        raise PlanningFailedError('Plan does not begin at the start state')
+    if not goal_test(plan[-1][1]):
+        raise PlanningFailedError('Plan does not end in a goal state')
+    cost = 0.0
+    for (action, state), (next_action, next_state) in zip(plan[:-1], plan[1:]):
+        costs = [c for (a, s, c) in action_generator(state) if a == action and s == next_state]
+        if len(costs) == 0:
+            raise PlanningFailedError('Action %s does not lead from %s to %s' % (action, state, next_state))
+        cost += min(costs)
+    return cost
+
+def _check_errors(results, workers):
+    '''Raises an error from a worker which failed.
+    '''
+    try:
+        kind, data = results.get_nowait()
+    except Queue.Empty:
+        kind, data = None, None
+    if kind == 'error':
+        raise RuntimeError('HDA* worker failed:\n%s' % data)
+    if kind is not None or not all([w.is_alive() for w in workers]):
+        raise RuntimeError('HDA* worker exited unexpectedly')
+
+def _request(inboxes, results, workers, requests):
+    '''Sends (worker index, message) requests, to different workers, and returns their
+    replies in the same order.
+    '''
+    for ii, message in requests:
+        inboxes[ii].put(message)
+    replies = {}
+    while len(replies) < len(requests):
+        try:
+            kind, data = results.get(timeout=1.0)
+        except Queue.Empty:
+            if not all([w.is_alive() for w in workers]):
+                raise RuntimeError('HDA* worker exited unexpectedly')
+            continue
+        if kind == 'error':
+            raise RuntimeError('HDA* worker failed:\n%s' % data)
+        replies[data[0]] = data[1]
+    return [replies[ii] for (ii, message) in requests]
+
+def _hda_worker(index, n, inboxes, results, lock, in_flight, idle, incumbent, counts, goal_test,
+        action_generator, heuristic, owner, batch_size):
+    try:
+        _HDAWorker(index, n, inboxes, results, lock, in_flight, idle, incumbent, counts, goal_test,
+            action_generator, heuristic, owner, batch_size).run()
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+class _HDAWorker:
+    def __init__(self, index, n, inboxes, results, lock, in_flight, idle, incumbent, counts, goal_test,
+            action_generator, heuristic, owner, batch_size):
+        self.index = index
+        self.n = n
+        self.inboxes = inboxes
+        self.inbox = inboxes[index]
+        self.results = results
+        self.lock = lock
+        self.in_flight = in_flight
+        self.idle = idle
+        self.incumbent = incumbent
+        self.counts = counts
+        self.goal_test = goal_test
+        self.action_generator = action_generator
+        self.heuristic = heuristic
+        self.owner = owner
+        self.batch_size = batch_size
+
+        # maps each state owned by this worker to [g, h, parent, action]
+        self.table = {}
+        # entries (f, tie breaker, g, state)
+        self.heap = []
+        self.counter = itertools.count()
+        self.outgoing = [[] for ii in range(n)]
+        self.best = None
+        self.n_expanded = 0
+        self.n_generated = 0
+        self.max_open = 0
+
+    def run(self):
+        while True:
+            # handle whatever has arrived, then expand a batch of states
+            while True:
+                try:
+                    message = self.inbox.get_nowait()
+                except Queue.Empty:
+                    break
+                if not self.handle(message):
+                    return
+            self.expand(self.batch_size)
+            self.counts[2 * self.index] = self.n_expanded
+            self.counts[2 * self.index + 1] = len(self.table)
+            for ii in range(self.n):
+                if len(self.outgoing[ii]) > 0:
+                    self.send(ii)
+            if len(self.heap) == 0:
+                with self.lock:
+                    self.idle[self.index] = 1
+                if not self.handle(self.inbox.get()):
+                    return
+
+    def handle(self, message):
+        kind, data = message
+        if kind == 'batch':
+            for (state, g, parent, action) in data:
+                self.receive(state, g, parent, action)
+            with self.lock:
+                self.in_flight.value -= 1
+                self.idle[self.index] = 0
+        elif kind == 'trace':
+            entry = self.table[data]
+            self.results.put(('trace', (self.index, (entry[2], entry[3]))))
+        elif kind == 'report':
+            self.results.put(('report', (self.index, (self.best, self.n_expanded, self.n_generated,
+                len(self.table), self.max_open))))
+        elif kind == 'stop':
+            return False
+        return True
+
+    def receive(self, state, g, parent, action):
+        entry = self.table.get(state)
+        if entry is None:
+            entry = self.table[state] = [g, self.heuristic(state), parent, action]
+        elif g < entry[0]:
+            entry[0], entry[2], entry[3] = g, parent, action
+        else:
+            return
+        f = g + entry[1]
+        if f < self.incumbent.value:
+            heapq.heappush(self.heap, (f, next(self.counter), g, state))
+            if len(self.heap) > self.max_open:
+                self.max_open = len(self.heap)
+
+    def send(self, ii):
+        with self.lock:
+            self.in_flight.value += 1
+        self.inboxes[ii].put(('batch', self.outgoing[ii]))
+        self.outgoing[ii] = []
+
+    def expand(self, n_expansions):
+        for jj in range(n_expansions):
+            if len(self.heap) == 0:
+                return
+            f, _, g, state = heapq.heappop(self.heap)
+            if g > self.table[state][0]:
+                # stale entry left behind by a cheaper path
+                continue
+            if f >= self.incumbent.value:
+                # nothing open here can lead to a cheaper plan
+                del self.heap[:]
+                return
+            if self.goal_test(state):
+                with self.lock:
+                    if g < self.incumbent.value:
+                        self.incumbent.value = g
+                        self.best = (g, state)
+                continue
+
+            self.n_expanded += 1
+            for action, neighbor, cost in self.action_generator(state):
+                self.n_generated += 1
+                ii = self.owner(neighbor) % self.n
+                if ii == self.index:
+                    self.receive(neighbor, g + cost, state, action)
+                else:
+                    self.outgoing[ii].append((neighbor, g + cost, state, action))
+                    if len(self.outgoing[ii]) >= self.batch_size:
+                        self.send(ii)
@@ -0,0 +1,215 @@
+from python_task_planning.common import Variable
+
+inf = float('inf')
+
+class RelaxedPlanningGraph(object):
+    def __init__(self, operators):
+        '''Relaxed planning graph over a list of operators, used to compute the h_add,
+        h_max and FF heuristics for goal regression.
+
+        The relaxation ignores delete effects, abstraction levels and suggesters: an
+        operator achieves its target and side effects once all of its preconditions hold.
+        A fluent which the world entails costs 0. For any other fluent, each operator whose
+        target or side effect can be bound to it is tried; the preconditions which become
+        ground under those bindings are costed the same way, recursively. Preconditions
+        which still contain variables (those bound by suggesters) fall back to a cost per
+        predicate for h_add and FF, which is computed here once from the operator list as
+        if no fluent held initially. For h_max they cost 0, since some grounding of them
+        may already hold. A derivation which needs a fluent in order to achieve that same
+        fluent is never the cheapest, so cycles are cut at infinite cost.
+
+        Every precondition is costed, whatever its abstraction level, so the costs are
+        those of concrete plans. h_max is admissible for plan_flat with unit cost
+        operators, but not for hpn's abstract searches, which drop preconditions above the
+        current abstraction level.
+
+        Args:
+            operators (list of Operator): Operators of the domain.
+        '''
+        self.operators = operators
+
+        # maps predicate to list of (operator, achieved fluent) for targets and side effects
+        self._achievers = {}
+        for op in operators:
+            for f in [op.target] + list(op.side_effects.fluents):
+                self._achievers.setdefault(f.pred, []).append((op, f))
+
+        self._pred_cost = {}
+        self._pred_supporter = {}
+        for combine in (sum, max):
+            self._pred_cost[combine], self._pred_supporter[combine] = self._predicate_costs(combine)
+
+        self._memo = {}
+        self._memo_version = None
+
+    def _predicate_costs(self, combine):
+        '''Bellman-Ford style fixpoint of the cost of achieving each predicate.
+        '''
+        cost = {}
+        supporter = {}
+        changed = True
+        while changed:
+            changed = False
+            for op in self.operators:
+                pc_costs = [cost.get(f.pred, inf) for (abs_n, f) in op.preconditions]
+                c = 1 + combine(pc_costs + [0])
+                for f in [op.target] + list(op.side_effects.fluents):
+                    if c < cost.get(f.pred, inf):
+                        cost[f.pred] = c
+                        supporter[f.pred] = op
+                        changed = True
+        return cost, supporter
+
+    def _check_memo(self, cache):
+        # ground costs depend on the world state, which changes whenever the cache is cleared
+        if self._memo_version != cache.version:
+            self._memo = {}
+            self._memo_version = cache.version
+
+    def _fluent_cost(self, f, cache, combine, stack):
+        '''Returns (cost, supporter, cut) for a ground fluent, where supporter is the
+        (operator, bindings) pair which achieves it most cheaply, or None, and cut is the
+        depth of the shallowest fluent in the stack at which a cycle was cut while costing
+        it, or inf if there was none. The stack maps the fluents being costed to their
+        depths. A cost depends on the stack only if its cut is finite, and only costs
+        which don't are memoized, so that costs don't depend on the order of the queries.
+        '''
+        key = (f, combine)
+        if key in self._memo:
+            return self._memo[key] + (inf,)
+        if cache.entails(f):
+            return 0, None, inf
+        if f in stack:
+            return inf, None, stack[f]
+
+        depth = len(stack)
+        stack[f] = depth
+        best = (inf, None)
+        cut = inf
+        for op, achieved in self._achievers.get(f.pred, ()):
+            bindings = _bind_to(achieved, f)
+            if bindings is None:
+                continue
+            pc_costs = []
+            for abs_n, pc in op.preconditions:
+                pc_cost, pc_cut = self._precondition_cost(pc.bind(bindings), cache, combine, stack)
+                pc_costs.append(pc_cost)
+                cut = min(cut, pc_cut)
+            c = 1 + combine(pc_costs + [0])
+            if c < best[0]:
+                best = (c, (op, bindings))
+        del stack[f]
+
+        # cycles cut at f itself don't depend on how f was reached
+        if cut >= depth:
+            self._memo[key] = best
+            cut = inf
+        return best + (cut,)
+
+    def _precondition_cost(self, f, cache, combine, stack):
+        '''Returns (cost, cut) for a precondition, as for _fluent_cost.
+        '''
+        if _is_ground(f):
+            return self._fluent_cost(f, cache, combine, stack)[0::2]
+        if combine is max:
+            # the suggesters may bind it to a fluent which already holds
+            return 0, inf
+        return self._pred_cost[combine].get(f.pred, inf), inf
+
+    def h_add(self, cache, subgoal):
+        '''Sum of the relaxed costs of the fluents of the subgoal.
+
+        Args:
+            cache (EntailmentCache): Answers entailment queries against the world.
+            subgoal (ConjunctionOfFluents): Subgoal to estimate the cost of.
+        '''
+        self._check_memo(cache)
+        return sum([self._fluent_cost(f, cache, sum, {})[0] for f in subgoal.fluents])
+
+    def h_max(self, cache, subgoal):
+        '''Max of the relaxed costs of the fluents of the subgoal. Admissible for plan_flat
+        with unit cost operators, since preconditions which are not ground cost 0; not for
+        hpn's abstract searches (see RelaxedPlanningGraph).
+        '''
+        self._check_memo(cache)
+        return max([self._fluent_cost(f, cache, max, {})[0] for f in subgoal.fluents] + [0])
+
+    def h_ff(self, cache, subgoal):
+        '''Number of operators in a relaxed plan for the subgoal, extracted FF-style by
+        following the cheapest (h_add) supporter of each fluent.
+        '''
+        self._check_memo(cache)
+        relaxed_plan = set()
+        visited = set()
+        for f in subgoal.fluents:
+            if self._extract(f, cache, relaxed_plan, visited) == inf:
+                return inf
+        return len(relaxed_plan)
+
+    def _extract(self, f, cache, relaxed_plan, visited):
+        if f in visited:
+            return 0
+        visited.add(f)
+        c, supporter, cut = self._fluent_cost(f, cache, sum, {})
+        if supporter is None:
+            return c
+        op, bindings = supporter
+        relaxed_plan.add((op, op.target.bind(bindings)))
+        for abs_n, pc in op.preconditions:
+            pc = pc.bind(bindings)
+            if _is_ground(pc):
+                self._extract(pc, cache, relaxed_plan, visited)
+            else:
+                self._extract_pred(pc.pred, relaxed_plan, visited)
+        return c
+
+    def _extract_pred(self, pred, relaxed_plan, visited):
+        if pred in visited:
+            return
+        visited.add(pred)
+        op = self._pred_supporter[sum].get(pred)
+        if op is None:
+            return
+        relaxed_plan.add((op, pred))
+        for abs_n, pc in op.preconditions:
+            self._extract_pred(pc.pred, relaxed_plan, visited)
+
+def make_heuristic(name, operators, cache):
+    '''Returns a function which takes a subgoal and returns its heuristic value.
+
+    Args:
+        name (str): One of 'num_violated', 'h_add', 'h_max' or 'h_ff'.
+        operators (list of Operator): Operators of the domain.
+        cache (EntailmentCache): Answers entailment queries against the world.
+    '''
+    if name == 'num_violated':
+        return cache.num_violated
+    graph = RelaxedPlanningGraph(operators)
+    if name == 'h_add':
+        return lambda s: graph.h_add(cache, s)
+    elif name == 'h_max':
+        return lambda s: graph.h_max(cache, s)
+    elif name == 'h_ff':
+        return lambda s: graph.h_ff(cache, s)
+    else:
+        raise ValueError('Unknown heuristic: %s' % str(name))
+
+def _bind_to(template, f):
+    '''Bindings which make the template fluent equal to the ground fluent f, or None.
+    '''
+    if len(template.args) != len(f.args):
+        return None
+    bindings = {}
+    for arg_t, arg_f in zip(template.args, f.args):
+        if isinstance(arg_t, Variable):
+            if bindings.setdefault(arg_t, arg_f) != arg_f:
+                return None
+        elif arg_t != arg_f:
+            return None
+    return bindings
+
+def _is_ground(f):
+    for arg in f.args:
+        if isinstance(arg, Variable):
+            return False
+    return True
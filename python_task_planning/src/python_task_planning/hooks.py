@@ -0,0 +1,24 @@
+class PlannerHooks:
+    def __init__(self, on_expand=None, on_generate=None, on_refine=None, on_execute=None):
+        '''Optional callbacks invoked by hpn and its searches, for tracing and profiling.
+        Hooks which are None are skipped with a single check, so they cost nothing when
+        not set.
+
+        Args:
+            on_expand: Called as on_expand(state, g) when a search expands a state.
+            on_generate: Called as on_generate(state, action, next_state, cost) for every
+                successor which a search generates.
+            on_refine: Called as on_refine(op, subtree, depth) before hpn plans for the
+                preconditions of an abstract operator instance, with the HPlanTree node for
+                the subgoal and the depth of the new level.
+            on_execute: Called as on_execute(op, depth) after hpn executes an operator
+                instance.
+        '''
+        self.on_expand = on_expand
+        self.on_generate = on_generate
+        self.on_refine = on_refine
+        self.on_execute = on_execute
+
+    def __repr__(self):
+        return 'PlannerHooks(%s)' % ', '.join([name for name in
+            ['on_expand', 'on_generate', 'on_refine', 'on_execute'] if getattr(self, name) is not None])
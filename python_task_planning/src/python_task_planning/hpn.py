@@ -1,13 +1,23 @@
+import logging
+import time
 import numpy as np
 from python_task_planning import AbstractionInfo, ConjunctionOfFluents, HPlanTree
-from python_task_planning.exceptions import PlanningFailedError
-from python_task_planning.a_star import a_star
+from python_task_planning.operator_library import OperatorLibrary
+from python_task_planning.exceptions import PlanningFailedError, SearchBudgetExceededError
+from python_task_planning.a_star import a_star, ara_star
+from python_task_planning.entailment_cache import EntailmentCache
+from python_task_planning.heuristics import make_heuristic
+from python_task_planning.profiler import PlanStats
 
-def hpn(operators, current_state, goal, world, abs_info=None, maxdepth=np.inf, depth=0, tree=None):
+logger = logging.getLogger(__name__)
+
+def hpn(operators, current_state, goal, world, abs_info=None, maxdepth=np.inf, depth=0, tree=None, cache=None,
+        heuristic='num_violated', budget=None, weight=1.0, anytime=False, hooks=None, lookahead=None):
     '''Implements HPN (Hierarchical Planning in the Now) algorithm of Kaelbing and Lozano-Perez.
 
     Args:
-        operators (list of Operator): Operators to use in the planning.
+        operators (list of Operator or OperatorLibrary): Operators to use in the planning. A list is
+            made into an OperatorLibrary at the top level call.
         current_state (ConjunctionOfFluents): Current state, represeneted as a conjunction of fluents.
         goal (ConjunctionOfFluents): Goal state, described as conjunction of fluents.
         world: Defined by the domain; used to execute operator instances and get the new state of the world.
@@ -16,27 +26,96 @@ def hpn(operators, current_state, goal, world, abs_info=None, maxdepth=np.inf, d
         maxdepth (int): Max allowed depth of the planning hierarchy.
         depth (int): Current depth of the planning hierarchy.
         tree (HPlanTree): Data structure representing the hierarchical planning tree. Updated as this
-            function recurses, and can be used to visualize the resulting plan.
+            function recurses, and can be used to visualize the resulting plan. The PlanStats of
+            each node's search and executions are stored in its stats attribute; see profiler.py
+            for reports on them.
+        cache (EntailmentCache): Cache of entailment queries against the world, shared by all
+            levels of the hierarchy and cleared whenever an operator is executed. Pass one in to
+            control its size or to read its hit and miss counts afterwards. If None, a new one is
+            created.
+        heuristic (str or function): Heuristic for the A* searches: 'num_violated', 'h_add', 'h_max'
+            or 'h_ff' (see heuristics.py), or a function which takes a subgoal and returns its value.
+            Relaxed planning graphs are built once, at the top level call. They cost every
+            precondition of an operator, including those above the abstraction level being
+            planned at, so h_max is not admissible for the abstract searches.
+        budget (SearchBudget): Limits on each A* search. Give it a deadline to bound the whole
+            planning and execution run.
+        weight (float): Heuristic weight for weighted A*; see search().
+        anytime (bool): Use ARA* instead of A*; see search().
+        hooks (PlannerHooks): Callbacks for tracing the searches, refinements and executions.
+        lookahead (Lookahead): If given, later abstract steps of each plan whose fluents are
+            independent of the steps before them are refined ahead of time in its pool, while
+            the earlier steps are refined and executed; see lookahead.py. Speculative plans
+            whose starting subgoal no longer holds when hpn reaches them are discarded. The
+            hooks are not called for speculative searches.
+
+    Executed operator instances are logged at INFO level, and the plan found at each level
+    at DEBUG level, to the python_task_planning.hpn logger.
     '''
     if depth > maxdepth:
         raise RuntimeError('Max recursion depth exceeded')
 
+    if tree is None:
+        tree = HPlanTree(goal)
+    elif tree.goal is None:
+        tree.goal = goal
+    stats = tree.stats = PlanStats()
+    stats.start = time.time()
+
     if abs_info is None:
         abs_info = AbstractionInfo()
 
-    plan = a_star(
-        goal, # start from the goal and work backwards
-        lambda s: world.entails(s), # we are done when we reach the current state
-        lambda s: applicable_ops(operators, world, current_state, s, abs_info), # actions
-        lambda s: num_violated_fluents(world, s) # heuristic
-        )
-    if plan is None:
-        raise PlanningFailedError('A* could not find a plan')
-    plan.reverse()
+    if not isinstance(operators, OperatorLibrary):
+        operators = OperatorLibrary(operators)
+
+    if cache is None:
+        cache = EntailmentCache(world)
+
+    if not callable(heuristic):
+        heuristic = make_heuristic(heuristic, operators, cache)
+
+    def counted_heuristic(s):
+        stats.heuristic_calls += 1
+        return heuristic(s)
+
+    speculated = None
+    if lookahead is not None:
+        speculated = lookahead.take(tree, cache)
+    if speculated is not None:
+        plan, speculative_stats = speculated
+        stats.add(speculative_stats)
+        stats.speculative = True
+    else:
+        suggester_calls, entailment_queries = cache.suggester_calls, cache.hits + cache.misses
+        try:
+            plan = search(
+                goal, # start from the goal and work backwards
+                lambda s: cache.entails(s), # we are done when we reach the current state
+                lambda s: applicable_ops(operators, world, current_state, s, abs_info, cache), # actions
+                counted_heuristic,
+                budget, weight, anytime, hooks, stats
+                )
+        except SearchBudgetExceededError:
+            if lookahead is not None:
+                lookahead.cancel_all()
+            raise
+        stats.search_time = time.time() - stats.start
+        stats.suggester_calls = cache.suggester_calls - suggester_calls
+        stats.entailment_queries = cache.hits + cache.misses - entailment_queries
+        if plan is None:
+            stats.end = time.time()
+            if lookahead is not None:
+                lookahead.cancel_all()
+            raise PlanningFailedError('A* could not find a plan')
+        plan.reverse()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Plan at depth %d: %s', depth, [op for (op, subgoal) in plan if op is not None])
 
     tree.plan = []
     for op, subgoal in plan:
         tree.plan.append((op, HPlanTree(subgoal)))
+    if lookahead is not None:
+        lookahead.speculate(tree, operators, world, current_state, abs_info, budget, weight, anytime)
 
     for op, subtree in tree.plan:
         subgoal = subtree.goal
@@ -44,14 +123,32 @@ def hpn(operators, current_state, goal, world, abs_info=None, maxdepth=np.inf, d
         if op is None:
             pass
         elif op.concrete:
-            print 'Executing:', op
-            current_state = world.execute(op)
+            logger.info('Executing: %s', op)
+            t_start = time.time()
+            current_state = cache.execute(op)
+            stats.execution_time += time.time() - t_start
+            stats.executions += 1
+            if hooks is not None and hooks.on_execute is not None:
+                hooks.on_execute(op, depth)
         else:
             abs_info.inc_abs_level(op.target)
-            hpn(operators, current_state, subgoal, world, abs_info.copy(), maxdepth, depth+1, subtree)
+            if hooks is not None and hooks.on_refine is not None:
+                hooks.on_refine(op, subtree, depth+1)
+            hpn(operators, current_state, subgoal, world, abs_info.copy(), maxdepth, depth+1, subtree, cache,
+                heuristic, budget, weight, anytime, hooks, lookahead)
+    stats.end = time.time()
 
-def plan_flat(operators, world, current_state, goal):
+def plan_flat(operators, world, current_state, goal, cache=None, heuristic='num_violated',
+        budget=None, weight=1.0, anytime=False, hooks=None, stats=None):
     '''Uses goal regression to plan without any hierarchy. Useful for testing.
+
+    Args:
+        cache (EntailmentCache): Cache of entailment queries against current_state. If None, a
+            new one is created.
+        heuristic (str or function): Heuristic for the A* search, as for hpn.
+        budget, weight, anytime: Search options, as for hpn.
+        hooks (PlannerHooks): Callbacks for tracing the search.
+        stats (PlanStats): Search counts are added to it; see a_star.
     '''
     class ConcreteAbs:
         def get_abs_level(self, f):
@@ -61,22 +158,78 @@ def plan_flat(operators, world, current_state, goal):
         def get_abs_level(self, f):
             return 0
         
-    plan = a_star(
+    if cache is None:
+        cache = EntailmentCache(current_state)
+
+    if not isinstance(operators, OperatorLibrary):
+        operators = OperatorLibrary(operators)
+
+    if not callable(heuristic):
+        heuristic = make_heuristic(heuristic, operators, cache)
+
+    plan = search(
         goal, # start from the goal and work backwards
-        lambda s: current_state.entails(s), # we are done when we a state that is already true
-        lambda s: applicable_ops(operators, world, current_state, s, ConcreteAbs()), # actions
-        lambda s: num_violated_fluents(current_state, s) # heuristic
+        lambda s: cache.entails(s), # we are done when we a state that is already true
+        lambda s: applicable_ops(operators, world, current_state, s, ConcreteAbs(), cache), # actions
+        heuristic,
+        budget, weight, anytime, hooks, stats
         )
     if plan == None:
         return None
     return list(reversed(plan))
     
-def applicable_ops(operators, world, current_state, goal, abs_info):
-    for op in operators:
-        for op_inst in op.gen_instances(world, current_state, goal, abs_info):
-            subgoal = regress(goal, op_inst)
-            if subgoal:
-                yield op_inst, subgoal, 1 # cost fixed to 1 for all ops right now
+def search(start, goal_test, action_generator, heuristic, budget=None, weight=1.0, anytime=False, hooks=None,
+        stats=None):
+    '''Runs the A* search for hpn and plan_flat.
+
+    Args:
+        start, goal_test, action_generator, heuristic: As for a_star.
+        budget (SearchBudget): Limits on the search.
+        weight (float): Heuristic weight. Without anytime, weighted A* is run with it. With
+            anytime, it is the first weight of ARA*, which then lowers it in steps of 0.5
+            down to 1.
+        anytime (bool): Use ARA*. If the budget runs out after a plan was found, the best
+            plan so far is returned instead of raising SearchBudgetExceededError.
+        hooks (PlannerHooks): Its on_expand and on_generate hooks are passed to the search.
+        stats (PlanStats): Search counts are added to it; see a_star.
+    '''
+    on_expand = on_generate = None
+    if hooks is not None:
+        on_expand, on_generate = hooks.on_expand, hooks.on_generate
+    if not anytime:
+        return a_star(start, goal_test, action_generator, heuristic, weight, budget, on_expand, on_generate, stats)
+
+    weights = list(np.arange(weight, 1.0, -0.5)) + [1.0]
+    plan = None
+    try:
+        for plan, bound in ara_star(start, goal_test, action_generator, heuristic, weights, budget,
+                on_expand, on_generate, stats):
+            pass
+    except SearchBudgetExceededError as e:
+        if e.best_plan is None:
+            raise
+        plan = e.best_plan
+    return plan
+
+def applicable_ops(operators, world, current_state, goal, abs_info, cache=None):
+    '''Yields (operator instance, subgoal, cost) for every operator instance which can
+    achieve part of the goal.
+
+    If an EntailmentCache is given, the number of violated fluents of each subgoal is
+    computed from that of the goal and stored in the cache, so that the heuristic only
+    has to look at the fluents which regression removed and added. Suggester results are
+    cached in it too.
+    '''
+    if not isinstance(operators, OperatorLibrary):
+        operators = OperatorLibrary(operators)
+    for op_inst in operators.gen_instances(world, current_state, goal, abs_info, cache):
+        regression = regress_with_delta(goal, op_inst)
+        if regression is None:
+            continue
+        subgoal, removed, added = regression
+        if cache is not None:
+            cache.num_violated_after(goal, removed, added, subgoal)
+        yield op_inst, subgoal, 1 # cost fixed to 1 for all ops right now
 
 def num_violated_fluents(world, subgoal):
     '''Computes the "distance" between a conjunction of fluents and
@@ -91,16 +244,31 @@ def regress(g, o):
     Returns:
         g_pre (ConjunctionOfFluents or None): Weakest preimage, or None if no preimage exists.
     '''
+    regression = regress_with_delta(g, o)
+    if regression is None:
+        return None
+    return regression[0]
+
+def regress_with_delta(g, o):
+    '''Like regress, but also returns how the preimage differs from the given state.
+
+    Returns:
+        (g_pre, removed, added) or None if no preimage exists. removed is the list of fluents
+        of g which the operator achieves, and added is the list of preconditions which were
+        not already in g.
+    '''
     if o.target.contradicts(g) or o.side_effects.contradicts(g):
         return None
- 
-    g_pre = []
-    for f_g in g.fluents:
-        if not (o.target.entails(f_g) or o.side_effects.entails(f_g)):
-            g_pre.append(f_g)
 
+    removed = set(g.entailed_by(o.target))
+    for f in o.side_effects.fluents:
+        removed.update(g.entailed_by(f))
+
+    g_pre = [f_g for f_g in g.fluents if f_g not in removed]
+    added = []
     for f in o.preconditions.fluents:
-        if f not in g_pre:
+        if f in removed or f not in g.fluent_set:
+            added.append(f)
             g_pre.append(f)
-        
-    return ConjunctionOfFluents(g_pre)
+
+    return ConjunctionOfFluents(g_pre), list(removed), added
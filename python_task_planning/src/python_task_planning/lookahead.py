@@ -0,0 +1,226 @@
+'''
+Speculative refinement of the later abstract steps of an hpn plan, in a pool of worker
+threads, while the earlier steps are refined and executed.
+'''
+import logging
+import threading
+import time
+
+from python_task_planning.exceptions import PlanningFailedError, SearchBudgetExceededError
+from python_task_planning.hpn import search, applicable_ops
+from python_task_planning.entailment_cache import EntailmentCache
+from python_task_planning.heuristics import make_heuristic
+from python_task_planning.profiler import PlanStats
+
+logger = logging.getLogger(__name__)
+
+class Lookahead:
+    def __init__(self, pool, heuristic='num_violated'):
+        '''Plans abstract steps of hpn plans ahead of time.
+
+        Once hpn has a plan, it hands it to speculate(), which submits an A* search to the
+        pool for each non-concrete step after the first one which is independent of all
+        of the steps before it: it achieves (as its target or a side effect) none of the
+        fluents they need or achieve, and they achieve none of the fluents it needs.
+        Preconditions which both need are not a conflict. Each search plans for the step's
+        subgoal from the world as it is then, with the abstraction levels the step will be
+        refined with, and assumes that the targets and side effects of the steps before it
+        hold, as they will once hpn reaches the step.
+
+        When hpn reaches the step, it calls take(). A speculation which has not started is
+        cancelled and one which is running is waited for. Its plan is used only if the
+        world, after the executions since it was submitted, still entails the subgoal the
+        plan starts from; regression makes that the only assumption the plan rests on,
+        including any it made about the earlier steps. Otherwise it is discarded and hpn
+        searches again.
+
+        The searches run in threads, so they only overlap with work which releases the
+        GIL, such as a world whose execute() waits for a robot to move, or suggesters and
+        entailment checks which wait on sensors or other processes. The world's entails
+        and the suggesters are called from the pool while hpn executes operator instances,
+        so they must tolerate that.
+
+        Args:
+            pool: Pool with an apply_async method, such as multiprocessing.pool.ThreadPool.
+                States are not picklable, so a process pool can't be used.
+            heuristic (str or function): Heuristic for the speculative searches, as for
+                hpn; it should be the one hpn is given. Named heuristics are built for each
+                search against its own EntailmentCache, so a function given here must not
+                depend on hpn's cache.
+
+        Attributes:
+            submitted (int): Speculative searches submitted.
+            used (int): Speculative plans used by hpn.
+            discarded (int): Speculative plans thrown away because the world no longer
+                entailed the subgoal they started from.
+            cancelled (int): Speculations cancelled because hpn reached the step first.
+            failed (int): Speculative searches which found no plan or raised an error.
+        '''
+        self.pool = pool
+        self.heuristic = heuristic
+        self.submitted = 0
+        self.used = 0
+        self.discarded = 0
+        self.cancelled = 0
+        self.failed = 0
+        # maps each HPlanTree node being planned ahead to its _Speculation
+        self._pending = {}
+
+    def __repr__(self):
+        return 'Lookahead(submitted=%d, used=%d, discarded=%d, cancelled=%d, failed=%d)' % (
+            self.submitted, self.used, self.discarded, self.cancelled, self.failed)
+
+    def speculate(self, tree, operators, world, current_state, abs_info, budget=None, weight=1.0,
+            anytime=False):
+        '''Submits speculative searches for the later abstract steps of a planned tree node.
+
+        Args:
+            tree (HPlanTree): Node whose plan hpn has just found.
+            operators (OperatorLibrary): Operators hpn plans with.
+            world, current_state: As passed to hpn.
+            abs_info (AbstractionInfo): Abstraction levels of the node, before any of its
+                steps are refined.
+            budget, weight, anytime: Search options, as for hpn.
+        '''
+        abs_running = abs_info.copy()
+        # fluents needed and achieved by the steps so far
+        needed = set()
+        achieved = set()
+        first = True
+        for op, subtree in tree.plan:
+            if op is None:
+                continue
+            op_needed = set(op.preconditions.fluents)
+            op_achieved = set([op.target]) | set(op.side_effects.fluents)
+            if not op.concrete:
+                # the levels hpn will refine this step with
+                abs_running.inc_abs_level(op.target)
+                if not first and achieved.isdisjoint(op_needed) and \
+                        needed.isdisjoint(op_achieved) and achieved.isdisjoint(op_achieved):
+                    spec = _Speculation(operators, world, frozenset(achieved), current_state, subtree.goal,
+                        abs_running.copy(), self.heuristic, budget, weight, anytime)
+                    self._pending[subtree] = spec
+                    self.pool.apply_async(spec.run)
+                    self.submitted += 1
+                    logger.debug('Speculating on %s', op)
+                first = False
+            needed.update(op_needed)
+            achieved.update(op_achieved)
+
+    def take(self, tree, cache):
+        '''Returns (plan, stats) for a tree node which was planned ahead, or None if it
+        wasn't or its plan can't be used.
+
+        Args:
+            tree (HPlanTree): Node hpn is about to plan.
+            cache (EntailmentCache): hpn's cache, up to date with the world.
+
+        Returns:
+            The plan, reversed into execution order as hpn uses it, and the PlanStats of
+            the speculative search.
+        '''
+        spec = self._pending.pop(tree, None)
+        if spec is None:
+            return None
+        result = spec.claim()
+        if result is None:
+            self.cancelled += 1
+            return None
+        if isinstance(result, Exception):
+            self.failed += 1
+            logger.debug('Speculative search for %s failed: %s', tree.goal, result)
+            return None
+        plan, stats = result
+        if plan is None:
+            self.failed += 1
+            return None
+        if not cache.entails(plan[0][1]):
+            self.discarded += 1
+            logger.debug('Discarding speculative plan for %s', tree.goal)
+            return None
+        self.used += 1
+        return plan, stats
+
+    def cancel_all(self):
+        '''Cancels the speculations which have not started, and forgets all of them. hpn
+        calls it when a search fails, so that the pool isn't left planning for a run which
+        is over.
+        '''
+        for spec in self._pending.values():
+            spec.cancel()
+        self._pending.clear()
+
+class _Speculation:
+    def __init__(self, operators, world, assumed, current_state, goal, abs_info, heuristic, budget, weight,
+            anytime):
+        self.args = (operators, world, assumed, current_state, goal, abs_info, heuristic, budget, weight,
+            anytime)
+        self.state = 'queued'
+        self.result = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def run(self):
+        with self._lock:
+            if self.state != 'queued':
+                return
+            self.state = 'running'
+        try:
+            self.result = _plan_ahead(*self.args)
+        except (PlanningFailedError, SearchBudgetExceededError) as e:
+            self.result = e
+        except Exception as e:
+            logger.exception('Speculative search raised an error')
+            self.result = e
+        self.args = None
+        self._done.set()
+
+    def cancel(self):
+        '''Cancels the speculation if it hasn't started, and returns whether it was.
+        '''
+        with self._lock:
+            if self.state == 'queued':
+                self.state = 'cancelled'
+                return True
+        return False
+
+    def claim(self):
+        '''Result of the search, waiting for it if it is running, or None if it was
+        cancelled because it hadn't started.
+        '''
+        if self.cancel():
+            return None
+        self._done.wait()
+        return self.result
+
+def _plan_ahead(operators, world, assumed, current_state, goal, abs_info, heuristic, budget, weight, anytime):
+    stats = PlanStats()
+    stats.speculative = True
+    stats.start = time.time()
+    cache = EntailmentCache(_AssumingWorld(world, assumed))
+    if not callable(heuristic):
+        heuristic = make_heuristic(heuristic, operators, cache)
+
+    def counted_heuristic(s):
+        stats.heuristic_calls += 1
+        return heuristic(s)
+
+    plan = search(goal, cache.entails,
+        lambda s: applicable_ops(operators, world, current_state, s, abs_info, cache),
+        counted_heuristic, budget, weight, anytime, None, stats)
+    stats.search_time = time.time() - stats.start
+    stats.suggester_calls = cache.suggester_calls
+    stats.entailment_queries = cache.hits + cache.misses
+    if plan is not None:
+        plan.reverse()
+    return plan, stats
+
+class _AssumingWorld:
+    def __init__(self, world, assumed):
+        '''View of a world in which a set of fluents is assumed to hold as well.
+        '''
+        self.world = world
+        self.assumed = assumed
+
+    def entails(self, f):
+        return f in self.assumed or self.world.entails(f)
@@ -0,0 +1,243 @@
+import os
+import json
+import math
+from collections import OrderedDict
+import numpy as np
+
+from python_task_planning.a_star import a_star
+from python_task_planning.csr_graph import CSRGraph
+from python_task_planning.roadmap import Roadmap
+
+class MultiQueryPlanner:
+    def __init__(self, points, conn_dist, resolution=None, cache_size=1024, edge_checker=None, lazy=True,
+            graph=None, index_order=None):
+        '''Answers many shortest path queries between arbitrary points using one roadmap.
+
+        The roadmap and its CSRGraph are built once. For each query the start and end
+        points are connected to the roadmap points within conn_dist of them, as two extra
+        nodes in a CSROverlay which shares the graph's arrays, and the path is found with
+        A*. The heuristic is computed only for the nodes the search reaches, so a query
+        costs in proportion to the part of the roadmap it explores. Results are kept
+        in an LRU cache keyed on the start and end points rounded to the given resolution,
+        so queries which differ by less than that share one search.
+
+        With an edge_checker, edges are collision checked Lazy PRM style by default: the
+        search assumes that every unchecked roadmap edge is free, the edges of the path it
+        finds are then checked in one batch, and blocked edges are given infinite cost
+        before searching again, until a path made only of free edges is found. The result
+        of checking each edge is kept for later queries. The edges connecting the query
+        points to the roadmap are checked before searching.
+
+        Args:
+            points (np.array): N x D array of roadmap points.
+            conn_dist (float): Connection distance.
+            resolution (float): Size of the grid the query points are rounded to for the
+                cache; defaults to a hundredth of conn_dist.
+            cache_size (int): Maximum number of cached query results.
+            edge_checker: Function which takes two N x D arrays of segment end points and
+                returns an N element boolean array, True for the segments which are
+                free, such as ObstacleMap.segments_free. If None, every edge is free.
+            lazy (bool): If False, all roadmap edges are checked up front.
+            graph (CSRGraph): Graph of the roadmap, if already built (as by load()).
+            index_order (np.array): Sort order of the points for the roadmap's GridIndex,
+                if already known.
+        '''
+        self.roadmap = Roadmap(points, conn_dist, index_order)
+        self.graph = graph if graph is not None else self.roadmap.to_csr()
+        self.conn_dist = conn_dist
+        self.resolution = resolution if resolution is not None else conn_dist / 100.0
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+        self.edge_checker = edge_checker
+        # 0 for roadmap edges not checked yet, 1 for free ones and -1 for blocked ones
+        self.edge_status = np.zeros(self.graph.n_edges, dtype=np.int8)
+        self.n_edges_checked = 0
+        if edge_checker is not None and not lazy:
+            self._check_edges(np.arange(self.graph.n_edges))
+
+    def __repr__(self):
+        return 'MultiQueryPlanner(%d points, cached=%d, hits=%d, misses=%d)' % (
+            len(self.roadmap), len(self._cache), self.hits, self.misses)
+
+    def _key(self, x_start, x_end):
+        return tuple(np.round(np.concatenate([x_start, x_end]) / self.resolution).astype(int).tolist())
+
+    def _cache_get(self, key):
+        path = self._cache.pop(key)
+        self._cache[key] = path
+        return path
+
+    def _cache_put(self, key, path):
+        if len(self._cache) >= self.cache_size:
+            self._cache.popitem(last=False)
+        self._cache[key] = path
+
+    def plan(self, x_start, x_end):
+        '''Shortest path through the roadmap from x_start to x_end.
+
+        Returns:
+            path (list of np.array): Path (or None if no path found). It begins at the start
+                point and ends at the end point of the query whose result was cached.
+        '''
+        key = self._key(x_start, x_end)
+        try:
+            path = self._cache_get(key)
+            self.hits += 1
+        except KeyError:
+            path = self._search(x_start, x_end)
+            self.misses += 1
+            self._cache_put(key, path)
+        return path
+
+    def plan_batch(self, queries, pool=None, chunksize=8):
+        '''Answers a list of (x_start, x_end) queries.
+
+        Args:
+            queries (list): (x_start, x_end) pairs of points.
+            pool (multiprocessing.Pool): Pool from make_pool() in which to run the
+                searches which are not cached, or None to run them here.
+            chunksize (int): Number of queries sent to a worker at a time.
+
+        Returns:
+            List of paths, in the format returned by plan().
+        '''
+        keys = [self._key(x_start, x_end) for (x_start, x_end) in queries]
+        results = [None] * len(queries)
+        to_search = OrderedDict()
+        for ii, key in enumerate(keys):
+            if key in self._cache:
+                results[ii] = self._cache_get(key)
+                self.hits += 1
+            elif key in to_search:
+                # same query as an earlier one in this batch
+                to_search[key].append(ii)
+                self.hits += 1
+            else:
+                to_search[key] = [ii]
+                self.misses += 1
+
+        searched = [queries[indices[0]] for indices in to_search.values()]
+        if pool is None:
+            paths = [self._search(x_start, x_end) for (x_start, x_end) in searched]
+        else:
+            paths = pool.map(_search_in_worker, searched, chunksize)
+        for (key, indices), path in zip(to_search.items(), paths):
+            self._cache_put(key, path)
+            for ii in indices:
+                results[ii] = path
+        return results
+
+    def save(self, directory):
+        '''Writes the roadmap, its graph and the edges checked so far to a directory, for load().
+        '''
+        self.graph.save(directory)
+        np.save(os.path.join(directory, 'points.npy'), self.roadmap.points)
+        np.save(os.path.join(directory, 'index_order.npy'), self.roadmap.index.order)
+        np.save(os.path.join(directory, 'edge_status.npy'), self.edge_status)
+        with open(os.path.join(directory, 'planner.json'), 'w') as f:
+            json.dump({'conn_dist': self.conn_dist, 'resolution': self.resolution}, f)
+
+    @staticmethod
+    def load(directory, cache_size=1024, edge_checker=None, lazy=True, mmap_mode='r'):
+        '''Loads a planner written by save(), without building its roadmap again. The arrays
+        are memory mapped, so processes which load the same planner share their pages; the
+        edge weights and check results are mapped copy-on-write, since lazy checking
+        changes them.
+        '''
+        with open(os.path.join(directory, 'planner.json')) as f:
+            meta = json.load(f)
+        load = lambda name, mode: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mode)
+        planner = MultiQueryPlanner(load('points', mmap_mode), meta['conn_dist'], meta['resolution'],
+            cache_size, graph=CSRGraph.load(directory, mmap_mode), index_order=load('index_order', mmap_mode))
+        planner.edge_checker = edge_checker
+        planner.edge_status = load('edge_status', 'c' if mmap_mode is not None else None)
+        if edge_checker is not None and not lazy:
+            planner._check_edges(np.arange(planner.graph.n_edges))
+        return planner
+
+    def make_pool(self, processes=None):
+        '''Creates a multiprocessing pool whose workers each hold a copy of this planner,
+        for use with plan_batch(). The planner is sent to each worker once, when it starts.
+        Edges which the workers collision check are not sent back to this planner.
+        '''
+        import multiprocessing
+        return multiprocessing.Pool(processes, _init_worker, (self,))
+
+    def _check_edges(self, edge_ids):
+        '''Checks the roadmap edges with the given ids which have not been checked yet, and
+        gives the blocked ones infinite cost. Returns True iff all of the edges are free.
+        '''
+        unchecked = edge_ids[self.edge_status[edge_ids] == 0]
+        if len(unchecked) > 0:
+            sources = np.searchsorted(self.graph.indptr, unchecked, side='right') - 1
+            free = self.edge_checker(self.roadmap.points[sources],
+                self.roadmap.points[self.graph.indices[unchecked]])
+            self.edge_status[unchecked] = np.where(free, 1, -1)
+            self.graph.weights[unchecked[~free]] = np.inf
+            self.n_edges_checked += len(unchecked)
+        return bool(np.all(self.edge_status[edge_ids] == 1))
+
+    def _connect(self, x, nbrs, dists, reverse=False):
+        '''Keeps the connections between a query point and roadmap points which are free.
+        '''
+        if self.edge_checker is None or len(nbrs) == 0:
+            return nbrs, dists
+        x = np.tile(x, (len(nbrs), 1))
+        if reverse:
+            free = self.edge_checker(self.roadmap.points[nbrs], x)
+        else:
+            free = self.edge_checker(x, self.roadmap.points[nbrs])
+        return nbrs[free], dists[free]
+
+    def _search(self, x_start, x_end):
+        x_start = np.asarray(x_start, dtype=float)
+        x_end = np.asarray(x_end, dtype=float)
+        n = len(self.roadmap)
+        start, goal = n, n + 1
+
+        (start_nbrs, start_dists), (goal_nbrs, goal_dists) = self.roadmap.radius_neighbors(
+            np.array([x_start, x_end]))
+        start_nbrs, start_dists = self._connect(x_start, start_nbrs, start_dists)
+        goal_nbrs, goal_dists = self._connect(x_end, goal_nbrs, goal_dists, reverse=True)
+        sources = [np.repeat(start, len(start_nbrs)), goal_nbrs]
+        targets = [start_nbrs, np.repeat(goal, len(goal_nbrs))]
+        weights = [start_dists, goal_dists]
+        direct = np.sqrt(((x_end - x_start) ** 2).sum())
+        if direct < self.conn_dist and (self.edge_checker is None or self.edge_checker([x_start], [x_end])[0]):
+            sources.append([start])
+            targets.append([goal])
+            weights.append([direct])
+        sources, targets, weights = np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
+
+        points = self.roadmap.points
+        def heuristic(ii):
+            if ii < n:
+                d = points[ii] - x_end
+                return math.sqrt(np.dot(d, d))
+            return direct if ii == start else 0.0
+
+        graph = self.graph.with_overlay(2, sources, targets, weights)
+        while True:
+            p = a_star(start, lambda s: s == goal, graph, heuristic)
+            if p is None:
+                return None
+            nodes = np.array([ii for (action, ii) in p[1:-1]], dtype=np.int64)
+            if self.edge_checker is None:
+                break
+            # blocked edges get infinite cost in the graph the overlay shares, so search again
+            if self._check_edges(self.graph.edge_ids(nodes[:-1], nodes[1:])):
+                break
+        return [x_start] + [self.roadmap.points[ii] for ii in nodes] + [x_end]
+
+# planner used by the workers of a pool from MultiQueryPlanner.make_pool()
+_worker_planner = None
+
+def _init_worker(planner):
+    global _worker_planner
+    _worker_planner = planner
+
+def _search_in_worker(query):
+    return _worker_planner._search(*query)
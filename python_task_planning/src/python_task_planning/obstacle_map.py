@@ -0,0 +1,259 @@
+import os
+import json
+import numpy as np
+
+class ObstacleMap(object):
+    def __init__(self, obs_array, res):
+        '''2D obstacle map class.
+
+        The query methods accept either a single position or an N x 2 array of positions
+        (or arrays of coordinates), and answer all of them with array operations.
+
+        Args:
+            obs_array (np.array of np.bool): Occupancy array.
+            res (float): Size (height and width) of each cell in the occupancy array.
+        '''
+        self._setup(obs_array, None, obs_array.shape, res)
+
+    def _setup(self, obs_array, packed, shape, res):
+        self._obs_array = obs_array
+        # occupancy bits packed along the second axis, as by np.packbits, for maps loaded from disk
+        self._packed = packed
+        self.shape = tuple(shape)
+        self.res = res
+        self._summed_area = None
+        self._distance = None
+
+    @property
+    def obs_array(self):
+        '''Occupancy array. For maps loaded from disk, it is unpacked on first use.
+        '''
+        if self._obs_array is None:
+            self._obs_array = np.unpackbits(self._packed, axis=1)[:,:self.shape[1]].astype(bool)
+        return self._obs_array
+
+    @staticmethod
+    def from_packed(packed, shape, res):
+        '''Creates a map from occupancy bits packed along the second axis of the array by
+        np.packbits. Point queries read the packed bits directly, so a memory mapped array
+        is not copied into memory until a query needs the whole occupancy array.
+        '''
+        obs_map = ObstacleMap.__new__(ObstacleMap)
+        obs_map._setup(None, packed, shape, res)
+        return obs_map
+
+    def save(self, directory, precompute=False):
+        '''Writes the map to a directory, with the occupancy bit-packed, for load().
+
+        Args:
+            directory (str): Directory to write to; created if it does not exist.
+            precompute (bool): Also write the summed-area table and distance transform, so
+                that processes which load the map share them rather than computing them.
+        '''
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        packed = self._packed if self._packed is not None else np.packbits(self.obs_array.astype(bool), axis=1)
+        np.save(os.path.join(directory, 'occupancy.npy'), packed)
+        if precompute:
+            np.save(os.path.join(directory, 'summed_area.npy'), self.summed_area())
+            np.save(os.path.join(directory, 'distance.npy'), self.distance_transform())
+        with open(os.path.join(directory, 'map.json'), 'w') as f:
+            json.dump({'shape': list(self.shape), 'res': self.res}, f)
+
+    @staticmethod
+    def load(directory, mmap_mode='r'):
+        '''Loads a map written by save(). With the default mmap_mode the arrays are memory
+        mapped read-only, so loading takes constant time and processes which load the same
+        map share its pages.
+        '''
+        with open(os.path.join(directory, 'map.json')) as f:
+            meta = json.load(f)
+        obs_map = ObstacleMap.from_packed(np.load(os.path.join(directory, 'occupancy.npy'), mmap_mode=mmap_mode),
+            meta['shape'], meta['res'])
+        if os.path.exists(os.path.join(directory, 'summed_area.npy')):
+            obs_map._summed_area = np.load(os.path.join(directory, 'summed_area.npy'), mmap_mode=mmap_mode)
+            obs_map._distance = np.load(os.path.join(directory, 'distance.npy'), mmap_mode=mmap_mode)
+        return obs_map
+
+    def pos_to_ind(self, p):
+        '''Return array index for cell that contains x,y position. For an N x 2 array of
+        positions, returns an N x 2 array of indices.
+        '''
+        ind = np.floor(np.asarray(p, dtype=float) / self.res).astype(int)
+        if ind.ndim == 1:
+            return int(ind[0]), int(ind[1])
+        return ind
+
+    def ind_to_pos(self, ind):
+        '''Return x,y position of center point of cell specified by index.
+        '''
+        return np.asarray(ind) * self.res + 0.5 * self.res
+
+    def _indices(self, p):
+        return np.floor(np.atleast_2d(p) / self.res).astype(int)
+
+    def _inside(self, ind):
+        return (ind[...,0] >= 0) & (ind[...,0] < self.shape[0]) & \
+            (ind[...,1] >= 0) & (ind[...,1] < self.shape[1])
+
+    def is_occupied(self, p):
+        '''Whether the cell containing each position is occupied. Positions outside the
+        map count as occupied.
+        '''
+        p = np.asarray(p, dtype=float)
+        occupied = self._occupied_ind(self._indices(p))
+        if p.ndim == 1:
+            return bool(occupied[0])
+        return occupied
+
+    def _occupied_ind(self, ind):
+        '''Whether each cell of an M x 2 array of indices is occupied, or outside the map.
+        '''
+        inside = self._inside(ind)
+        occupied = np.ones(len(ind), dtype=bool)
+        ii, jj = ind[inside,0], ind[inside,1]
+        if self._obs_array is None:
+            occupied[inside] = (self._packed[ii, jj >> 3] >> (7 - (jj & 7))) & 1
+        else:
+            occupied[inside] = self._obs_array[ii, jj]
+        return occupied
+
+    def summed_area(self):
+        '''Summed-area table of the occupancy array: entry (i, j) is the number of occupied
+        cells in obs_array[:i,:j]. Computed on first use.
+        '''
+        if self._summed_area is None:
+            s = self.shape
+            dtype = np.int32 if s[0] * s[1] < 2**31 else np.int64
+            self._summed_area = np.zeros((s[0] + 1, s[1] + 1), dtype=dtype)
+            np.cumsum(np.cumsum(self.obs_array, axis=0, dtype=dtype), axis=1, out=self._summed_area[1:,1:])
+        return self._summed_area
+
+    def count_occupied(self, x0, x1, y0, y1):
+        '''Number of occupied cells within the bounding box, in constant time per box from
+        the summed-area table. The arguments may be arrays of boxes.
+        '''
+        sat = self.summed_area()
+        i0 = np.clip(np.floor(np.asarray(x0, dtype=float) / self.res).astype(int), 0, sat.shape[0] - 1)
+        i1 = np.clip(np.floor(np.asarray(x1, dtype=float) / self.res).astype(int), 0, sat.shape[0] - 1)
+        j0 = np.clip(np.floor(np.asarray(y0, dtype=float) / self.res).astype(int), 0, sat.shape[1] - 1)
+        j1 = np.clip(np.floor(np.asarray(y1, dtype=float) / self.res).astype(int), 0, sat.shape[1] - 1)
+        i1 = np.maximum(i0, i1)
+        j1 = np.maximum(j0, j1)
+        return sat[i1,j1] - sat[i0,j1] - sat[i1,j0] + sat[i0,j0]
+
+    def any_occupied(self, x0, x1, y0, y1):
+        '''Return true if any cells within the bounding box are occupied. The arguments may
+        be arrays of boxes.
+        '''
+        return self.count_occupied(x0, x1, y0, y1) > 0
+
+    def distance_transform(self):
+        '''Array of the distance from the center of each cell to the nearest occupied cell
+        center, or 0 for occupied cells. Computed on first use; requires scipy.
+        '''
+        if self._distance is None:
+            from scipy import ndimage
+            self._distance = ndimage.distance_transform_edt(~self.obs_array.astype(bool)) * self.res
+        return self._distance
+
+    def clearance(self, p):
+        '''Distance from the cell containing each position to the nearest obstacle, from the
+        distance transform. Positions outside the map have clearance 0.
+        '''
+        p = np.asarray(p, dtype=float)
+        ind = self._indices(p)
+        inside = self._inside(ind)
+        clearance = np.zeros(len(ind))
+        clearance[inside] = self.distance_transform()[ind[inside,0], ind[inside,1]]
+        if p.ndim == 1:
+            return float(clearance[0])
+        return clearance
+
+    def segments_free(self, p0, p1, margin=0.0, max_cells=1000000):
+        '''Checks a batch of line segments against the map.
+
+        Every cell a segment passes through is checked, so no obstacle is missed however
+        little of it the segment clips. The cells are found by rasterizing the segments:
+        besides the cells of the two end points, wherever a segment crosses a grid line the
+        cells on both sides of the crossing are taken, which also covers a segment passing
+        exactly through a cell corner. The cells of all segments are looked up in one array
+        operation (max_cells at a time).
+
+        Args:
+            p0, p1 (np.array): N x 2 arrays of segment end points.
+            margin (float): If greater than 0, every cell must also be at least this far
+                from the nearest obstacle, according to the distance transform.
+            max_cells (int): Bounds the number of cells held in memory at once.
+
+        Returns:
+            N element boolean array, True for the segments which are collision free.
+        '''
+        p0 = np.atleast_2d(np.asarray(p0, dtype=float))
+        p1 = np.atleast_2d(np.asarray(p1, dtype=float))
+        ind0, ind1 = self._indices(p0), self._indices(p1)
+        # grid lines crossed along each axis
+        n_crossings = np.abs(ind1 - ind0)
+        n_cells = 2 + 2 * n_crossings.sum(axis=1)
+        free = np.ones(len(p0), dtype=bool)
+        chunk_start = 0
+        while chunk_start < len(p0):
+            # take as many segments as fit in max_cells, but always at least one
+            ends = np.cumsum(n_cells[chunk_start:])
+            chunk_end = chunk_start + max(1, np.searchsorted(ends, max_cells, side='right'))
+            chunk = np.arange(chunk_start, chunk_end)
+            segments = [chunk, chunk]
+            cells = [ind0[chunk], ind1[chunk]]
+            for axis in (0, 1):
+                crossing_segments, crossed = self._crossed_cells(p0[chunk], p1[chunk], ind0[chunk], ind1[chunk],
+                    axis)
+                segments.append(chunk[crossing_segments])
+                cells.append(crossed)
+            segments, cells = np.concatenate(segments), np.concatenate(cells)
+            blocked = self._occupied_ind(cells)
+            if margin > 0:
+                inside = self._inside(cells)
+                clearance = np.zeros(len(cells))
+                clearance[inside] = self.distance_transform()[cells[inside,0], cells[inside,1]]
+                blocked |= clearance < margin
+            free[np.unique(segments[blocked])] = False
+            chunk_start = chunk_end
+        return free
+
+    def _crossed_cells(self, p0, p1, ind0, ind1, axis):
+        '''Cells on both sides of every crossing of a grid line perpendicular to the given
+        axis, for segments from p0 to p1 whose end points are in cells ind0 and ind1.
+        Returns the index of the segment of each cell and the M x 2 array of cells.
+        '''
+        other = 1 - axis
+        counts = np.abs(ind1[:,axis] - ind0[:,axis])
+        segments = np.repeat(np.arange(len(p0)), counts)
+        if len(segments) == 0:
+            return np.zeros(0, dtype=int), np.zeros((0, 2), dtype=int)
+        first = np.cumsum(counts) - counts
+        # the k-th line crossed, counting from the lower end of the segment along the axis
+        k = np.arange(counts.sum()) - np.repeat(first, counts)
+        lines = np.minimum(ind0[:,axis], ind1[:,axis])[segments] + 1 + k
+        a0, a1 = p0[segments], p1[segments]
+        t = (lines * self.res - a0[:,axis]) / (a1[:,axis] - a0[:,axis])
+        across = np.floor((a0[:,other] + t * (a1[:,other] - a0[:,other])) / self.res).astype(int)
+        cells = np.empty((2 * len(segments), 2), dtype=int)
+        cells[:len(segments),axis] = lines - 1
+        cells[len(segments):,axis] = lines
+        cells[:,other] = np.concatenate([across, across])
+        return np.concatenate([segments, segments]), cells
+
+    def points(self):
+        '''Center points of all cells, in row-major order of the occupancy array.
+        '''
+        ii, jj = np.indices(self.shape)
+        return self.ind_to_pos(np.column_stack([ii.ravel(), jj.ravel()]))
+
+    def occupied_points(self):
+        return self.ind_to_pos(np.argwhere(self.obs_array))
+
+    def extent(self):
+        x_min, y_min = self.ind_to_pos((0, 0))
+        s = self.shape
+        x_max, y_max = self.ind_to_pos((s[0]-1, s[1]-1))
+        return x_min, y_min, x_max, y_max
@@ -0,0 +1,60 @@
+from python_task_planning.common import Variable, static_predicates
+
+class OperatorLibrary:
+    def __init__(self, operators):
+        '''Operators of a domain, indexed by the fluents their targets can match.
+
+        Operators are grouped by target predicate, and within a predicate by the positions
+        and values of the constant arguments of their targets, so that looking up the
+        operators relevant to a goal fluent takes one dict lookup per group rather than a
+        match per operator. Can be used wherever a list of operators is expected.
+
+        Args:
+            operators (list of Operator): Operators of the domain.
+        '''
+        self.operators = list(operators)
+        self.static_preds = static_predicates(self.operators)
+
+        # maps predicate to {constant positions: {constant values: [operator index]}}
+        self._index = {}
+        for ii, op in enumerate(self.operators):
+            positions = tuple([jj for (jj, arg) in enumerate(op.target.args) if not isinstance(arg, Variable)])
+            values = tuple([op.target.args[jj] for jj in positions])
+            groups = self._index.setdefault(op.target.pred, {})
+            groups.setdefault(positions, {}).setdefault(values, []).append(ii)
+
+    def __repr__(self):
+        return 'OperatorLibrary(%s)' % ', '.join([op.name for op in self.operators])
+
+    def __len__(self):
+        return len(self.operators)
+
+    def __iter__(self):
+        return iter(self.operators)
+
+    def relevant(self, f):
+        '''Indices of the operators whose target may match the given fluent.
+        '''
+        relevant = []
+        for positions, by_values in self._index.get(f.pred, {}).items():
+            if len(positions) > 0 and positions[-1] >= len(f.args):
+                continue
+            relevant.extend(by_values.get(tuple([f.args[jj] for jj in positions]), ()))
+        return relevant
+
+    def gen_instances(self, world, current_state, goal, abs_info, cache=None):
+        '''Yields the instances of all operators which achieve a fluent of the goal, in the
+        same order as calling gen_instances on each operator in turn.
+        '''
+        candidates = []
+        for jj, f in enumerate(goal.fluents):
+            for ii in self.relevant(f):
+                candidates.append((ii, jj))
+        candidates.sort()
+        for ii, jj in candidates:
+            op = self.operators[ii]
+            bindings = op.compiled()[0](goal.fluents[jj])
+            if bindings is None:
+                continue
+            for op_inst in op.instances_for(bindings, world, current_state, goal, abs_info, cache, self.static_preds):
+                yield op_inst
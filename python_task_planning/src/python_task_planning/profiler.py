@@ -0,0 +1,196 @@
+'''
+Reports on where hpn spent its time, from the PlanStats it records on each node of an
+HPlanTree.
+
+Each tree node's stats cover the work done at that node only: its A* search and the
+operator instances it executed directly. Its wall time covers the refinements below it
+as well, so the self time of a node is its wall time minus that of its children.
+'''
+import json
+
+class PlanStats(object):
+    def __init__(self):
+        '''Statistics of one node of an HPlanTree, recorded by hpn.
+
+        Attributes:
+            start, end (float): Wall clock time at which planning for the node started and
+                ended (end is None if it did not finish).
+            search_time (float): Seconds spent in the A* search for the node's plan.
+            expanded, generated (int): States expanded and successors generated by the search.
+            stored (int): States stored by the search, a measure of its memory use.
+            max_open (int): Peak size of the search's open list.
+            heuristic_calls (int): Number of heuristic evaluations in the search.
+            suggester_calls (int): Number of suggester calls in the search.
+            entailment_queries (int): Entailment queries during the search, cached or not.
+            executions (int): Operator instances executed directly by the node.
+            execution_time (float): Seconds spent executing them.
+            speculative (bool): True if the node's plan was found ahead of time by a
+                Lookahead, in which case search_time and the search counts are those of
+                the speculative search.
+        '''
+        self.start = None
+        self.end = None
+        self.search_time = 0.0
+        self.expanded = 0
+        self.generated = 0
+        self.stored = 0
+        self.max_open = 0
+        self.heuristic_calls = 0
+        self.suggester_calls = 0
+        self.entailment_queries = 0
+        self.executions = 0
+        self.execution_time = 0.0
+        self.speculative = False
+
+    def __repr__(self):
+        return 'PlanStats(time=%.4fs, search=%.4fs, expanded=%d, generated=%d, executions=%d)' % (
+            self.time, self.search_time, self.expanded, self.generated, self.executions)
+
+    @property
+    def time(self):
+        '''Wall time of the node, including its refinements.
+        '''
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+    def add(self, other):
+        '''Adds the counts of another PlanStats to these ones, as for a subtree total.
+        The peak open list size becomes the larger of the two.
+        '''
+        for name in ['search_time', 'expanded', 'generated', 'stored', 'heuristic_calls', 'suggester_calls',
+                'entailment_queries', 'executions', 'execution_time']:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.max_open = max(self.max_open, other.max_open)
+
+def children(tree):
+    '''(operator instance, subtree) pairs of the refinements of a tree node which were planned.
+    '''
+    if tree.plan is None:
+        return []
+    return [(op, subtree) for (op, subtree) in tree.plan if subtree.stats is not None]
+
+def self_time(tree):
+    '''Wall time of a tree node minus that of its refinements.
+    '''
+    return max(tree.stats.time - sum([subtree.stats.time for (op, subtree) in children(tree)]), 0.0)
+
+def subtree_stats(tree):
+    '''PlanStats summed over a tree node and all of its refinements. Its time is the wall
+    time of the node.
+    '''
+    total = PlanStats()
+    total.start, total.end = tree.stats.start, tree.stats.end
+    stack = [tree]
+    while len(stack) > 0:
+        node = stack.pop()
+        total.add(node.stats)
+        stack.extend([subtree for (op, subtree) in children(node)])
+    return total
+
+def walk(tree, name=None, path=()):
+    '''Yields (path, tree) for a tree node and each of its refinements, depth first in plan
+    order. The path is the tuple of frame names from the root down to the node: the goal of
+    the root, and the operator instance refined by each node below it.
+    '''
+    if name is None:
+        name = str(tree.goal)
+    path = path + (name,)
+    yield path, tree
+    for op, subtree in children(tree):
+        for item in walk(subtree, repr(op), path):
+            yield item
+
+def report(tree, min_fraction=0.0):
+    '''Flame-graph style text breakdown of a planned tree: one line per node, indented by
+    depth, with its total and self wall time, its share of the root's time and the counts
+    of its own search.
+
+    Args:
+        tree (HPlanTree): Tree planned by hpn.
+        min_fraction (float): Leave out nodes whose total time is less than this fraction
+            of the root's.
+    '''
+    root_time = tree.stats.time or 1.0
+    lines = ['%9s %9s %6s %9s %9s %9s %9s %9s %5s  %s' % ('total(s)', 'self(s)', '%', 'expanded', 'generated',
+        'max_open', 'heur', 'suggest', 'exec', 'node')]
+    for path, node in walk(tree):
+        s = node.stats
+        if s.time < min_fraction * root_time:
+            continue
+        lines.append('%9.4f %9.4f %6.1f %9d %9d %9d %9d %9d %5d  %s%s' % (s.time, self_time(node),
+            100.0 * s.time / root_time, s.expanded, s.generated, s.max_open, s.heuristic_calls,
+            s.suggester_calls, s.executions, '  ' * (len(path) - 1), path[-1]))
+    return '\n'.join(lines)
+
+def collapsed_stacks(tree, metric='self_time'):
+    '''Lines in the collapsed stack format read by flamegraph.pl and speedscope: the frame
+    names of each node joined by ';', followed by its value.
+
+    Args:
+        tree (HPlanTree): Tree planned by hpn.
+        metric (str): 'self_time' for the self time of each node in microseconds, or the
+            name of a PlanStats count such as 'expanded' or 'heuristic_calls'.
+    '''
+    lines = []
+    for path, node in walk(tree):
+        if metric == 'self_time':
+            value = int(round(self_time(node) * 1e6))
+        else:
+            value = getattr(node.stats, metric)
+        if value > 0:
+            lines.append('%s %d' % (';'.join([name.replace(';', ',') for name in path]), value))
+    return lines
+
+def speedscope(tree, name='hpn'):
+    '''Profile of a planned tree in the speedscope file format, as a dict to write out with
+    json. Each node is an evented frame spanning its wall time, so the timeline shows the
+    nodes in the order hpn planned them.
+    '''
+    frames = []
+    frame_index = {}
+    events = []
+    t0 = tree.stats.start
+
+    def visit(path, node):
+        if path[-1] not in frame_index:
+            frame_index[path[-1]] = len(frames)
+            frames.append({'name': path[-1]})
+        frame = frame_index[path[-1]]
+        events.append({'type': 'O', 'frame': frame, 'at': node.stats.start - t0})
+        end = node.stats.start
+        for op, subtree in children(node):
+            end = visit(path + (repr(op),), subtree)
+        if node.stats.end is not None:
+            end = node.stats.end
+        # a node which did not finish is closed when its last refinement was
+        events.append({'type': 'C', 'frame': frame, 'at': end - t0})
+        return end
+
+    visit((str(tree.goal),), tree)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'evented',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0.0,
+            'endValue': tree.stats.time,
+            'events': events,
+            }],
+        'name': name,
+        'exporter': 'python_task_planning.profiler',
+        }
+
+def write_speedscope(tree, filename, name='hpn'):
+    '''Writes speedscope(tree) to a file which https://www.speedscope.app can open.
+    '''
+    with open(filename, 'w') as f:
+        json.dump(speedscope(tree, name), f)
+
+def write_collapsed(tree, filename, metric='self_time'):
+    '''Writes collapsed_stacks(tree) to a file, for flamegraph.pl or speedscope.
+    '''
+    with open(filename, 'w') as f:
+        f.write('\n'.join(collapsed_stacks(tree, metric)) + '\n')
@@ -0,0 +1,184 @@
+import itertools
+import numpy as np
+
+from python_task_planning.csr_graph import CSRGraph
+
+class GridIndex:
+    def __init__(self, points, cell_size, order=None):
+        '''Uniform grid hash over an array of points, for radius-neighbor queries.
+
+        Points are sorted by the cell they fall in, so the points of any cell are a
+        contiguous slice of self.order, found by binary search on the sorted cell keys.
+
+        Args:
+            points (np.array): N x D array of points.
+            cell_size (float): Width of the (hypercube) cells.
+            order (np.array): Order of the points sorted by cell, if already known (as
+                from a saved index), which saves sorting them again.
+        '''
+        self.points = np.asarray(points, dtype=float)
+        self.cell_size = float(cell_size)
+        self.origin = self.points.min(axis=0) if len(self.points) > 0 else np.zeros(self.points.shape[1])
+        cells = self._cells(self.points)
+        self.shape = cells.max(axis=0) + 1 if len(self.points) > 0 else np.ones(self.points.shape[1], dtype=int)
+        # row-major strides for turning cell coordinates into a single key
+        self.strides = np.cumprod(np.concatenate([self.shape[1:], [1]])[::-1])[::-1]
+        keys = np.dot(cells, self.strides)
+        self.order = np.argsort(keys, kind='mergesort') if order is None else order
+        self.sorted_keys = keys[self.order]
+
+    def _cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(int)
+
+    def _cell_members(self, cells):
+        '''Indices of the points in the given cells (K x D array of cell coordinates).
+        '''
+        inside = np.all((cells >= 0) & (cells < self.shape), axis=1)
+        keys = np.dot(cells[inside], self.strides)
+        starts = np.searchsorted(self.sorted_keys, keys, side='left')
+        ends = np.searchsorted(self.sorted_keys, keys, side='right')
+        return np.concatenate([self.order[s:e] for s, e in zip(starts, ends)] + [np.zeros(0, dtype=int)])
+
+    def radius_neighbors(self, query_points, r):
+        '''Finds the indexed points within distance r of each query point.
+
+        Queries which fall in the same cell share their candidate points, so the
+        distances for all of them are computed in one array operation.
+
+        Args:
+            query_points (np.array): M x D array of query points.
+            r (float): Query radius.
+
+        Returns:
+            List of M (indices, distances) pairs of arrays.
+        '''
+        query_points = np.atleast_2d(np.asarray(query_points, dtype=float))
+        reach = int(np.ceil(r / self.cell_size))
+        offsets = np.array(list(itertools.product(range(-reach, reach + 1), repeat=self.points.shape[1])))
+
+        query_cells = self._cells(query_points)
+        unique_cells, inverse = _unique_rows(query_cells)
+        results = [None] * len(query_points)
+        for cell_ii, cell in enumerate(unique_cells):
+            candidates = self._cell_members(cell + offsets)
+            queries = np.nonzero(inverse == cell_ii)[0]
+            diffs = query_points[queries][:, np.newaxis, :] - self.points[candidates][np.newaxis, :, :]
+            dists = np.sqrt((diffs ** 2).sum(axis=2))
+            for row, query_ii in enumerate(queries):
+                within = dists[row] < r
+                results[query_ii] = (candidates[within], dists[row][within])
+        return results
+
+    def pairs_within(self, r, chunk_size=100000):
+        '''Finds all pairs of distinct indexed points within distance r of each other.
+
+        Every point is matched against the points in each neighboring cell with array
+        operations only, a chunk of points at a time to bound the memory used for the
+        candidate pairs.
+
+        Args:
+            r (float): Query radius.
+            chunk_size (int): Number of points processed at once.
+
+        Returns:
+            (sources, targets, distances) arrays, with each pair appearing in both orders.
+        '''
+        reach = int(np.ceil(r / self.cell_size))
+        offsets = np.array(list(itertools.product(range(-reach, reach + 1), repeat=self.points.shape[1])))
+        results = []
+        for chunk_start in range(0, len(self.points), chunk_size):
+            queries = np.arange(chunk_start, min(chunk_start + chunk_size, len(self.points)))
+            query_cells = self._cells(self.points[queries])
+            for offset in offsets:
+                cells = query_cells + offset
+                inside = np.all((cells >= 0) & (cells < self.shape), axis=1)
+                keys = np.dot(cells[inside], self.strides)
+                starts = np.searchsorted(self.sorted_keys, keys, side='left')
+                counts = np.searchsorted(self.sorted_keys, keys, side='right') - starts
+                # expand each query's [start, end) range of sorted points into explicit pairs
+                sources = np.repeat(queries[inside], counts)
+                positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+                targets = self.order[positions]
+                dists = np.sqrt(((self.points[sources] - self.points[targets]) ** 2).sum(axis=1))
+                within = (dists < r) & (sources != targets)
+                results.append((sources[within], targets[within], dists[within]))
+        if len(results) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+class Roadmap:
+    def __init__(self, points, conn_dist, index_order=None):
+        '''Graph over an array of points, in which points closer than conn_dist are
+        connected with cost equal to their distance.
+
+        States are point indices, and the action which moves to a point is its index,
+        so action_generator can be passed straight to a_star.
+
+        Args:
+            points (np.array): N x D array of points.
+            conn_dist (float): Connection distance.
+            index_order (np.array): Sort order of the points for the GridIndex, if known.
+        '''
+        self.points = np.asarray(points, dtype=float)
+        self.conn_dist = conn_dist
+        self.index = GridIndex(self.points, conn_dist, index_order)
+
+    def __len__(self):
+        return len(self.points)
+
+    def radius_neighbors(self, query_points, r=None):
+        '''Batch radius-neighbor query against the roadmap points; see GridIndex.
+        '''
+        if r is None:
+            r = self.conn_dist
+        return self.index.radius_neighbors(query_points, r)
+
+    def neighbors(self, ii):
+        '''Returns (indices, distances) arrays of the points connected to point ii.
+        '''
+        indices, dists = self.radius_neighbors(self.points[ii:ii+1])[0]
+        not_self = indices != ii
+        return indices[not_self], dists[not_self]
+
+    def action_generator(self, state):
+        '''Yields (action, next_state, cost) for each point connected to the given one.
+        '''
+        indices, dists = self.neighbors(state)
+        for jj, d in zip(indices.tolist(), dists.tolist()):
+            yield jj, jj, d
+
+    def heuristic(self, goal):
+        '''Returns a function giving the straight line distance from a point to the goal point.
+        '''
+        goal_point = self.points[goal]
+        return lambda s: float(np.sqrt(((self.points[s] - goal_point) ** 2).sum()))
+
+    def heuristic_array(self, goal):
+        '''Straight line distance from every point to the goal point, as an array which can
+        be passed to a_star along with the graph from to_csr().
+        '''
+        return np.sqrt(((self.points - self.points[goal]) ** 2).sum(axis=1))
+
+    def to_csr(self, chunk_size=100000):
+        '''Precomputes all the edges of the roadmap as a CSRGraph, so that searches no
+        longer query the grid index for every expanded point.
+        '''
+        sources, targets, dists = self.index.pairs_within(self.conn_dist, chunk_size)
+        return CSRGraph.from_edges(len(self.points), sources, targets, dists)
+
+    def nearest(self, point):
+        '''Index of the roadmap point nearest to the given point, or None if there is
+        no point within conn_dist of it.
+        '''
+        indices, dists = self.radius_neighbors(point)[0]
+        if len(indices) == 0:
+            return None
+        return int(indices[np.argmin(dists)])
+
+def _unique_rows(a):
+    '''np.unique over the rows of a 2D integer array; returns (unique rows, inverse).
+    '''
+    a = np.ascontiguousarray(a)
+    view = a.view(np.dtype((np.void, a.dtype.itemsize * a.shape[1]))).ravel()
+    _, first, inverse = np.unique(view, return_index=True, return_inverse=True)
+    return a[first], inverse
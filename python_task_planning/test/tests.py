@@ -6,5 +6,893 @@ def test_cof_entails():
     cof2 = ConjunctionOfFluents([])
     assert(cof1.entails(cof2))
 
+def test_a_star_decrease_key():
+    from python_task_planning.a_star import a_star
+    # the direct edge to 'c' is found first, but going through 'b' is cheaper
+    edges = {
+        'a': [('ab', 'b', 1.0), ('ac', 'c', 5.0)],
+        'b': [('bc', 'c', 1.0)],
+        'c': [('cd', 'd', 1.0)],
+        'd': [],
+        }
+    plan = a_star('a', lambda s: s == 'd', lambda s: edges[s], lambda s: 0.0)
+    assert(list(plan) == [('ab', 'a'), ('bc', 'b'), ('cd', 'c'), (None, 'd')])
+
+def test_cof_equality():
+    from python_task_planning import ConjunctionOfFluents, Fluent, Predicate, Symbol
+    P = Predicate('P', ['x'])
+    a, b = Symbol('a'), Symbol('b')
+    cof1 = ConjunctionOfFluents([P((a,)), P((b,))])
+    cof2 = ConjunctionOfFluents([P((b,)), P((a,)), P((b,))])
+    assert(cof1 == cof2)
+    assert(hash(cof1) == hash(cof2))
+    assert(cof1 is cof2)
+    assert(cof1 != ConjunctionOfFluents([P((a,))]))
+
+    # conjunctions of a fluent and of its negation are interned separately
+    class NotFluent(Fluent):
+        __slots__ = ()
+        def contradicts(self, other):
+            return other == Fluent(self.pred, self.args)
+    positive = ConjunctionOfFluents([P((b,))])
+    negative = ConjunctionOfFluents([NotFluent(P, (b,))])
+    assert(positive is not negative and positive != negative)
+    assert(type(positive.fluents[0]) is Fluent and type(negative.fluents[0]) is NotFluent)
+    assert(ConjunctionOfFluents([P((b,)), NotFluent(P, (b,))]).fluent_set ==
+        frozenset([P((b,)), NotFluent(P, (b,))]))
+
+def test_fluent_interning():
+    from python_task_planning import Predicate, Symbol, Variable
+    P = Predicate('P', ['x', 'y'])
+    a = Symbol('a')
+    x = Variable('x')
+    f = P((a, x))
+    assert(f.bind({x: a}) is P((a, a)))
+    assert(f.bind({}) is f)
+    assert(P((a, a)) != f)
+    assert(Predicate('P', ['x', 'y']) is P)
+
+def test_fluent_store():
+    from python_task_planning import ConjunctionOfFluents, Fluent, FluentStore, Predicate, Symbol
+    class NotFluent(Fluent):
+        __slots__ = ()
+        def contradicts(self, other):
+            return other == Fluent(self.pred, self.args)
+    P = Predicate('P', ['x'])
+    Q = Predicate('Q', ['x'])
+    a, b = Symbol('a'), Symbol('b')
+    store = FluentStore([P((a,)), NotFluent(Q, (b,))])
+    assert(store.entails(P((a,))))
+    assert(not store.entails(P((b,))))
+    assert(store.entails(ConjunctionOfFluents([P((a,))])))
+    assert(store.contradicts(Q((b,))))
+    assert(not store.contradicts(Q((a,))))
+    store.add(P((b,)))
+    assert(store.with_pred(P) == set([P((a,)), P((b,))]))
+    store.remove(P((a,)))
+    assert(not store.entails(P((a,))))
+
+    # a fluent and its negation are different fluents, and both can be stored
+    assert(Q((b,)) != NotFluent(Q, (b,)) and NotFluent(Q, (b,)) != Q((b,)))
+    store.add(Q((b,)))
+    assert(Q((b,)) in store and NotFluent(Q, (b,)) in store)
+    assert(store.entails(Q((b,))))
+
+def test_abstraction_info():
+    from python_task_planning import AbstractionInfo
+    a = AbstractionInfo()
+    a.inc_abs_level('f')
+    assert(a.get_abs_level('f') == 1)
+    # each instance has its own counts
+    assert(AbstractionInfo().get_abs_level('f') == 0)
+    b = a.copy()
+    b.inc_abs_level('f')
+    assert((a.get_abs_level('f'), b.get_abs_level('f')) == (1, 2))
+
+def test_entailment_cache():
+    from python_task_planning import ConjunctionOfFluents, EntailmentCache, FluentStore, Predicate, Symbol
+    class World:
+        def __init__(self):
+            self.state = FluentStore()
+            self.queries = 0
+        def entails(self, f):
+            self.queries += 1
+            return self.state.entails(f)
+        def execute(self, op):
+            self.state.add(op)
+            return self.state
+    P = Predicate('P', ['x'])
+    a, b, c = Symbol('a'), Symbol('b'), Symbol('c')
+    world = World()
+    cache = EntailmentCache(world, maxsize=2)
+    goal = ConjunctionOfFluents([P((a,)), P((b,))])
+    assert(cache.num_violated(goal) == 2)
+    assert(cache.num_violated(goal) == 2)
+    assert(world.queries == 2)
+    assert((cache.hits, cache.misses) == (1, 3))
+    assert(len(cache) == 2)
+    cache.execute(P((a,)))
+    assert(len(cache) == 0)
+    assert(cache.num_violated(goal) == 1)
+    assert(not cache.entails(goal))
+    assert(cache.entails(P((a,))))
+    assert(not cache.entails(P((c,))))
+
+def test_regress_delta_heuristic():
+    from python_task_planning import ConjunctionOfFluents, EntailmentCache, FluentStore, OperatorInstance, \
+         Predicate, Symbol
+    from python_task_planning.hpn import regress_with_delta, num_violated_fluents
+    P = Predicate('P', ['x'])
+    Q = Predicate('Q', ['x'])
+    a, b, c = Symbol('a'), Symbol('b'), Symbol('c')
+    world = FluentStore([P((a,)), Q((c,))])
+    goal = ConjunctionOfFluents([P((a,)), P((b,)), Q((b,))])
+    op = OperatorInstance('MakeP', 0, P((b,)), ConjunctionOfFluents([Q((b,)), Q((c,))]),
+        ConjunctionOfFluents([]), True, True)
+    subgoal, removed, added = regress_with_delta(goal, op)
+    assert(subgoal == ConjunctionOfFluents([P((a,)), Q((b,)), Q((c,))]))
+    assert(removed == [P((b,))])
+    assert(added == [Q((c,))])
+    cache = EntailmentCache(world)
+    assert(cache.num_violated_after(goal, removed, added, subgoal) == num_violated_fluents(world, subgoal))
+
+def test_relaxed_heuristics():
+    from python_task_planning import ConjunctionOfFluents, EntailmentCache, FluentStore, Operator, \
+         Predicate, Symbol, Variable
+    from python_task_planning.heuristics import RelaxedPlanningGraph
+    P = Predicate('P', ['x'])
+    Q = Predicate('Q', ['x'])
+    x = Variable('x')
+    MakeP = Operator('MakeP', P((x,)), {}, [(1, Q((x,)))], ConjunctionOfFluents([]), True)
+    MakeQ = Operator('MakeQ', Q((x,)), {}, [], ConjunctionOfFluents([]), True)
+    graph = RelaxedPlanningGraph([MakeP, MakeQ])
+    a = Symbol('a')
+    world = FluentStore()
+    cache = EntailmentCache(world)
+    subgoal = ConjunctionOfFluents([P((a,)), Q((a,))])
+    assert(graph.h_add(cache, subgoal) == 3)
+    assert(graph.h_max(cache, subgoal) == 2)
+    assert(graph.h_ff(cache, subgoal) == 2)
+    world.add(Q((a,)))
+    cache.clear()
+    assert(graph.h_add(cache, subgoal) == 1)
+
+    # h_max must not exceed the optimal plan length when a precondition bound by a
+    # suggester already holds in the world
+    from python_task_planning.hpn import plan_flat
+    R = Predicate('R', ['x', 'y'])
+    S = Predicate('S', ['x'])
+    y = Variable('y')
+    b, c = Symbol('b'), Symbol('c')
+    MakeS = Operator('MakeS', S((x,)), {y: lambda world, current_state, goal: iter([b, c])}, [(0, R((x, y)))],
+        ConjunctionOfFluents([]), True)
+    MakeR = Operator('MakeR', R((x, y)), {}, [(0, Q((y,)))], ConjunctionOfFluents([]), True)
+    operators = [MakeS, MakeR, MakeQ]
+    world = FluentStore([R((a, c))])
+    goal = ConjunctionOfFluents([S((a,))])
+    plan = plan_flat(operators, world, world, goal)
+    optimal = len([op for (op, subgoal) in plan if op is not None])
+    assert(optimal == 1)
+    h = RelaxedPlanningGraph(operators).h_max(EntailmentCache(world), goal)
+    assert(0 < h <= optimal)
+
+    # costs computed while a cycle is cut depend on the fluents being costed, so they
+    # must not be reused for later queries
+    T = Predicate('T', ['x'])
+    MakeQFromP = Operator('MakeQFromP', Q((x,)), {}, [(0, P((x,)))], ConjunctionOfFluents([]), True)
+    MakePFromQ = Operator('MakePFromQ', P((x,)), {}, [(0, Q((x,)))], ConjunctionOfFluents([]), True)
+    MakePFromT = Operator('MakePFromT', P((x,)), {}, [(0, T((x,)))], ConjunctionOfFluents([]), True)
+    MakeT = Operator('MakeT', T((x,)), {}, [], ConjunctionOfFluents([]), True)
+    operators = [MakePFromQ, MakeQFromP, MakePFromT, MakeT]
+    world = FluentStore([T((a,))])
+    goal = ConjunctionOfFluents([P((a,)), Q((a,))])
+    plan = plan_flat(operators, world, world, goal)
+    optimal = len([op for (op, subgoal) in plan if op is not None])
+    assert(optimal == 2)
+    graph = RelaxedPlanningGraph(operators)
+    cache = EntailmentCache(world)
+    assert(graph.h_max(cache, goal) == 2)
+    assert(graph.h_max(cache, ConjunctionOfFluents([Q((a,))])) == 2)
+    assert(graph.h_add(cache, goal) == 3)
+    assert(graph.h_add(cache, ConjunctionOfFluents([Q((a,))])) == 2)
+
+def test_search_budget_and_ara_star():
+    from python_task_planning import SearchBudget, SearchBudgetExceededError
+    from python_task_planning.a_star import a_star, ara_star
+    # grid where the heuristic is misleading, so weighted A* first finds a poor plan
+    n = 8
+    def actions(s):
+        x, y = s
+        for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+            if 0 <= x + dx < n and 0 <= y + dy < n:
+                # crossing the middle row is expensive
+                cost = 10.0 if y + dy == n // 2 and 0 < x + dx < n - 1 else 1.0
+                yield (dx, dy), (x + dx, y + dy), cost
+    goal = (n // 2, n - 1)
+    heuristic = lambda s: abs(s[0] - goal[0]) + abs(s[1] - goal[1])
+    goal_test = lambda s: s == goal
+    optimal = a_star((n // 2, 0), goal_test, actions, heuristic)
+    results = list(ara_star((n // 2, 0), goal_test, actions, heuristic, weights=(5.0, 2.0, 1.0)))
+    bounds = [bound for plan, bound in results]
+    assert(bounds == sorted(bounds, reverse=True))
+    assert(bounds[-1] == 1.0)
+    assert(len(results[-1][0]) == len(optimal))
+
+    # when the budget runs out mid-iteration, the bound comes from the frontier, so it can
+    # be tighter than the last one yielded but never below the true ratio
+    def plan_cost(plan):
+        return sum([[c for (a, t, c) in actions(s) if a == action][0] for (action, s) in plan[:-1]])
+    try:
+        list(ara_star((n // 2, 0), goal_test, actions, heuristic, weights=(5.0, 2.0, 1.0),
+            budget=SearchBudget(max_expansions=20)))
+        assert(False)
+    except SearchBudgetExceededError as e:
+        assert(plan_cost(e.best_plan) / plan_cost(optimal) <= e.bound < bounds[0])
+    try:
+        a_star((n // 2, 0), goal_test, actions, heuristic, budget=SearchBudget(max_expansions=3))
+        assert(False)
+    except SearchBudgetExceededError as e:
+        assert(e.best_plan is None)
+
+def test_a_star_long_plan():
+    from python_task_planning.a_star import a_star
+    n = 5000
+    plan = a_star(0, lambda s: s == n, lambda s: [('step', s + 1, 1.0)], lambda s: n - s)
+    assert(isinstance(plan, list))
+    assert(len(plan) == n + 1)
+    assert(plan[0] == ('step', 0))
+    assert(plan[-1] == (None, n))
+
+def test_bidirectional_a_star():
+    from python_task_planning.a_star import a_star, bidirectional_a_star
+    # directed graph; the reverse generator is built from the same edges
+    edges = {
+        'a': [('ab', 'b', 1.0), ('ac', 'c', 4.0)],
+        'b': [('bc', 'c', 1.0), ('bd', 'd', 5.0)],
+        'c': [('cd', 'd', 1.0)],
+        'd': [],
+        }
+    reverse_edges = {}
+    for s, out in edges.items():
+        for action, t, cost in out:
+            reverse_edges.setdefault(t, []).append((action, s, cost))
+    plan = bidirectional_a_star('a', 'd', lambda s: edges[s],
+        reverse_action_generator=lambda s: reverse_edges.get(s, []))
+    assert(plan == a_star('a', lambda s: s == 'd', lambda s: edges[s], lambda s: 0.0))
+    assert(bidirectional_a_star('d', 'a', lambda s: edges[s],
+        reverse_action_generator=lambda s: reverse_edges.get(s, [])) is None)
+    # undirected line graph
+    line = lambda s: [(('to', t), t, 1.0) for t in (s - 1, s + 1) if 0 <= t <= 10]
+    plan = bidirectional_a_star(0, 10, line, lambda s: 10 - s, lambda s: s, symmetric=True)
+    assert(plan == [(('to', s + 1), s) for s in range(10)] + [(None, 10)])
+
+def test_roadmap():
+    import numpy as np
+    from python_task_planning.a_star import a_star
+    from python_task_planning.roadmap import Roadmap
+    np.random.seed(0)
+    points = np.random.random((500, 2))
+    roadmap = Roadmap(points, 0.1)
+    queries = np.random.random((50, 2))
+    for query, (indices, dists) in zip(queries, roadmap.radius_neighbors(queries)):
+        expected = np.nonzero(np.sqrt(((points - query)**2).sum(axis=1)) < 0.1)[0]
+        assert(sorted(indices.tolist()) == expected.tolist())
+        assert(np.allclose(dists, np.sqrt(((points[indices] - query)**2).sum(axis=1))))
+    indices, dists = roadmap.neighbors(0)
+    assert(0 not in indices.tolist())
+    plan = a_star(0, lambda s: s == 1, roadmap.action_generator, roadmap.heuristic(1))
+    assert(plan[0] == (plan[1][1], 0))
+    assert(plan[-1] == (None, 1))
+
+def test_csr_graph():
+    import numpy as np
+    from python_task_planning.a_star import a_star
+    from python_task_planning.roadmap import Roadmap
+    from python_task_planning.csr_graph import CSRGraph
+    np.random.seed(0)
+    roadmap = Roadmap(np.random.random((500, 2)), 0.1)
+    graph = roadmap.to_csr()
+    for ii in [0, 17, 250]:
+        indices, weights = graph.neighbors(ii)
+        expected, dists = roadmap.neighbors(ii)
+        assert(sorted(zip(indices.tolist(), weights.tolist())) == sorted(zip(expected.tolist(), dists.tolist())))
+    cost = lambda plan: sum([np.sqrt(((roadmap.points[a] - roadmap.points[s])**2).sum())
+        for (a, s) in plan[:-1]])
+    for start, goal in [(0, 1), (5, 400), (42, 42)]:
+        expected = a_star(start, lambda s: s == goal, roadmap.action_generator, roadmap.heuristic(goal))
+        for heuristic in [roadmap.heuristic(goal), roadmap.heuristic_array(goal)]:
+            plan = a_star(start, lambda s: s == goal, graph, heuristic)
+            assert((plan is None) == (expected is None))
+            if plan is not None:
+                assert(plan[0][1] == start and plan[-1] == (None, goal))
+                assert(abs(cost(plan) - cost(expected)) < 1e-9)
+    # nodes 0 and 2 have no path between them
+    graph = CSRGraph.from_edges(3, [0, 1], [1, 0], [1.0, 1.0])
+    assert(a_star(0, lambda s: s == 2, graph, np.zeros(3)) is None)
+
+    # an overlay finds the same plans as a copy with the extra edges, without copying
+    extra = ([3, 3, 1, 4], [0, 4, 2, 2], [5.0, 1.0, 1.0, 9.0])
+    overlay = graph.with_overlay(2, *extra)
+    copy = graph.with_edges(2, *extra)
+    assert(overlay.graph is graph and len(overlay) == len(copy) == 5)
+    for ii in range(5):
+        assert(sorted(zip(*[a.tolist() for a in overlay.neighbors(ii)])) ==
+            sorted(zip(*[a.tolist() for a in copy.neighbors(ii)])))
+    for start, goal in [(3, 2), (0, 2), (3, 0)]:
+        assert(a_star(start, lambda s: s == goal, overlay, lambda s: 0.0) ==
+            a_star(start, lambda s: s == goal, copy, lambda s: 0.0))
+    assert(a_star(3, lambda s: s == 2, overlay, lambda s: 0.0) == [(0, 3), (1, 0), (2, 1), (None, 2)])
+
+def test_multi_query_planner():
+    import numpy as np
+    from python_task_planning.a_star import a_star
+    from python_task_planning.roadmap import Roadmap
+    from python_task_planning.multi_query import MultiQueryPlanner
+    np.random.seed(0)
+    points = np.random.random((300, 2))
+    planner = MultiQueryPlanner(points, 0.15)
+    queries = [(np.random.random(2), np.random.random(2)) for ii in range(10)]
+    cost = lambda path: sum([np.sqrt(((p1 - p0)**2).sum()) for p0, p1 in zip(path[:-1], path[1:])])
+    for x_start, x_end in queries:
+        path = planner.plan(x_start, x_end)
+        # same search over a roadmap which contains the query points
+        roadmap = Roadmap(np.concatenate([points, [x_start, x_end]]), 0.15)
+        expected = a_star(300, lambda s: s == 301, roadmap.action_generator, roadmap.heuristic(301))
+        assert((path is None) == (expected is None))
+        if path is not None:
+            assert(np.all(path[0] == x_start) and np.all(path[-1] == x_end))
+            assert(abs(cost(path) - cost([roadmap.points[s] for (a, s) in expected])) < 1e-9)
+    assert(planner.misses == 10 and planner.hits == 0)
+
+    # nearby queries hit the cache, including repeats within one batch
+    batch = [(x_start + 1e-5, x_end) for (x_start, x_end) in queries] + [queries[0]]
+    paths = planner.plan_batch(batch)
+    assert(planner.hits == 11)
+    assert(paths[0] is planner.plan(*queries[0]))
+
+    planner = MultiQueryPlanner(points, 0.15, cache_size=4)
+    assert(len([path for path in planner.plan_batch(queries)]) == 10)
+    assert(len(planner._cache) == 4)
+
+def test_obstacle_map():
+    import numpy as np
+    from python_task_planning.obstacle_map import ObstacleMap
+    np.random.seed(0)
+    obs_array = np.random.random((40, 30)) < 0.05
+    obs_map = ObstacleMap(obs_array, 0.5)
+    points = np.random.uniform(-1.0, 21.0, (200, 2))
+    occupied = obs_map.is_occupied(points)
+    for p, occ in zip(points, occupied):
+        ii, jj = obs_map.pos_to_ind(p)
+        inside = 0 <= ii < 40 and 0 <= jj < 30
+        assert(occ == (obs_array[ii,jj] if inside else True))
+        assert(obs_map.is_occupied(p) == occ)
+
+    x0, y0 = points[:,0], points[:,1]
+    x1, y1 = x0 + np.random.uniform(0, 5, 200), y0 + np.random.uniform(0, 5, 200)
+    for box, any_occ in zip(zip(x0, x1, y0, y1), obs_map.any_occupied(x0, x1, y0, y1)):
+        i0, j0 = [max(0, ind) for ind in obs_map.pos_to_ind(box[0::2])]
+        i1, j1 = [max(0, ind) for ind in obs_map.pos_to_ind(box[1::2])]
+        assert(any_occ == obs_array[i0:i1,j0:j1].any())
+        assert(obs_map.any_occupied(*box) == any_occ)
+
+    assert(len(obs_map.points()) == 40 * 30)
+    assert(np.all(obs_map.is_occupied(obs_map.occupied_points())))
+    assert(len(obs_map.occupied_points()) == obs_array.sum())
+
+    free = obs_map.points()[~obs_array.ravel()]
+    occ = obs_map.occupied_points()
+    expected = np.array([np.sqrt(((occ - p)**2).sum(axis=1)).min() for p in free[:50]])
+    assert(np.allclose(obs_map.clearance(free[:50]), expected))
+    assert(np.all(obs_map.clearance(occ) == 0))
+
+def test_segment_checking():
+    import numpy as np
+    from python_task_planning.obstacle_map import ObstacleMap
+    from python_task_planning.multi_query import MultiQueryPlanner
+    np.random.seed(0)
+    obs_array = np.zeros((50, 50), dtype=bool)
+    obs_array[20:30, 5:45] = True
+    obs_map = ObstacleMap(obs_array, 1.0)
+    p0 = np.random.uniform(0, 50, (300, 2))
+    p1 = np.random.uniform(0, 50, (300, 2))
+    free = obs_map.segments_free(p0, p1)
+    # exact answer: whether the segment meets any occupied cell, by clipping it to each cell
+    lo = np.argwhere(obs_array) * 1.0
+    hi = lo + 1.0
+    for a, b, f in zip(p0, p1, free):
+        with np.errstate(divide='ignore'):
+            t0, t1 = (lo - a) / (b - a), (hi - a) / (b - a)
+        t_enter, t_exit = np.minimum(t0, t1).max(axis=1), np.maximum(t0, t1).min(axis=1)
+        hits = (t_enter <= t_exit) & (t_exit >= 0) & (t_enter <= 1)
+        assert(f == (not hits.any()))
+    # small chunks give the same answers
+    assert(np.all(obs_map.segments_free(p0, p1, max_cells=50) == free))
+    # a segment which clips the corner of an occupied cell, between samples half a cell apart
+    corner_map = ObstacleMap(np.zeros((10, 10), dtype=bool), 1.0)
+    corner_map.obs_array[5,5] = True
+    assert(not corner_map.segments_free([(5.0, 6.9)], [(7.0, 4.9)])[0])
+    samples = np.array([5.0, 6.9]) + np.linspace(0, 1, 10000)[:,np.newaxis] * np.array([2.0, -2.0])
+    assert(corner_map.is_occupied(samples).any())
+    assert(not obs_map.segments_free([(25, 10)], [(25, 10)])[0])
+    assert(obs_map.segments_free([(19.5, 10)], [(19.5, 40)])[0])
+    assert(not obs_map.segments_free([(19.5, 10)], [(19.5, 40)], margin=1.5)[0])
+
+    points = np.random.uniform(0, 50, (800, 2))
+    points = points[~obs_map.is_occupied(points)]
+    lazy = MultiQueryPlanner(points, 5.0, edge_checker=obs_map.segments_free)
+    eager = MultiQueryPlanner(points, 5.0, edge_checker=obs_map.segments_free, lazy=False)
+    cost = lambda path: sum([np.sqrt(((b - a)**2).sum()) for a, b in zip(path[:-1], path[1:])])
+    for x_start, x_end in [((25, 2), (25, 48)), ((10, 10), (40, 40)), ((5, 25), (45, 25))]:
+        path = lazy.plan(np.array(x_start, dtype=float), np.array(x_end, dtype=float))
+        expected = eager.plan(np.array(x_start, dtype=float), np.array(x_end, dtype=float))
+        assert(path is not None and abs(cost(path) - cost(expected)) < 1e-9)
+        assert(np.all(obs_map.segments_free(path[:-1], path[1:])))
+    assert(lazy.n_edges_checked < eager.n_edges_checked)
+
+def test_save_load_maps():
+    import shutil
+    import tempfile
+    import numpy as np
+    from python_task_planning.obstacle_map import ObstacleMap
+    from python_task_planning.multi_query import MultiQueryPlanner
+    np.random.seed(0)
+    obs_array = np.random.random((37, 21)) < 0.1
+    obs_map = ObstacleMap(obs_array, 0.5)
+    directory = tempfile.mkdtemp()
+    try:
+        obs_map.save(directory + '/map')
+        loaded = ObstacleMap.load(directory + '/map')
+        points = np.random.uniform(-1, 20, (500, 2))
+        assert(np.all(loaded.is_occupied(points) == obs_map.is_occupied(points)))
+        assert(loaded._obs_array is None)
+        assert(np.all(loaded.obs_array == obs_array))
+        assert(np.all(loaded.any_occupied(0, points[:,0], 0, points[:,1]) ==
+            obs_map.any_occupied(0, points[:,0], 0, points[:,1])))
+
+        obs_map.save(directory + '/map', precompute=True)
+        loaded = ObstacleMap.load(directory + '/map')
+        assert(isinstance(loaded._distance, np.memmap))
+        assert(np.all(loaded.clearance(points) == obs_map.clearance(points)))
+
+        free = np.random.uniform(0, 10, (300, 2))
+        planner = MultiQueryPlanner(free, 1.5, edge_checker=obs_map.segments_free)
+        x_start, x_end = np.array([1.0, 1.0]), np.array([9.0, 9.0])
+        path = planner.plan(x_start, x_end)
+        planner.save(directory + '/roadmap')
+        loaded = MultiQueryPlanner.load(directory + '/roadmap', edge_checker=loaded.segments_free)
+        assert(np.all(loaded.edge_status == planner.edge_status))
+        loaded_path = loaded.plan(x_start, x_end)
+        assert(len(path) == len(loaded_path) and np.allclose(path, loaded_path))
+        # the edges checked after loading are not written back to the file
+        assert(np.all(np.load(directory + '/roadmap/weights.npy') == planner.graph.weights))
+    finally:
+        shutil.rmtree(directory)
+
+def test_suggest_values():
+    from python_task_planning.common import Variable, ConjunctionOfFluents, suggest_values
+    from python_task_planning.entailment_cache import EntailmentCache
+    calls = []
+    def make_suggester(name, n):
+        def suggester(world, current_state, goal):
+            calls.append(name)
+            for ii in range(n):
+                yield '%s%d' % (name, ii)
+        return suggester
+    a, b, c = Variable('a'), Variable('b'), Variable('c')
+    suggesters = {a: make_suggester('a', 3), b: make_suggester('b', 4), c: make_suggester('c', 5)}
+    goal = ConjunctionOfFluents([])
+
+    values = list(suggest_values(suggesters, None, None, goal))
+    assert(len(values) == 60 and sorted(calls) == ['a', 'b', 'c'])
+    assert(len(set([tuple(sorted(v.values())) for v in values])) == 60)
+    # every combination is a separate dict
+    values[0][a] = 'changed'
+    assert(values[1][a] != 'changed')
+
+    assert(len(list(suggest_values(suggesters, None, None, goal, max_combinations=7))) == 7)
+    assert(list(suggest_values({}, None, None, goal)) == [{}])
+
+    cache = EntailmentCache(None)
+    calls[:] = []
+    for ii in range(3):
+        assert(len(list(suggest_values(suggesters, None, None, goal, cache))) == 60)
+    assert(len(calls) == 3 and cache.suggester_calls == 3)
+    cache.clear()
+    list(suggest_values(suggesters, None, None, goal, cache))
+    assert(len(calls) == 6)
+
+def test_gen_instances_pruning():
+    from python_task_planning.common import Symbol, Variable, Fluent, Predicate, ConjunctionOfFluents, \
+        Operator, AbstractionInfo, static_predicates
+    At = Predicate('At', ['obj', 'loc'])
+    Connected = Predicate('Connected', ['from', 'to'])
+    Holding = Predicate('Holding', ['obj'])
+    class NotFluent(Fluent):
+        __slots__ = ()
+        def contradicts(self, other):
+            return other == Fluent(self.pred, self.args)
+
+    locs = [Symbol('l%d' % ii) for ii in range(8)]
+    box, other = Symbol('box'), Symbol('other')
+    connected = set([(locs[ii], locs[ii+1]) for ii in range(7)])
+    queries = []
+    class World:
+        def entails(self, f):
+            queries.append(f)
+            return f.pred == Connected and f.args in connected
+
+    obj, loc, l1, l2, held = [Variable(name) for name in ['obj', 'loc', 'l1', 'l2', 'held']]
+    suggest_locs = lambda world, current_state, goal: iter(locs)
+    Move = Operator('Move', At((obj, loc)),
+        {l1: suggest_locs, l2: suggest_locs, held: lambda world, current_state, goal: iter([box, other])},
+        [(0, At((obj, l1))), (0, Connected((l1, l2))), (0, Connected((l2, loc))), (0, Holding((held,)))],
+        ConjunctionOfFluents([]), True)
+    Grab = Operator('Grab', Holding((obj,)), {}, [], ConjunctionOfFluents([]), True)
+    static_preds = static_predicates([Move, Grab])
+    assert(static_preds == set([Connected]))
+
+    goal = ConjunctionOfFluents([At((box, locs[5])), NotFluent(Holding, (other,))])
+    instances = list(Move.gen_instances(World(), None, goal, AbstractionInfo({}), static_preds=static_preds))
+    assert([(i.preconditions.fluents[0].args[1], i.preconditions.fluents[3].args[0]) for i in instances] ==
+        [(locs[3], box)])
+    # l2 is bound first, and only l4 passes the static check on Connected(l2, loc)
+    assert(len(queries) <= 8 + 8)
+
+    # without the static check every combination which does not contradict the goal is kept
+    instances = list(Move.gen_instances(World(), None, goal, AbstractionInfo({})))
+    assert(len(instances) == 8 * 8)
+    for inst in instances:
+        assert(inst.target == At((box, locs[5])) and inst.concrete)
+    assert(len(set([inst.preconditions for inst in instances])) == 64)
+
+def test_operator_library():
+    from python_task_planning.common import Symbol, Variable, Fluent, Predicate, ConjunctionOfFluents, \
+        Operator, AbstractionInfo, compile_match, compile_bind
+    from python_task_planning.operator_library import OperatorLibrary
+    At = Predicate('At', ['obj', 'loc'])
+    Open = Predicate('Open', ['door'])
+    a, b, kitchen, door = Symbol('a'), Symbol('b'), Symbol('kitchen'), Symbol('door')
+    obj, loc, d = Variable('obj'), Variable('loc'), Variable('d')
+
+    template = At((obj, kitchen))
+    match = compile_match(template)
+    for f in [At((a, kitchen)), At((a, door)), Open((door,))]:
+        assert(match(f) == template.match(f))
+    bindings = {obj: a}
+    assert(compile_bind(template)(bindings) is template.bind(bindings))
+    assert(compile_bind(At((a, kitchen)))({}) is At((a, kitchen)))
+
+    ops = [
+        Operator('MoveAnywhere', At((obj, loc)), {}, [], ConjunctionOfFluents([]), True),
+        Operator('MoveToKitchen', At((obj, kitchen)), {}, [(0, Open((door,)))], ConjunctionOfFluents([]), True),
+        Operator('MoveA', At((a, loc)), {}, [], ConjunctionOfFluents([]), True),
+        Operator('OpenDoor', Open((d,)), {}, [], ConjunctionOfFluents([]), True),
+        ]
+    library = OperatorLibrary(ops)
+    assert(list(library) == ops and len(library) == 4)
+    assert(sorted(library.relevant(At((a, kitchen)))) == [0, 1, 2])
+    assert(sorted(library.relevant(At((b, door)))) == [0])
+    assert(library.relevant(Open((door,))) == [3])
+
+    goal = ConjunctionOfFluents([At((b, kitchen)), Open((door,)), At((a, door))])
+    expected = [inst for op in ops for inst in op.gen_instances(None, None, goal, AbstractionInfo({}))]
+    instances = list(library.gen_instances(None, None, goal, AbstractionInfo({})))
+    assert([(i.operator_name, i.target, i.preconditions) for i in instances] ==
+        [(i.operator_name, i.target, i.preconditions) for i in expected])
+    assert(len(instances) == 5)
+
+def test_planner_hooks():
+    import logging
+    from python_task_planning import Symbol, Variable, Predicate, ConjunctionOfFluents, FluentStore, \
+        Operator, HPlanTree, PlannerHooks, hpn
+    from python_task_planning.a_star import a_star
+    edges = {'a': [('ab', 'b', 1.0), ('ac', 'c', 1.0)], 'b': [('bc', 'c', 1.0)], 'c': []}
+    expanded, generated = [], []
+    a_star('a', lambda s: s == 'c', lambda s: edges[s], lambda s: 0.0,
+        on_expand=lambda s, g: expanded.append(s), on_generate=lambda s, a, n, c: generated.append(a))
+    assert(expanded == ['a', 'b'] and generated == ['ab', 'ac', 'bc'])
+
+    class World:
+        def __init__(self):
+            self.current_state = FluentStore([])
+        def execute(self, op):
+            self.current_state.add(op.target)
+            return self.current_state
+        def entails(self, cof):
+            return self.current_state.entails(cof)
+
+    AtLoc = Predicate('AtLoc', ['obj', 'loc'])
+    InGripper = Predicate('InGripper', ['obj'])
+    obj, loc = Variable('obj'), Variable('loc')
+    ops = [
+        Operator('Put', AtLoc((obj, loc)), {}, [(1, InGripper((obj,)))], ConjunctionOfFluents([]), True),
+        Operator('Pick', InGripper((obj,)), {}, [], ConjunctionOfFluents([]), True),
+        ]
+    goal = ConjunctionOfFluents([AtLoc((Symbol('cup'), Symbol('table')))])
+
+    refined, executed, records = [], [], []
+    class Handler(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+    logger = logging.getLogger('python_task_planning.hpn')
+    handler = Handler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        hooks = PlannerHooks(on_refine=lambda op, subtree, depth: refined.append((op.operator_name, depth)),
+            on_execute=lambda op, depth: executed.append((op.operator_name, depth)))
+        hpn(ops, ConjunctionOfFluents([]), goal, World(), tree=HPlanTree(), hooks=hooks)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+    assert(refined == [('Put', 1)])
+    assert(executed == [('Pick', 1), ('Put', 1)])
+    assert(len(records) == 2 and records[0].startswith('Executing:'))
+
+def test_plan_profiler():
+    import json
+    from python_task_planning import Symbol, Variable, Predicate, ConjunctionOfFluents, FluentStore, \
+        Operator, HPlanTree, hpn
+    from python_task_planning import profiler
+
+    class World:
+        def __init__(self):
+            self.current_state = FluentStore([])
+        def execute(self, op):
+            self.current_state.add(op.target)
+            return self.current_state
+        def entails(self, cof):
+            return self.current_state.entails(cof)
+
+    AtLoc = Predicate('AtLoc', ['obj', 'loc'])
+    InGripper = Predicate('InGripper', ['obj'])
+    obj, loc = Variable('obj'), Variable('loc')
+    ops = [
+        Operator('Put', AtLoc((obj, loc)), {}, [(1, InGripper((obj,)))], ConjunctionOfFluents([]), True),
+        Operator('Pick', InGripper((obj,)), {}, [], ConjunctionOfFluents([]), True),
+        ]
+    goal = ConjunctionOfFluents([AtLoc((Symbol('cup'), Symbol('table'))), AtLoc((Symbol('bowl'), Symbol('table')))])
+    tree = HPlanTree()
+    hpn(ops, ConjunctionOfFluents([]), goal, World(), tree=tree)
+
+    root = tree.stats
+    assert(tree.goal is goal and root.expanded >= 2 and root.executions == 0 and root.heuristic_calls > 0)
+    assert(root.generated >= 2 and root.max_open >= 1 and root.stored >= 3)
+    refinements = profiler.children(tree)
+    assert(len(refinements) == 2)
+    for op, subtree in refinements:
+        assert(subtree.stats.executions == 2 and subtree.stats.start >= root.start and subtree.stats.end <= root.end)
+    total = profiler.subtree_stats(tree)
+    assert(total.executions == 4 and total.expanded == sum([s.stats.expanded for (p, s) in profiler.walk(tree)]))
+    assert(0 <= profiler.self_time(tree) <= root.time)
+
+    lines = profiler.report(tree).splitlines()
+    assert(len(lines) == 4 and 'Put' in lines[2])
+    stacks = profiler.collapsed_stacks(tree, 'executions')
+    assert(len(stacks) == 2 and all([line.count(';') == 1 and line.endswith(' 2') for line in stacks]))
+
+    profile = json.loads(json.dumps(profiler.speedscope(tree)))
+    events = profile['profiles'][0]['events']
+    assert(len(events) == 6 and len(profile['shared']['frames']) == 3)
+    depth = 0
+    for e in events:
+        depth += 1 if e['type'] == 'O' else -1
+        assert(depth >= 0)
+    assert(depth == 0 and events[-1]['at'] == profile['profiles'][0]['endValue'])
+
+def test_benchmarks():
+    import os
+    import tempfile
+    from python_task_planning import HPlanTree, hpn
+    from python_task_planning.benchmarks import table_setting, case, run_case, save_results, load_results, compare
+
+    problem = table_setting(n_settings=2, n_objects=2, depth=2, branching=3)
+    world = problem.make_world()
+    hpn(problem.operators, problem.start_state(), problem.goal, world, tree=HPlanTree())
+    assert(world.entails(problem.goal))
+
+    results = [run_case(case('table_setting', planner, n_settings=1, n_objects=2, depth=2, branching=2), n_runs=2)
+        for planner in ['hpn', 'plan_flat']]
+    for r in results:
+        assert(r['status'] == 'ok' and r['runs'] == 2 and r['expanded'] > 0 and r['peak_rss_mb'] > 0)
+    # Pick, Prepare1 and Put for each object, SetObject for each object and SetSetting
+    assert(results[0]['plan_length'] == results[1]['plan_length'] == 9)
+
+    fd, filename = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        save_results(results, filename)
+        loaded = load_results(filename)
+    finally:
+        os.remove(filename)
+    assert(loaded == results)
+    slower = [dict(r, time_min=r['time_min'] * 2) for r in results]
+    lines = compare(loaded, slower)
+    assert(len(lines) == 2 and all(['REGRESSION' in line for line in lines]))
+    assert(not any(['REGRESSION' in line for line in compare(loaded, results)]))
+
+def test_parallel_a_star():
+    from multiprocessing.pool import ThreadPool
+    from python_task_planning.a_star import a_star
+    from python_task_planning.profiler import PlanStats
+    n = 12
+    blocked = set([(3, y) for y in range(10)] + [(7, y) for y in range(2, 12)])
+    def successors(state):
+        x, y = state
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            s = (x + dx, y + dy)
+            if 0 <= s[0] < n and 0 <= s[1] < n and s not in blocked:
+                yield (dx, dy), s, 1.0
+    heuristic = lambda s: abs(n - 1 - s[0]) + abs(n - 1 - s[1])
+    goal_test = lambda s: s == (n - 1, n - 1)
+
+    serial_stats = PlanStats()
+    serial_expanded = []
+    plan = a_star((0, 0), goal_test, successors, heuristic, stats=serial_stats,
+        on_expand=lambda s, g: serial_expanded.append(s))
+    pool = ThreadPool(3)
+    try:
+        for batch_size in [1, 2, 5]:
+            stats = PlanStats()
+            expanded = []
+            p = a_star((0, 0), goal_test, successors, heuristic, stats=stats, executor=pool, batch_size=batch_size,
+                on_expand=lambda s, g: expanded.append(s))
+            assert(p == plan and expanded == serial_expanded)
+            assert(stats.expanded == serial_stats.expanded and stats.generated == serial_stats.generated)
+        assert(a_star((0, 0), lambda s: False, successors, heuristic, executor=pool) is None)
+    finally:
+        pool.terminate()
+
+def test_hda_star():
+    import pickle
+    from python_task_planning import Predicate, SearchBudget, SearchBudgetExceededError
+    from python_task_planning.a_star import a_star
+    from python_task_planning.hda_star import hda_star, verify_plan
+    from python_task_planning.profiler import PlanStats
+
+    At = Predicate('At', ['obj', 'loc'])
+    f = At(('cup', 3))
+    assert(pickle.loads(pickle.dumps(f, 2)) is f and pickle.loads(pickle.dumps(At)) is At)
+
+    n = 10
+    blocked = set([(3, y) for y in range(8)] + [(6, y) for y in range(2, 10)])
+    def successors(state):
+        x, y = state
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            s = (x + dx, y + dy)
+            if 0 <= s[0] < n and 0 <= s[1] < n and s not in blocked:
+                yield (dx, dy), s, 1.0 + 0.5 * ((s[0] + 2 * s[1]) % 3)
+    heuristic = lambda s: abs(n - 1 - s[0]) + abs(n - 1 - s[1])
+    goal_test = lambda s: s == (n - 1, n - 1)
+
+    serial_stats = PlanStats()
+    plan = a_star((0, 0), goal_test, successors, heuristic, stats=serial_stats)
+    cost = verify_plan(plan, (0, 0), goal_test, successors)
+    for n_workers in [1, 3]:
+        stats = PlanStats()
+        plan = hda_star((0, 0), goal_test, successors, heuristic, n_workers=n_workers, batch_size=4, stats=stats)
+        assert(plan[0][1] == (0, 0) and plan[-1] == (None, (n - 1, n - 1)))
+        assert(abs(verify_plan(plan, (0, 0), goal_test, successors) - cost) < 1e-9)
+        if n_workers == 1:
+            assert((stats.expanded, stats.stored) == (serial_stats.expanded, serial_stats.stored))
+
+    assert(hda_star((0, 0), lambda s: s == (n, n), successors, heuristic, n_workers=2) is None)
+    try:
+        hda_star((0, 0), lambda s: False, successors, lambda s: 0.0, n_workers=2, budget=SearchBudget(max_expansions=5))
+        assert(False)
+    except SearchBudgetExceededError:
+        pass
+    def failing(state):
+        if state == (2, 2):
+            raise ValueError('bad state')
+        return successors(state)
+    try:
+        hda_star((0, 0), goal_test, failing, heuristic, n_workers=2)
+        assert(False)
+    except RuntimeError as e:
+        assert('bad state' in str(e))
+
+def test_lookahead():
+    from multiprocessing.pool import ThreadPool
+    from python_task_planning import HPlanTree, Lookahead, Predicate, PlanningFailedError, hpn_module
+    from python_task_planning.benchmarks.domains import BenchmarkWorld, table_setting
+    from python_task_planning.profiler import subtree_stats, walk
+
+    problem = table_setting(n_settings=3, n_objects=2, depth=2, branching=2)
+    def run(world, lookahead=None):
+        tree = HPlanTree()
+        hpn_module.hpn(problem.operators, problem.start_state(), problem.goal, world, tree=tree,
+            lookahead=lookahead)
+        assert(world.entails(problem.goal))
+        return tree
+
+    serial = subtree_stats(run(problem.make_world()))
+    pool = ThreadPool(2)
+    try:
+        lookahead = Lookahead(pool)
+        tree = run(problem.make_world(), lookahead)
+    finally:
+        pool.terminate()
+    assert(subtree_stats(tree).executions == serial.executions)
+    assert(lookahead.used > 0 and lookahead.discarded == 0 and lookahead.failed == 0)
+    assert(lookahead.used + lookahead.cancelled == lookahead.submitted)
+    assert(len([node for path, node in walk(tree) if node.stats.speculative]) == lookahead.used)
+
+    # runs each speculation as soon as it is submitted, before anything is executed
+    class InlinePool:
+        def apply_async(self, f):
+            f()
+
+    # once the first setting is done, the free location moves, so speculative plans which
+    # put objects at the old one have to be discarded
+    SettingLocFree = Predicate('SettingLocFree', ['loc'])
+    set_object = [op for op in problem.operators if op.name == 'SetObject'][0]
+    locations = list(set_object.suggesters.values()[0](None, None, None))
+    class MovingWorld(BenchmarkWorld):
+        def execute(self, op):
+            state = BenchmarkWorld.execute(self, op)
+            if op.operator_name == 'SetSetting' and SettingLocFree((locations[-1],)) in state:
+                state.remove(SettingLocFree((locations[-1],)))
+                state.add(SettingLocFree((locations[0],)))
+            return state
+
+    lookahead = Lookahead(InlinePool())
+    tree = run(MovingWorld(problem.facts), lookahead)
+    assert(lookahead.discarded > 0 and lookahead.failed == 0)
+    assert(lookahead.used + lookahead.discarded == lookahead.submitted)
+
+    # speculations still queued when a search fails are cancelled; here the free location
+    # goes away once the first setting is done, so no later setting can be planned
+    class QueuedPool:
+        def __init__(self):
+            self.tasks = []
+        def apply_async(self, f):
+            self.tasks.append(f)
+    class ShrinkingWorld(BenchmarkWorld):
+        def execute(self, op):
+            state = BenchmarkWorld.execute(self, op)
+            if op.operator_name == 'SetSetting':
+                state.remove(SettingLocFree((locations[-1],)))
+            return state
+    pool = QueuedPool()
+    lookahead = Lookahead(pool)
+    try:
+        run(ShrinkingWorld(problem.facts), lookahead)
+        assert(False)
+    except PlanningFailedError:
+        pass
+    assert(lookahead.submitted > 0 and len(lookahead._pending) == 0)
+    speculations = [task.im_self for task in pool.tasks]
+    for task in pool.tasks:
+        task()
+    assert(len(speculations) > 0 and all([spec.state == 'cancelled' for spec in speculations]))
+
 if __name__ == '__main__':
     test_cof_entails()
+    test_a_star_decrease_key()
+    test_cof_equality()
+    test_fluent_interning()
+    test_fluent_store()
+    test_abstraction_info()
+    test_entailment_cache()
+    test_regress_delta_heuristic()
+    test_relaxed_heuristics()
+    test_search_budget_and_ara_star()
+    test_a_star_long_plan()
+    test_bidirectional_a_star()
+    test_roadmap()
+    test_csr_graph()
+    test_multi_query_planner()
+    test_obstacle_map()
+    test_segment_checking()
+    test_save_load_maps()
+    test_suggest_values()
+    test_gen_instances_pruning()
+    test_operator_library()
+    test_planner_hooks()
+    test_plan_profiler()
+    test_benchmarks()
+    test_parallel_a_star()
+    test_hda_star()
+    test_lookahead()